@@ -0,0 +1,339 @@
+"""
+Mira inversa: angolo di lancio per colpire un bersaglio a distanza data.
+
+Per velocità e inclinazione dell'arco fissate, la quota della freccia al
+passaggio per la distanza del bersaglio cresce con l'angolo fino a un massimo
+e poi decresce: ogni bersaglio raggiungibile ha quindi una soluzione "bassa"
+(tiro teso) e una "alta" (tiro a campanile), separate dall'angolo di quota
+massima al bersaglio. Il risolutore lavora su molti bersagli insieme:
+- una scansione grossolana in angolo, con i percorsi registrati, per ogni
+  combinazione distinta di parametri: dà l'angolo di gittata massima e gli
+  intervalli di partenza di tutti i bersagli che condividono i parametri;
+- dai percorsi registrati (interpolati con Hermite cubico) si ottiene per ogni
+  bersaglio l'errore di quota sulla griglia di angoli, quindi l'intervallo che
+  contiene ciascuna soluzione e una stima iniziale per interpolazione;
+- le iterazioni della secante, salvaguardate dall'intervallo, avanzano tutte
+  le soluzioni, bassa e alta, con una sola simulazione batch per iterazione.
+"""
+import numpy as np
+
+import trajectory_engine
+from trajectory_engine import _hermite
+
+scan_step = 1.0          # passo della scansione iniziale in angolo (gradi)
+height_tol = 1e-4        # tolleranza sull'errore di quota al bersaglio (m)
+angle_tol = 1e-5         # tolleranza sull'angolo di lancio (gradi)
+secant_delta = 1e-3      # secondo punto iniziale della secante (gradi)
+max_iterations = 40
+
+
+class AimSolution:
+    """
+    Soluzioni per ogni bersaglio (NaN se il bersaglio non è raggiungibile):
+
+    - low, high: angolo di lancio del tiro teso e del tiro a campanile (gradi);
+      NaN anche se il risolutore non arriva entro height_tol in max_iterations
+    - max_range_angle, max_range: angolo e valore della gittata massima alla
+      quota del bersaglio
+    - iterations: iterazioni eseguite dal risolutore
+    - simulated_shots: tiri simulati in totale, scansione inclusa
+    """
+
+    def __init__(self, low, high, max_range_angle, max_range, iterations, simulated_shots):
+        self.low = low
+        self.high = high
+        self.max_range_angle = max_range_angle
+        self.max_range = max_range
+        self.iterations = iterations
+        self.simulated_shots = simulated_shots
+
+
+def _floor(height, distance):
+    """
+    Quota fino a cui si prolunga la traiettoria sotto il piano del bersaglio: così
+    l'errore di quota resta una funzione regolare dell'angolo anche per i tiri
+    corti, che cadrebbero prima di arrivare al bersaglio.
+    """
+    return np.minimum(height, 0.0) - distance
+
+
+def _miss(angles, distance, params, sim_kwargs):
+    """
+    Quota della freccia alla distanza del bersaglio meno la quota del
+    bersaglio; -inf se la freccia non arriva al bersaglio neanche prolungando
+    la traiettoria sotto il suolo.
+    """
+    speed, inclination, height, mass, drag = params
+    result = trajectory_engine.simulate_batch(
+        angles, speed, inclination, mass, drag, ground_height=_floor(height, distance),
+        target_distance=distance, **sim_kwargs)
+    return np.where(np.isnan(result.height_at_target), -np.inf,
+                    result.height_at_target - height)
+
+
+def _path_miss(result, group_of, distance, height, floor):
+    """
+    Errore di quota di ogni bersaglio su tutta la griglia di angoli, letto dai
+    percorsi registrati del suo gruppo (forma (gruppi, angoli)), fermati alla
+    distanza massima dei bersagli del gruppo o alla quota floor. I percorsi
+    hanno x crescente (il drag non inverte mai vx): y(x) è interpolata con
+    Hermite cubico usando le pendenze vy/vx dei campioni. Il campione che
+    precede ogni bersaglio si trova con una ricerca binaria su tutte le coppie
+    (bersaglio, angolo) insieme.
+    """
+    x, y = result.paths
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = result.velocities[1] / result.velocities[0]
+    count = np.sum(~np.isnan(x), axis=0)
+    g, j = np.indices(count.shape)
+    last = np.maximum(count - 1, 0)
+
+    # Ultimo tratto fino al punto d'arresto con la pendenza dell'ultimo campione
+    pad = np.full((1,) + count.shape, np.nan)
+    x, y, slope = (np.concatenate([a, pad]) for a in (x, y, slope))
+    closed = result.landed | ~np.isnan(result.height_at_target)
+    stop_y = np.where(result.landed, floor[:, None], result.height_at_target)
+    at = (count[closed], g[closed], j[closed])
+    x[at] = result.range[closed]
+    y[at] = stop_y[closed]
+    slope[at] = slope[last[closed], g[closed], j[closed]]
+    count = count + closed
+
+    # Primo campione con x >= distanza, per ogni coppia (bersaglio, angolo)
+    g = group_of[:, None]
+    j = np.arange(count.shape[1])[None, :]
+    d = distance[:, None]
+    lo = np.zeros((len(distance), count.shape[1]), dtype=np.int64)
+    hi = count[g, j]
+    for _ in range(int(np.ceil(np.log2(len(x) + 1)))):
+        mid = (lo + hi) // 2
+        right = x[np.minimum(mid, len(x) - 1), g, j] < d
+        lo = np.where((lo < hi) & right, mid + 1, lo)
+        hi = np.where((lo < hi) & ~right, mid, hi)
+
+    n_points = count[g, j]
+    i0 = np.minimum(np.maximum(lo - 1, 0), np.maximum(n_points - 2, 0))
+    i1 = np.minimum(i0 + 1, len(x) - 1)
+    x0, x1 = x[i0, g, j], x[i1, g, j]
+    inside = d <= x[np.maximum(n_points - 1, 0), g, j]
+    dx = x1 - x0
+    with np.errstate(invalid="ignore"):
+        s = np.where(dx > 0, (d - x0) / np.where(dx > 0, dx, 1.0), 0.0)
+        value = _hermite(y[i0, g, j], slope[i0, g, j], y[i1, g, j], slope[i1, g, j], dx, s)
+    return np.where(inside, value - height[:, None], -np.inf)
+
+
+def _peak(angles, table):
+    """
+    Angolo e valore del massimo di ogni riga di table (valori sulla griglia
+    angles), raffinati con una parabola sui tre punti attorno al massimo.
+    """
+    j = np.clip(np.argmax(table, axis=1), 1, len(angles) - 2)
+    rows = np.arange(len(table))
+    r0, r1, r2 = table[rows, j - 1], table[rows, j], table[rows, j + 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denom = r0 - 2 * r1 + r2
+        offset = np.where(np.isfinite(denom) & (denom < 0), 0.5 * (r0 - r2) / denom, 0.0)
+        offset = np.clip(offset, -1.0, 1.0)
+        value = np.where(offset != 0, r1 - 0.5 * denom * offset ** 2, np.max(table, axis=1))
+    return angles[j] + offset * (angles[1] - angles[0]), value
+
+
+def _cubic_guess(angles, values, a, b, guess, iterations=4):
+    """
+    Migliora la stima lineare della radice con la cubica che interpola i
+    quattro punti di griglia attorno a essa (Newton sulla cubica, limitato a
+    [a, b]). Dove i quattro valori non sono tutti finiti resta la stima lineare.
+    """
+    step = angles[1] - angles[0]
+    j0 = np.clip(np.floor((guess - angles[0]) / step).astype(int) - 1, 0, len(angles) - 4)
+    rows = np.arange(len(values))
+    nodes = angles[j0[:, None] + np.arange(4)]
+    f = values[rows[:, None], j0[:, None] + np.arange(4)]
+    usable = np.isfinite(f).all(axis=1) & np.isfinite(guess)
+    x = np.where(usable, guess, nodes[:, 1])
+    f = np.where(usable[:, None], f, 0.0)
+    for _ in range(iterations):
+        # Cubica di Lagrange e sua derivata nel punto x
+        p = np.zeros_like(x)
+        dp = np.zeros_like(x)
+        for i in range(4):
+            others = [j for j in range(4) if j != i]
+            denom = np.prod([nodes[:, i] - nodes[:, j] for j in others], axis=0)
+            terms = [x - nodes[:, j] for j in others]
+            p += f[:, i] * np.prod(terms, axis=0) / denom
+            dp += f[:, i] * (terms[0] * terms[1] + terms[0] * terms[2]
+                             + terms[1] * terms[2]) / denom
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x = np.clip(x - p / dp, a, b)
+    return np.where(usable & np.isfinite(x), x, guess)
+
+
+def _refine(a, b, guess, sign_a, distance, params, sim_kwargs):
+    """
+    Radici dell'errore di quota negli intervalli [a, b], che hanno segni opposti
+    agli estremi (sign_a è il segno in a; intervalli NaN = nessuna radice da
+    cercare). Secante partendo da guess e guess + secant_delta,
+    salvaguardata dall'intervallo: un'iterata
+    che ne esce (o un errore -inf, freccia caduta prima) viene sostituita dal
+    punto medio. Ogni iterazione è una sola simulazione batch.
+
+    Gli estremi vengono dalla griglia interpolata, che per pochi decimillimetri
+    può sbagliare segno vicino alla radice: se l'intervallo si chiude senza che
+    l'errore sia sotto height_tol, lo si riapre di scan_step dal lato della
+    radice. Una radice è accettata solo con |errore| < height_tol; quelle non
+    convergenti restano NaN.
+    """
+    root = np.full(a.shape, np.nan)
+    i = np.flatnonzero(np.isfinite(a) & np.isfinite(b))
+    a, b, sign_a, distance = a[i], b[i], sign_a[i], distance[i]
+    params = [p[i] for p in params]
+    x0 = np.clip(guess[i], a, b)
+    x1 = np.where(x0 + secant_delta <= b, x0 + secant_delta, x0 - secant_delta)
+    f = _miss(np.concatenate([x0, x1]), np.tile(distance, 2),
+              [np.tile(p, 2) for p in params], sim_kwargs)
+    f0, f1 = f[:len(i)], f[len(i):]
+    shots = 2 * len(i)
+    iterations = 1
+
+    while i.size and iterations < max_iterations:
+        iterations += 1
+        # Restringe l'intervallo con il segno degli ultimi due punti
+        for x_k, f_k in ((x0, f0), (x1, f1)):
+            left = np.sign(f_k) == sign_a
+            a = np.where(left, np.maximum(a, x_k), a)
+            b = np.where(left, b, np.minimum(b, x_k))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x2 = x1 - f1 * (x1 - x0) / (f1 - f0)
+        bad = ~np.isfinite(x2) | (x2 <= a) | (x2 >= b)
+        x2 = np.where(bad, 0.5 * (a + b), x2)
+
+        # Intervallo chiuso senza radice: la radice è oltre l'estremo dal segno sbagliato
+        stuck = b - a < angle_tol
+        beyond = np.sign(f1) == sign_a
+        b = np.where(stuck & beyond, np.minimum(b + scan_step, 90.0), b)
+        a = np.where(stuck & ~beyond, np.maximum(a - scan_step, 0.0), a)
+        x2 = np.where(stuck, 0.5 * (a + b), x2)
+
+        converged = np.abs(f1) < height_tol
+        root[i[converged]] = x1[converged]
+        keep = ~converged
+        i, a, b, distance, sign_a = i[keep], a[keep], b[keep], distance[keep], sign_a[keep]
+        params = [p[keep] for p in params]
+        x0, f0, x1, x2 = x1[keep], f1[keep], x2[keep], None
+        if i.size:
+            f1 = _miss(x1, distance, params, sim_kwargs)
+            shots += len(i)
+
+    return root, iterations, shots
+
+
+def solve_launch_angle(target_distance, initial_speed, bow_inclination=0.0,
+                       target_height=0.0, mass=trajectory_engine.m,
+                       drag_coefficient=trajectory_engine.k, polish=True, **sim_kwargs):
+    """
+    Angoli di lancio che portano la freccia a target_distance metri, alla
+    quota target_height rispetto al punto di lancio. Tutti gli argomenti
+    accettano array con broadcasting; gli argomenti aggiuntivi (method, dt,
+    rtol, ...) vanno al motore batch.
+
+    Con polish=False si restituiscono le stime interpolate dai percorsi della
+    scansione, senza altre simulazioni: molto più veloce, con errori tipici
+    di pochi millesimi di grado.
+    """
+    distance, speed, inclination, height, mass, drag = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in
+          (target_distance, initial_speed, bow_inclination, target_height,
+           mass, drag_coefficient)))
+    shape = distance.shape
+    distance = distance.ravel()
+    columns = np.column_stack([a.ravel() for a in (speed, inclination, height, mass, drag)])
+    n = distance.size
+
+    # Gittata massima alla quota del bersaglio: scansione grossolana in angolo,
+    # una per ogni combinazione distinta di parametri
+    groups, group_of = np.unique(columns, axis=0, return_inverse=True)
+    group_of = group_of.ravel()
+    angles = np.arange(0.0, 90.0 + scan_step / 2, scan_step)
+    g_speed, g_incl, g_height, g_mass, g_drag = (groups[:, j, None] for j in range(5))
+    scan = trajectory_engine.simulate_batch(angles[None, :], g_speed, g_incl, g_mass, g_drag,
+                                            ground_height=g_height, **sim_kwargs)
+    best_angle, _ = _peak(angles, np.where(scan.landed, scan.range, -np.inf))
+    best = trajectory_engine.simulate_batch(best_angle, *(groups[:, j] for j in (0, 1, 3, 4)),
+                                            ground_height=groups[:, 2], **sim_kwargs)
+    best_range = np.where(best.landed, best.range, np.nan)
+
+    # Percorsi della stessa griglia fino alla distanza del bersaglio più lontano
+    # del gruppo, riusati da tutti i bersagli
+    d_max = np.zeros(len(groups))
+    np.maximum.at(d_max, group_of, distance)
+    g_floor = _floor(groups[:, 2], d_max)
+    paths = trajectory_engine.simulate_batch(angles[None, :], g_speed, g_incl, g_mass, g_drag,
+                                             ground_height=g_floor[:, None],
+                                             target_distance=d_max[:, None],
+                                             record_paths=True, **sim_kwargs)
+    shots = 2 * len(groups) * len(angles) + len(groups)
+
+    # Errore di quota sulla griglia di angoli per ogni bersaglio
+    miss = _path_miss(paths, group_of, distance, groups[group_of, 2], g_floor)
+
+    # L'angolo che massimizza la quota al bersaglio separa il tiro teso da quello
+    # a campanile; il bersaglio è raggiungibile se in quel punto si passa sopra
+    theta_top, f_top = _peak(angles, miss)
+    reachable = f_top >= 0
+    rows = np.arange(n)
+
+    # Ramo basso: angoli sotto quello di quota massima
+    ok = (angles[None, :] < theta_top[:, None]) & (miss >= 0)
+    has = ok.any(axis=1)
+    j = np.argmax(ok, axis=1)
+    j_prev = np.where(has, np.maximum(j - 1, 0),
+                      np.maximum(np.searchsorted(angles, theta_top) - 1, 0))
+    low_a, low_fa = angles[j_prev], miss[rows, j_prev]
+    low_b = np.where(has, angles[j], theta_top)
+    low_fb = np.where(has, miss[rows, j], f_top)
+
+    # Ramo alto: angoli sopra quello di quota massima
+    ok = (angles[None, :] > theta_top[:, None]) & (miss >= 0)
+    has = ok.any(axis=1)
+    j = len(angles) - 1 - np.argmax(ok[:, ::-1], axis=1)
+    j_next = np.where(has, np.minimum(j + 1, len(angles) - 1),
+                      np.minimum(np.searchsorted(angles, theta_top, side="right"),
+                                 len(angles) - 1))
+    high_a = np.where(has, angles[j], theta_top)
+    high_fa = np.where(has, miss[rows, j], f_top)
+    high_b, high_fb = angles[j_next], miss[rows, j_next]
+
+    # I due rami avanzano insieme. Stima iniziale: interpolazione inversa,
+    # lineare nell'intervallo e poi cubica sui punti di griglia vicini
+    a = np.concatenate([low_a, high_a])
+    b = np.concatenate([low_b, high_b])
+    fa = np.concatenate([low_fa, high_fa])
+    fb = np.concatenate([low_fb, high_fb])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        guess = a - fa * (b - a) / (fb - fa)
+    guess = np.where(np.isfinite(guess), guess, 0.5 * (a + b))
+    rows2 = np.concatenate([rows, rows])
+    guess = _cubic_guess(angles, miss[rows2], a, b, guess)
+
+    # Senza soluzione bassa in [0°, 90°] se anche a 0° si passa sopra il bersaglio
+    # (bersaglio più basso del punto di lancio: servirebbe un tiro verso il basso)
+    has_low = reachable & (miss[:, 0] < 0)
+    solvable = np.concatenate([has_low, reachable])
+    a[~solvable] = np.nan
+    if polish:
+        sign_a = np.concatenate([np.full(n, -1.0), np.full(n, 1.0)])
+        params = [columns[rows2, j] for j in range(5)]
+        roots, iterations, iter_shots = _refine(a, b, guess, sign_a, distance[rows2],
+                                                params, sim_kwargs)
+        shots += iter_shots
+    else:
+        roots = np.where(solvable, guess, np.nan)
+        iterations = 0
+
+    low, high = roots[:n], roots[n:]
+    return AimSolution(low.reshape(shape), high.reshape(shape),
+                       best_angle[group_of].reshape(shape),
+                       best_range[group_of].reshape(shape),
+                       iterations, shots)
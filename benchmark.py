@@ -0,0 +1,299 @@
+"""
+Benchmark dei kernel di fisica dei quattro script, senza aprire finestre.
+
+Gli script non vengono importati (sono programmi con interfaccia, non
+moduli): il sorgente viene analizzato con ast, le costanti di modulo sono
+valutate a parte e dalla funzione che genera la traiettoria si tolgono le
+istruzioni che toccano l'interfaccia (canvas, pyplot, artisti, animazione);
+i blocchi "with self.profiler.phase(...)" della profilazione lasciano il
+posto al loro corpo. Il resto diventa un kernel eseguito con oggetti
+sostitutivi al posto delle variabili Tk. Per gli script o3-mini
+l'integrazione con attrito è quella del thread di fisica
+(playback.integrate) con le costanti dello script.
+
+Per ogni kernel e angolo di prova si misurano:
+- tempo per traiettoria (mediana e minimo su più ripetizioni) e passi al secondo;
+- picco di memoria allocata durante un'esecuzione (tracemalloc);
+- errore sulla gittata rispetto a un riferimento ad alta precisione: la formula
+  esatta per le traiettorie teoriche, il motore rk45 con tolleranze strette
+  per quelle con attrito.
+I risultati sono scritti in JSON.
+
+Esempio:
+    python benchmark.py --repeat 20 --out benchmark.json
+"""
+import argparse
+import ast
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import playback
+import trajectory_cache
+import trajectory_engine
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Nomi che identificano istruzioni di interfaccia, escluse dai kernel
+GUI_NAMES = {"plt", "canvas", "master", "arrow_path", "playback", "theo_line",
+             "velocity_arrow", "draw_artists", "limits_changed", "update_simulation",
+             "update_preview", "viewport", "history", "shot", "stop_shot", "refresh_history",
+             "clear_preview", "profiler"}
+
+angles = (15.0, 30.0, 45.0, 60.0, 75.0)   # angoli di prova (gradi)
+repeat = 10                               # ripetizioni per la misura dei tempi
+reference_tol = 1e-12                     # rtol/atol del riferimento rk45
+
+BENCHMARK_VERSION = 1
+
+
+class _Var:
+    """Sostituto di tk.DoubleVar."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _Headless:
+    """Sostituto dell'istanza della GUI: solo gli attributi letti dal kernel."""
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+def load_constants(path):
+    """
+    Costanti e funzioni di modulo dello script: assegnazioni valutabili con le
+    sole costanti precedenti, np e math (le istruzioni che creano oggetti Tk
+    vengono saltate), e definizioni di funzione.
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    namespace = {"np": np, "math": math}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            exec(compile(ast.Module([node], []), path, "exec"), namespace)
+        elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) for t in node.targets):
+            try:
+                value = eval(compile(ast.Expression(node.value), path, "eval"),
+                             {"__builtins__": {}}, namespace)
+            except Exception:
+                continue
+            for target in node.targets:
+                namespace[target.id] = value
+    return namespace
+
+
+def _uses_gui(node):
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id in GUI_NAMES:
+            return True
+        if isinstance(child, ast.Attribute) and child.attr in GUI_NAMES:
+            return True
+        if isinstance(child, ast.alias) and (child.asname or child.name) in GUI_NAMES:
+            return True
+    return False
+
+
+def _strip_gui(body):
+    """Istruzioni di body senza quelle di interfaccia; i with di interfaccia lasciano il corpo."""
+    kept = []
+    for stmt in body:
+        if isinstance(stmt, ast.With) and all(_uses_gui(item) for item in stmt.items):
+            kept.extend(_strip_gui(stmt.body))
+        elif not _uses_gui(stmt):
+            kept.append(stmt)
+    return kept
+
+
+def extract_kernel(path, qualname):
+    """
+    Funzione kernel(self) costruita dal corpo di qualname ("funzione" o
+    "Classe.metodo") senza le istruzioni di interfaccia; restituisce le
+    variabili locali a fine esecuzione.
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    scope = tree.body
+    *classes, name = qualname.split(".")
+    for class_name in classes:
+        scope = next(n for n in scope if isinstance(n, ast.ClassDef) and n.name == class_name).body
+    func = next(n for n in scope if isinstance(n, ast.FunctionDef) and n.name == name)
+
+    body = _strip_gui(func.body)
+    lines = ["def kernel(self):"]
+    for stmt in body:
+        lines.extend("    " + line for line in ast.unparse(stmt).splitlines())
+    lines.append("    return locals()")
+
+    namespace = load_constants(path)
+    exec(compile("\n".join(lines), f"{path}:{qualname}", "exec"), namespace)
+    return namespace["kernel"], namespace
+
+
+def path_range(xs, ys):
+    """Gittata di un percorso: primo attraversamento del suolo, interpolato linearmente."""
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    below = np.flatnonzero(ys[1:] < 0) + 1
+    if not below.size:
+        return float(xs[-1])
+    i = below[0]
+    frac = ys[i - 1] / (ys[i - 1] - ys[i])
+    return float(xs[i - 1] + frac * (xs[i] - xs[i - 1]))
+
+
+def vacuum_range(speed, angle):
+    return speed ** 2 * math.sin(2 * math.radians(angle)) / trajectory_engine.g
+
+
+def drag_reference(angle, speed, **engine_kwargs):
+    result = trajectory_engine.simulate_batch(angle, speed, method="rk45", rtol=reference_tol,
+                                              atol=reference_tol, **engine_kwargs)
+    return float(result.range)
+
+
+# Kernel dei quattro script. Ogni voce descrive come preparare gli input (run),
+# quali percorsi leggere dall'esito e con quale riferimento confrontarli.
+
+def _prompt1_gpto1():
+    kernel, c = extract_kernel(os.path.join(here, "prompt1_gpto1.py"), "launch_simulation")
+    k = trajectory_engine.drag_factor(c["Cd"], c["A"], c["rho"])
+
+    def run(angle):
+        kernel.__globals__["angle_var"] = _Var(angle)
+        return kernel(None)
+
+    def paths(out, angle):
+        real = drag_reference(angle, c["v_base"], mass=c["m"], drag_coefficient=k,
+                              launch_efficiency=c["k_arco"] * c["k_elastic"])
+        return {"real": (out["x"], out["y"], real),
+                "theoretical": (out["x_theo"], out["y_theo"], vacuum_range(out["v0"], angle))}
+    return "prompt1_gpto1.py", "launch_simulation", run, paths
+
+
+def _prompt2_gpto1():
+    kernel, c = extract_kernel(os.path.join(here, "prompt2_gpto1.py"),
+                               "FrecciaSimulatore.update_plot")
+    speed = 30.0    # valore iniziale dello slider
+
+    def run(angle):
+        return kernel(_Headless(angle_deg=_Var(angle), velocity=_Var(speed)))
+
+    def paths(out, angle):
+        return {"theoretical": (out["x_theo"], out["y_theo"], vacuum_range(out["v0"], angle))}
+    return "prompt2_gpto1.py", "FrecciaSimulatore.update_plot", run, paths
+
+
+def _o3_mini(script):
+    kernel, c = extract_kernel(os.path.join(here, script), "SimulationApp.start_simulation")
+    speed = 50.0    # valore iniziale dello slider
+
+    def run(angle):
+        # Cache vuota e senza spazio: si misura il calcolo, non la ricerca nella cache
+        return kernel(_Headless(launch_angle_var=_Var(angle), initial_speed_var=_Var(speed),
+                                bow_inclination_var=_Var(0.0),
+                                trajectory_cache=trajectory_cache.TrajectoryCache(max_bytes=0)))
+
+    def paths(out, angle):
+        xs, ys = out["self"].theoretical_trajectory
+        return {"theoretical": (xs, ys, vacuum_range(speed, angle))}
+    theoretical = (script, "SimulationApp.start_simulation", run, paths)
+
+    def run_physics(angle):
+        buffer = playback.StateBuffer()
+        playback.integrate(buffer, angle, speed, 0.0, mass=c["m"], drag_coefficient=c["k"],
+                           dt=c["dt"], method=c["physics_method"])
+        return {"buffer": buffer}
+
+    def physics_paths(out, angle):
+        real = drag_reference(angle, speed, mass=c["m"], drag_coefficient=c["k"])
+        return {"real": (out["buffer"].xs, out["buffer"].ys, real)}
+    physics = (script, "playback.integrate", run_physics, physics_paths)
+    return theoretical, physics
+
+
+def kernels():
+    return [_prompt1_gpto1(), _prompt2_gpto1(),
+            *_o3_mini("prompt1_gpt_o3_mini_high.py"), *_o3_mini("prompt2_gpt_o3_mini_high.py")]
+
+
+def measure(run, paths, angle, repeat=repeat):
+    """Misure di un kernel per un angolo di prova."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = run(angle)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run(angle)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    measured = {}
+    steps = 0
+    for name, (xs, ys, reference) in paths(out, angle).items():
+        value = path_range(xs, ys)
+        steps += len(xs) - 1
+        measured[name] = {"points": len(xs), "range_m": value, "reference_range_m": reference,
+                          "range_error_m": abs(value - reference)}
+    median = statistics.median(times)
+    return {"angle_deg": angle, "time_per_trajectory_s": median, "time_min_s": min(times),
+            "steps": steps, "steps_per_s": steps / median if median > 0 else None,
+            "peak_memory_bytes": peak, "paths": measured}
+
+
+def run_benchmark(angles=angles, repeat=repeat):
+    results = []
+    for script, kernel, run, paths in kernels():
+        for angle in angles:
+            results.append({"script": script, "kernel": kernel,
+                            **measure(run, paths, angle, repeat)})
+    return {
+        "version": BENCHMARK_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark dei kernel di fisica dei quattro script (risultati in JSON).")
+    parser.add_argument("--angles", type=lambda s: [float(a) for a in s.split(",")],
+                        default=list(angles), help="angoli di prova separati da virgole")
+    parser.add_argument("--repeat", type=int, default=repeat)
+    parser.add_argument("--out", help="file JSON di output (predefinito: standard output)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.angles, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    # Riepilogo leggibile su stderr
+    for r in report["results"]:
+        errors = ", ".join(f"{name} {p['range_error_m']:.3g} m" for name, p in r["paths"].items())
+        print(f"{r['script']:30s} {r['kernel']:32s} {r['angle_deg']:5.1f}° "
+              f"{r['time_per_trajectory_s'] * 1e3:8.3f} ms  {errors}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
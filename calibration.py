@@ -0,0 +1,337 @@
+"""
+Calibrazione delle costanti fisiche sui tiri misurati.
+
+Le costanti degli script sono stime a mano (k = 0.02 e m = 0.1 negli script
+o3-mini; Cd, A, k_arco, k_elastic in prompt1_gpto1.py) e anche la perdita
+cos(inclinazione) della velocità è un'ipotesi. Qui vengono stimate dai tiri
+misurati, letti da uno o più CSV a blocchi di chunk_rows righe (pandas), con
+le colonne:
+- angle: angolo di lancio (gradi);
+- speed: velocità misurata dal cronografo (m/s), la velocità iniziale che
+  gli script passano al modello;
+- inclination (facoltativa): inclinazione dell'arco (gradi);
+- distance: distanza misurata (m), punto di caduta a terra oppure distanza del
+  bersaglio se è indicata impact_height;
+- impact_height (facoltativa): quota (m) del punto colpito sul bersaglio a
+  distance metri; vuota per i tiri misurati a terra.
+
+Il modello è quello del motore (trajectory_engine): il drag entra solo come
+k/m, quindi la massa è un dato (--mass) e si stima k; Cd si ricava per la
+sezione indicata (--area). Parametri stimati:
+- k: fattore di drag (kg/m);
+- launch_efficiency: rapporto tra velocità effettiva e velocità misurata
+  (k_arco * k_elastic; le due perdite non sono distinguibili);
+- inclination_exponent: esponente della perdita cos(inclinazione)^p, stimato
+  solo se i tiri hanno inclinazioni diverse.
+
+I minimi quadrati sono risolti con Levenberg-Marquardt (NumPy): ad ogni
+iterazione il punto di prova e le sue perturbazioni per lo jacobiano (differenze
+in avanti) sono simulati insieme in un solo batch, quindi migliaia di tiri si
+calibrano in pochi secondi. Il profilo risultante (JSON) viene letto dagli
+script con load_profile.
+
+Esempio:
+    python calibration.py tiri.csv --mass 0.1 --out calibrazione.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+import trajectory_engine
+
+here = os.path.dirname(os.path.abspath(__file__))
+profile_path = os.path.join(here, "calibrazione.json")   # profilo letto dagli script
+
+REQUIRED = ("angle", "speed", "distance")
+OPTIONAL = {"inclination": 0.0, "impact_height": np.nan}
+
+# Parametri stimabili, con i limiti fisici e il valore iniziale predefinito
+PARAMETERS = ("k", "launch_efficiency", "inclination_exponent")
+BOUNDS = {"k": (1e-6, 1.0), "launch_efficiency": (0.05, 1.5),
+          "inclination_exponent": (0.0, 6.0)}
+INITIAL = {"k": trajectory_engine.k, "launch_efficiency": 1.0, "inclination_exponent": 1.0}
+
+area = 0.005            # sezione della freccia (m^2) per ricavare Cd, come in prompt1_gpto1.py
+chunk_rows = 100_000    # righe lette per blocco dai CSV
+max_iterations = 50     # iterazioni di Levenberg-Marquardt
+tolerance = 1e-8        # riduzione relativa della somma dei quadrati sotto cui ci si ferma
+fd_step = 1e-6          # passo delle differenze finite (nelle variabili dell'ottimizzatore)
+
+PROFILE_VERSION = 1
+
+
+class MeasuredShots:
+    """Tiri misurati, una colonna NumPy per grandezza (impact_height NaN per i tiri a terra)."""
+
+    def __init__(self, angle, speed, inclination, distance, impact_height, dropped=0):
+        self.angle = angle
+        self.speed = speed
+        self.inclination = inclination
+        self.distance = distance
+        self.impact_height = impact_height
+        self.dropped = dropped
+
+    def __len__(self):
+        return len(self.angle)
+
+    @property
+    def on_target(self):
+        return ~np.isnan(self.impact_height)
+
+
+def read_shots(paths, chunk_rows=chunk_rows):
+    """
+    Legge i tiri misurati dai CSV in paths a blocchi di chunk_rows righe.
+    Le righe con valori mancanti nelle colonne obbligatorie vengono scartate
+    (e contate in dropped); solleva ValueError se manca una colonna.
+    """
+    import pandas as pd
+
+    columns = {name: [] for name in (*REQUIRED, *OPTIONAL)}
+    dropped = 0
+    for path in paths:
+        reader = pd.read_csv(path, chunksize=chunk_rows,
+                             usecols=lambda name: name in columns)
+        for chunk in reader:
+            missing = [name for name in REQUIRED if name not in chunk]
+            if missing:
+                raise ValueError(f"{path}: colonne mancanti: {', '.join(missing)}")
+            chunk = chunk.apply(pd.to_numeric, errors="coerce")
+            valid = chunk[list(REQUIRED)].notna().all(axis=1).to_numpy()
+            dropped += int((~valid).sum())
+            for name in REQUIRED:
+                columns[name].append(chunk[name].to_numpy(dtype=float)[valid])
+            for name, default in OPTIONAL.items():
+                values = (chunk[name].to_numpy(dtype=float)[valid] if name in chunk
+                          else np.full(int(valid.sum()), default))
+                if name == "inclination":
+                    values = np.nan_to_num(values, nan=default)
+                columns[name].append(values)
+    arrays = {name: np.concatenate(parts) if parts else np.zeros(0)
+              for name, parts in columns.items()}
+    return MeasuredShots(arrays["angle"], arrays["speed"], arrays["inclination"],
+                         arrays["distance"], arrays["impact_height"], dropped)
+
+
+def residuals(shots, values, mass=trajectory_engine.m, method="euler", dt=trajectory_engine.dt):
+    """
+    Scarti (m) tra modello e misure, forma (n_punti, n_tiri), per n_punti
+    insiemi di parametri simulati in un solo batch: values associa a ogni
+    parametro in PARAMETERS un array di n_punti valori.
+
+    Per i tiri a terra lo scarto è sulla gittata; per quelli sul bersaglio è
+    sulla quota a distance metri. Una freccia caduta prima del bersaglio
+    prosegue idealmente la discesa a 45° dal punto d'impatto, così lo scarto
+    resta continuo.
+    """
+    column = {name: np.asarray(values[name], dtype=float)[:, None] for name in PARAMETERS}
+    on_target = shots.on_target
+    result = trajectory_engine.simulate_batch(
+        shots.angle, shots.speed, shots.inclination, mass=mass, drag_coefficient=column["k"],
+        launch_efficiency=column["launch_efficiency"],
+        inclination_exponent=column["inclination_exponent"], method=method, dt=dt,
+        target_distance=np.where(on_target, shots.distance, np.inf))
+    short = result.range - shots.distance
+    height = np.where(np.isnan(result.height_at_target), short, result.height_at_target)
+    return np.where(on_target, height - np.nan_to_num(shots.impact_height), short)
+
+
+class Calibration:
+    """
+    Esito della stima: valori di tutti i parametri (stimati e fissi), errore
+    standard dei parametri stimati, radice dello scarto quadratico medio (m)
+    e dati della convergenza.
+    """
+
+    def __init__(self, values, stderr, fitted, rmse, shots, iterations, converged, seconds):
+        self.values = values
+        self.stderr = stderr
+        self.fitted = fitted
+        self.rmse = rmse
+        self.shots = shots
+        self.iterations = iterations
+        self.converged = converged
+        self.seconds = seconds
+
+
+def _to_free(name, value):
+    # k è stimato in scala logaritmica: sempre positivo e con passi relativi
+    return math.log(value) if name == "k" else value
+
+
+def _from_free(name, value):
+    return np.exp(value) if name == "k" else value
+
+
+def fit(shots, fit=PARAMETERS, initial=None, mass=trajectory_engine.m, method="euler",
+        dt=trajectory_engine.dt, max_iterations=max_iterations, progress=None):
+    """
+    Stima con Levenberg-Marquardt i parametri in fit (gli altri restano ai
+    valori di initial, predefiniti INITIAL). progress(iterazione, rmse), se
+    indicata, viene chiamata a ogni passo accettato.
+    """
+    if not len(shots):
+        raise ValueError("Nessun tiro misurato")
+    initial = {**INITIAL, **(initial or {})}
+    fit = [name for name in PARAMETERS if name in fit]
+    if "inclination_exponent" in fit and np.ptp(np.cos(np.radians(shots.inclination))) < 1e-6:
+        # Con una sola inclinazione l'esponente non ha effetto distinguibile
+        fit.remove("inclination_exponent")
+    if not fit:
+        raise ValueError("Nessun parametro da stimare")
+    start = time.perf_counter()
+    lower = np.array([_to_free(name, BOUNDS[name][0]) for name in fit])
+    upper = np.array([_to_free(name, BOUNDS[name][1]) for name in fit])
+    x = np.clip([_to_free(name, initial[name]) for name in fit], lower, upper)
+
+    def evaluate(x):
+        # Punto x e le sue perturbazioni, in un solo batch: scarti e jacobiano
+        points = np.vstack([x, x + fd_step * np.eye(len(x))])
+        values = {name: np.full(len(points), float(initial[name])) for name in PARAMETERS}
+        for i, name in enumerate(fit):
+            values[name] = _from_free(name, points[:, i])
+        r = residuals(shots, values, mass, method, dt)
+        return r[0], ((r[1:] - r[0]) / fd_step).T
+
+    r, jacobian = evaluate(x)
+    cost = float(r @ r)
+    damping = 1e-3
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        normal = jacobian.T @ jacobian
+        gradient = jacobian.T @ r
+        improved = False
+        while damping < 1e10:
+            step = np.linalg.solve(normal + damping * np.diag(np.diag(normal) + 1e-12),
+                                   -gradient)
+            trial = np.clip(x + step, lower, upper)
+            r_trial, jacobian_trial = evaluate(trial)
+            cost_trial = float(r_trial @ r_trial)
+            if cost_trial < cost:
+                improved = True
+                break
+            damping *= 4.0
+        if not improved:
+            converged = True    # nessun passo riduce ancora gli scarti: minimo raggiunto
+            break
+        reduction = (cost - cost_trial) / cost
+        x, r, jacobian, cost = trial, r_trial, jacobian_trial, cost_trial
+        damping = max(damping / 3.0, 1e-12)
+        if progress is not None:
+            progress(iterations, math.sqrt(cost / len(r)))
+        if reduction < tolerance:
+            converged = True
+            break
+
+    values = dict(initial)
+    stderr = {}
+    dof = max(len(r) - len(fit), 1)
+    try:
+        covariance = np.linalg.inv(jacobian.T @ jacobian) * cost / dof
+    except np.linalg.LinAlgError:
+        covariance = np.full((len(fit), len(fit)), np.nan)
+    for i, name in enumerate(fit):
+        values[name] = float(_from_free(name, x[i]))
+        sigma = math.sqrt(max(covariance[i, i], 0.0))
+        # Per k l'errore sulla scala logaritmica è relativo
+        stderr[name] = values[name] * sigma if name == "k" else sigma
+    return Calibration(values, stderr, fit, math.sqrt(cost / len(r)), len(r), iterations,
+                       converged, time.perf_counter() - start)
+
+
+def build_profile(calibration, mass=trajectory_engine.m, area=area, rho=trajectory_engine.rho,
+                  method="euler", dt=trajectory_engine.dt, sources=()):
+    """Profilo JSON: costanti per gli script e dati della stima."""
+    k = calibration.values["k"]
+    return {"version": PROFILE_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "sources": [os.path.abspath(path) for path in sources],
+            "method": method, "dt": dt,
+            "constants": {"mass": mass, "k": k, "area": area, "Cd": 2 * k / (rho * area),
+                          "launch_efficiency": calibration.values["launch_efficiency"],
+                          "inclination_exponent": calibration.values["inclination_exponent"]},
+            "fit": {"parameters": calibration.fitted, "stderr": calibration.stderr,
+                    "rmse_m": calibration.rmse, "shots": calibration.shots,
+                    "iterations": calibration.iterations, "converged": calibration.converged,
+                    "seconds": calibration.seconds}}
+
+
+def save_profile(profile, path=profile_path):
+    """Scrive il profilo in path (scrittura atomica)."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_profile(path=profile_path):
+    """
+    Costanti del profilo di calibrazione in path (mass, k, area, Cd,
+    launch_efficiency, inclination_exponent); dizionario vuoto se il profilo
+    non esiste, così gli script tengono le proprie costanti.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        profile = json.load(f)
+    if profile.get("version") != PROFILE_VERSION:
+        raise ValueError(f"{path}: versione del profilo non supportata: "
+                         f"{profile.get('version')!r}")
+    return profile["constants"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Stima k, efficienza di lancio e perdita per l'inclinazione dai tiri misurati.")
+    parser.add_argument("csv", nargs="+", help="CSV con angle, speed, distance "
+                                               "(e facoltative inclination, impact_height)")
+    parser.add_argument("--out", default=profile_path, help="profilo di calibrazione (JSON)")
+    parser.add_argument("--mass", type=float, default=trajectory_engine.m,
+                        help="massa della freccia (kg)")
+    parser.add_argument("--area", type=float, default=area,
+                        help="sezione della freccia (m^2), per ricavare Cd")
+    parser.add_argument("--rho", type=float, default=trajectory_engine.rho)
+    parser.add_argument("--fix", action="append", default=[], choices=PARAMETERS,
+                        help="parametro da non stimare (resta al valore iniziale)")
+    for name in PARAMETERS:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=float,
+                            default=INITIAL[name], help="valore iniziale (o fisso)")
+    parser.add_argument("--method", choices=trajectory_engine.METHODS, default="euler",
+                        help="integratore, lo stesso usato dagli script")
+    parser.add_argument("--dt", type=float, default=trajectory_engine.dt)
+    parser.add_argument("--chunk-rows", type=int, default=chunk_rows)
+    parser.add_argument("--max-iterations", type=int, default=max_iterations)
+    args = parser.parse_args(argv)
+
+    try:
+        shots = read_shots(args.csv, args.chunk_rows)
+        print(f"{len(shots)} tiri misurati ({int(shots.on_target.sum())} sul bersaglio), "
+              f"{shots.dropped} righe scartate", file=sys.stderr)
+        result = fit(shots, [name for name in PARAMETERS if name not in args.fix],
+                     {name: getattr(args, name) for name in PARAMETERS}, args.mass,
+                     args.method, args.dt, args.max_iterations,
+                     lambda i, rmse: print(f"iterazione {i}: scarto quadratico medio "
+                                           f"{rmse:.4f} m", file=sys.stderr))
+    except ValueError as e:
+        parser.error(str(e))
+
+    profile = build_profile(result, args.mass, args.area, args.rho, args.method, args.dt,
+                            args.csv)
+    save_profile(profile, args.out)
+    for name in PARAMETERS:
+        note = (f"± {result.stderr[name]:.3g}" if name in result.fitted else "(fisso)")
+        print(f"{name:22s} {result.values[name]:.6g} {note}")
+    print(f"{'Cd':22s} {profile['constants']['Cd']:.6g} (sezione {args.area:g} m^2)")
+    print(f"scarto quadratico medio {result.rmse:.4f} m su {result.shots} tiri, "
+          f"{result.iterations} iterazioni in {result.seconds:.2f} s"
+          f"{'' if result.converged else ' (non convergente)'}; profilo in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""
+Disegno incrementale delle traiettorie su tk.Canvas.
+
+Invece di cancellare e ricreare linea e freccia ad ogni frame, gli oggetti del
+canvas restano persistenti: la polilinea viene estesa sul posto con i soli
+punti nuovi (canvas.insert sulle coordinate, Tk >= 8.6) e il marcatore viene
+spostato con canvas.coords. Il costo per frame resta costante qualunque sia la
+durata del volo.
+
+Prima del disegno le polilinee vengono semplificate in pixel (livello di
+dettaglio): a 5 px/m centinaia di campioni consecutivi cadono sullo stesso
+pixel. Le linee complete passano per Ramer-Douglas-Peucker (simplify), quella
+animata per una semplificazione in streaming che esamina solo i punti nuovi
+(StreamSimplifier). In entrambi i casi nessun punto scartato dista più di
+tolerance pixel dalla linea disegnata, e il numero di vertici dipende dal
+dettaglio visibile, non dal passo della simulazione.
+
+La vista (Viewport) converte metri in pixel con scala e origine variabili: si
+adatta al punto d'impatto previsto e si sposta o ingrandisce con il mouse. Uno
+zoom o uno spostamento trasforma sul posto gli oggetti già presenti
+(canvas.scale e canvas.move) invece di ricalcolarli. Le traiettorie complete
+sono divise in blocchi con il proprio rettangolo di ingombro (CulledPath):
+vengono convertiti e disegnati solo i blocchi che cadono nella vista.
+
+Linee e marcatori non più necessari non vengono cancellati ma restituiti a un
+ItemPool, che li nasconde e li riusa per gli oggetti successivi: un nuovo tiro
+riprende gli oggetti del precedente invece di ricrearli.
+"""
+import math
+
+import numpy as np
+
+# Modalità di disegno disponibili per l'animazione
+RENDER_MODES = ("incremental", "full")
+
+# Distanza massima (pixel) tra un punto scartato e la linea semplificata; 0 = nessuna
+lod_tolerance = 0.5
+
+# Zoom oltre il quale un blocco già disegnato viene ridisegnato con più dettaglio
+lod_zoom = 4.0
+
+chunk_points = 64    # punti per blocco delle traiettorie con culling
+zoom_step = 1.2      # fattore di zoom per scatto della rotella
+
+# Tag degli oggetti di dimensione fissa in pixel (marcatori): lo zoom li sposta
+# senza ingrandirli
+FIXED_TAG = "fixed"
+
+# Opzioni ripristinate sugli oggetti riusati dal pool, se non indicate
+POOL_DEFAULTS = {
+    "line": {"fill": "black", "dash": "", "width": 1, "tags": ""},
+    "oval": {"fill": "", "outline": "black", "width": 1, "tags": ""},
+}
+
+
+def simplify(points, tolerance=lod_tolerance):
+    """
+    Ramer-Douglas-Peucker su una polilinea in pixel, data come lista piatta
+    [x0, y0, x1, y1, ...] o array (n, 2). Restituisce una lista piatta con il
+    primo, l'ultimo e i soli vertici necessari entro tolerance.
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(pts) < 3 or not tolerance:
+        return pts.ravel().tolist()
+
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        seg = pts[j] - pts[i]
+        rel = pts[i + 1:j] - pts[i]
+        length = math.hypot(seg[0], seg[1])
+        if length > 0:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / length
+        else:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            mid = i + 1 + k
+            keep[mid] = True
+            stack.append((i, mid))
+            stack.append((mid, j))
+    return pts[keep].ravel().tolist()
+
+
+class StreamSimplifier:
+    """
+    Semplificazione in streaming di una polilinea in pixel (metodo del cono):
+    dall'ultimo vertice tenuto si mantiene l'intervallo di direzioni che passano
+    entro tolerance da tutti i punti ricevuti dopo di esso. Quando un nuovo
+    punto esce dall'intervallo, il punto precedente diventa vertice. Costo
+    costante per punto.
+    """
+
+    def __init__(self, tolerance=lod_tolerance):
+        self.tolerance = tolerance
+        self.anchor = None    # ultimo vertice tenuto
+        self.last = None      # ultimo punto ricevuto dopo l'anchor
+        self.reference = None  # direzione di riferimento del cono (radianti)
+        self.low = self.high = 0.0
+
+    def start(self, cx, cy):
+        self.anchor = (cx, cy)
+        self.last = None
+        self.reference = None
+
+    def push(self, cx, cy):
+        """Aggiunge un punto e restituisce i vertici diventati definitivi (lista piatta)."""
+        if not self.tolerance:
+            self.anchor = (cx, cy)
+            return [cx, cy]
+
+        ax, ay = self.anchor
+        d = math.hypot(cx - ax, cy - ay)
+        if d <= self.tolerance:
+            # Entro la tolleranza dall'anchor: va bene qualunque direzione
+            self.last = (cx, cy)
+            return []
+
+        direction = math.atan2(cy - ay, cx - ax)
+        half = math.asin(self.tolerance / d)
+        if self.reference is None:
+            self.reference = direction
+            self.low, self.high = -half, half
+            self.last = (cx, cy)
+            return []
+
+        # Angolo relativo alla direzione di riferimento, in (-pi, pi]
+        rel = math.remainder(direction - self.reference, 2 * math.pi)
+        if self.low <= rel <= self.high:
+            self.low = max(self.low, rel - half)
+            self.high = min(self.high, rel + half)
+            self.last = (cx, cy)
+            return []
+
+        # Fuori dal cono: il punto precedente diventa vertice e si riparte da lì
+        vertex = self.last
+        self.start(*vertex)
+        return [*vertex, *self.push(cx, cy)]
+
+
+class ItemPool:
+    """
+    Oggetti del canvas (linee e ovali) riutilizzabili. release nasconde un
+    oggetto e lo mette da parte; acquire ne riprende uno dello stesso tipo con
+    nuove coordinate e opzioni (quelle non indicate tornano a POOL_DEFAULTS),
+    oppure ne crea uno se non ce ne sono. Il numero di oggetti non supera mai
+    quello dei visibili contemporaneamente.
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.free = {kind: [] for kind in POOL_DEFAULTS}
+        self.kinds = {}     # oggetto -> tipo, per gli oggetti creati dal pool
+
+    def acquire(self, kind, coords, **options):
+        """Oggetto di tipo kind ("line" o "oval") con coordinate coords (lista piatta)."""
+        free = self.free[kind]
+        if not free:
+            item = getattr(self.canvas, "create_" + kind)(*coords, **options)
+            self.kinds[item] = kind
+            return item
+        item = free.pop()
+        self.canvas.coords(item, *coords)
+        self.canvas.itemconfigure(item, state="normal", **{**POOL_DEFAULTS[kind], **options})
+        self.canvas.tag_raise(item)
+        return item
+
+    def release(self, item):
+        """Nasconde l'oggetto e lo rende disponibile; gli oggetti già cancellati si ignorano."""
+        if item not in self.kinds or not self.canvas.type(item):
+            return
+        self.canvas.itemconfigure(item, state="hidden", tags="")
+        self.free[self.kinds[item]].append(item)
+
+    def reset(self):
+        """Dimentica tutti gli oggetti (da chiamare dopo canvas.delete("all"))."""
+        self.free = {kind: [] for kind in POOL_DEFAULTS}
+        self.kinds = {}
+
+
+class IncrementalTrajectory:
+    """
+    Traiettoria animata composta da una polilinea e da un marcatore circolare
+    persistenti. to_canvas è la funzione di conversione metri -> pixel dello
+    script che la usa; tolerance è la tolleranza (pixel) della semplificazione.
+    Gli oggetti vengono presi da pool (condiviso, ad esempio quello di un
+    Viewport) e vi tornano con clear.
+
+    La polilinea contiene solo i vertici definitivi; un breve segmento di coda
+    la collega all'ultimo punto ricevuto, finché questo non diventa vertice.
+    """
+
+    def __init__(self, canvas, to_canvas, fill="blue", marker_fill="black",
+                 marker_radius=5, tags="arrow", tolerance=lod_tolerance, pool=None):
+        self.canvas = canvas
+        self.pool = pool or ItemPool(canvas)
+        self.to_canvas = to_canvas
+        self.fill = fill
+        self.marker_fill = marker_fill
+        self.marker_radius = marker_radius
+        self.tags = tags
+        self.simplifier = StreamSimplifier(tolerance)
+        self.line = None
+        self.tail = None
+        self.marker = None
+        self.last_point = None  # Ultimo vertice definitivo in pixel (serve a creare la linea)
+
+    def start(self, x, y):
+        """Inizia una nuova traiettoria nel punto (x, y) in metri."""
+        self.clear()
+        cx, cy = self.to_canvas(x, y)
+        self.last_point = (cx, cy)
+        self.simplifier.start(cx, cy)
+        r = self.marker_radius
+        self.marker = self.pool.acquire("oval", (cx - r, cy - r, cx + r, cy + r),
+                                        fill=self.marker_fill, tags=(self.tags, FIXED_TAG))
+
+    def extend(self, points):
+        """
+        Aggiunge alla polilinea i nuovi punti (lista di (x, y) in metri) e
+        sposta il marcatore sull'ultimo. Vengono convertiti e semplificati solo
+        i punti nuovi.
+        """
+        self.add(*self.convert(points))
+
+    def convert(self, points):
+        """
+        Prima metà di extend, senza chiamate al canvas: converte e semplifica i
+        nuovi punti. Restituisce i nuovi vertici definitivi (lista piatta in
+        pixel) e l'ultimo punto in pixel (None se points è vuota).
+        """
+        coords = []
+        last = None
+        for (x, y) in points:
+            last = self.to_canvas(x, y)
+            coords.extend(self.simplifier.push(*last))
+        return coords, last
+
+    def add(self, coords, last):
+        """Seconda metà di extend: porta sul canvas il risultato di convert."""
+        if last is None:
+            return
+        cx, cy = last
+        self._add_vertices(coords)
+
+        # Coda dall'ultimo vertice al punto più recente
+        if self.tail is None:
+            self.tail = self.pool.acquire("line", (*self.last_point, cx, cy),
+                                          fill=self.fill, tags=self.tags)
+            self.canvas.tag_raise(self.marker)
+        else:
+            self.canvas.coords(self.tail, *self.last_point, cx, cy)
+        self.move_marker(cx, cy)
+
+    def _add_vertices(self, coords):
+        """Aggiunge alla polilinea i vertici definitivi (lista piatta in pixel)."""
+        if not coords:
+            return
+        if self.line is None:
+            # Una linea Tk richiede almeno due punti: parte dall'ultimo noto
+            self.line = self.pool.acquire("line", (*self.last_point, *coords),
+                                          fill=self.fill, tags=self.tags)
+            self.canvas.tag_raise(self.marker)
+        else:
+            self.canvas.insert(self.line, "end", coords)
+        self.last_point = (coords[-2], coords[-1])
+
+    def on_view_change(self, transform):
+        """
+        Da registrare tra i listeners di un Viewport: gli oggetti sul canvas
+        sono già trasformati, qui si aggiornano i punti in pixel tenuti in
+        memoria. Il cono della semplificazione è stato costruito alla scala
+        precedente, quindi l'ultimo punto ricevuto diventa vertice.
+        """
+        if self.last_point is None:
+            return
+        pending = self.simplifier.last
+        self.last_point = transform(*self.last_point)
+        if pending is not None:
+            self._add_vertices(list(transform(*pending)))
+        self.simplifier.start(*self.last_point)
+
+    def append(self, x, y):
+        """Aggiunge un singolo punto (in metri)."""
+        self.extend(((x, y),))
+
+    def move_marker(self, cx, cy):
+        """Sposta il marcatore nel punto (cx, cy) in pixel."""
+        r = self.marker_radius
+        self.canvas.coords(self.marker, cx - r, cy - r, cx + r, cy + r)
+
+    def clear(self):
+        """Rimuove dal canvas gli oggetti della traiettoria (restituendoli al pool)."""
+        for item in (self.line, self.tail, self.marker):
+            if item is not None:
+                self.pool.release(item)
+        self.line = None
+        self.tail = None
+        self.marker = None
+        self.last_point = None
+
+
+class CulledPath:
+    """
+    Polilinea completa (in metri) divisa in blocchi di chunk punti consecutivi;
+    ogni blocco ripete l'ultimo punto del precedente, così le linee restano
+    unite. I rettangoli di ingombro dei blocchi fanno da indice spaziale: solo
+    i blocchi che intersecano la vista vengono convertiti, semplificati e
+    disegnati. Un blocco disegnato resta sul canvas e segue zoom e spostamenti;
+    viene ridisegnato solo se lo zoom supera di lod_zoom volte quello con cui
+    era stato semplificato. Le linee vengono prese da pool (un ItemPool);
+    options va a canvas.create_line.
+    """
+
+    def __init__(self, pool, xs, ys, chunk=chunk_points, tolerance=lod_tolerance, **options):
+        self.pool = pool
+        self.xs = np.asarray(xs, dtype=float)
+        self.ys = np.asarray(ys, dtype=float)
+        self.tolerance = tolerance
+        self.options = options
+
+        n = len(self.xs)
+        self.starts = np.arange(0, max(n - 1, 0), chunk)
+        self.stops = np.minimum(self.starts + chunk + 1, n)
+        if len(self.starts):
+            last_x, last_y = self.xs[self.stops - 1], self.ys[self.stops - 1]
+            self.x_min = np.minimum(np.minimum.reduceat(self.xs, self.starts), last_x)
+            self.x_max = np.maximum(np.maximum.reduceat(self.xs, self.starts), last_x)
+            self.y_min = np.minimum(np.minimum.reduceat(self.ys, self.starts), last_y)
+            self.y_max = np.maximum(np.maximum.reduceat(self.ys, self.starts), last_y)
+        else:
+            self.x_min = self.x_max = self.y_min = self.y_max = np.empty(0)
+        self.items = [None] * len(self.starts)
+        self.drawn_scale = np.zeros(len(self.starts))   # scala del disegno, 0 = non disegnato
+
+    def draw(self, viewport):
+        """Disegna i blocchi visibili non ancora disegnati (o troppo poco dettagliati)."""
+        x0, y0, x1, y1 = viewport.visible()
+        pending = np.flatnonzero((self.x_max >= x0) & (self.x_min <= x1)
+                                 & (self.y_max >= y0) & (self.y_min <= y1)
+                                 & (self.drawn_scale * lod_zoom < viewport.scale))
+        for i in pending:
+            start, stop = self.starts[i], self.stops[i]
+            cx, cy = viewport.to_canvas(self.xs[start:stop], self.ys[start:stop])
+            if self.items[i] is not None:
+                self.pool.release(self.items[i])
+            self.items[i] = self.pool.acquire(
+                "line", simplify(np.column_stack((cx, cy)), self.tolerance), **self.options)
+            self.drawn_scale[i] = viewport.scale
+
+    def delete(self):
+        for item in self.items:
+            if item is not None:
+                self.pool.release(item)
+        self.items = [None] * len(self.starts)
+        self.drawn_scale[:] = 0.0
+
+
+class Viewport:
+    """
+    Vista di un canvas: 1 metro = scale pixel, con il punto (0, 0) nel pixel
+    (origin_x, origin_y) e l'asse y capovolto (y=0 in basso). width e height
+    sono le dimensioni iniziali del canvas, usate finché non è visibile.
+
+    Rotella del mouse: zoom attorno al puntatore; trascinamento con il tasto
+    sinistro: spostamento; doppio clic: torna all'ultimo adattamento (fit).
+    Dopo ogni trasformazione vengono chiamate le funzioni in listeners con la
+    mappa pixel vecchi -> pixel nuovi, e si disegnano i blocchi diventati
+    visibili delle traiettorie aggiunte con add_path. pool è l'ItemPool del
+    canvas, da condividere con gli altri oggetti riutilizzabili.
+    """
+
+    def __init__(self, canvas, scale, origin_x, origin_y, width, height, margin=50,
+                 min_extent=10.0, min_scale=0.05, max_scale=500.0):
+        self.canvas = canvas
+        self.pool = ItemPool(canvas)
+        self.scale = scale
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.width = width
+        self.height = height
+        self.margin = margin            # bordo lasciato attorno alla traiettoria adattata (pixel)
+        self.min_extent = min_extent    # gittata minima considerata dall'adattamento (m)
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.fitted = None              # estensione dell'ultimo adattamento (m)
+        self.paths = {}
+        self.listeners = []
+        self.drag_from = None
+
+        canvas.bind("<MouseWheel>",
+                    lambda e: self.zoom(zoom_step if e.delta > 0 else 1 / zoom_step, e.x, e.y))
+        canvas.bind("<Button-4>", lambda e: self.zoom(zoom_step, e.x, e.y))
+        canvas.bind("<Button-5>", lambda e: self.zoom(1 / zoom_step, e.x, e.y))
+        canvas.bind("<ButtonPress-1>", self.start_drag)
+        canvas.bind("<B1-Motion>", self.drag)
+        canvas.bind("<Double-Button-1>", lambda e: self.refit())
+
+    def to_canvas(self, x, y):
+        """Metri -> pixel (anche su array NumPy)."""
+        return self.origin_x + x * self.scale, self.origin_y - y * self.scale
+
+    def to_world(self, cx, cy):
+        """Pixel -> metri."""
+        return (cx - self.origin_x) / self.scale, (self.origin_y - cy) / self.scale
+
+    def size(self):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return self.width, self.height
+        return width, height
+
+    def visible(self):
+        """Rettangolo visibile in metri: (x_min, y_min, x_max, y_max)."""
+        width, height = self.size()
+        x0, y1 = self.to_world(0, 0)
+        x1, y0 = self.to_world(width, height)
+        return x0, y0, x1, y1
+
+    def transform(self, factor, dx, dy):
+        """Applica pixel -> pixel * factor + (dx, dy) alla vista e agli oggetti del canvas."""
+        if factor == 1 and not dx and not dy:
+            return
+        if factor != 1:
+            self.canvas.scale("all", 0, 0, factor, factor)
+            # I marcatori tornano alla loro dimensione attorno al nuovo centro
+            for item in self.canvas.find_withtag(FIXED_TAG):
+                coords = self.canvas.coords(item)
+                if len(coords) == 4:
+                    x0, y0, x1, y1 = coords
+                    mx, my = (x0 + x1) / 2, (y0 + y1) / 2
+                    hx, hy = (x1 - x0) / (2 * factor), (y1 - y0) / (2 * factor)
+                    self.canvas.coords(item, mx - hx, my - hy, mx + hx, my + hy)
+        if dx or dy:
+            self.canvas.move("all", dx, dy)
+        self.scale *= factor
+        self.origin_x = self.origin_x * factor + dx
+        self.origin_y = self.origin_y * factor + dy
+
+        def mapping(cx, cy):
+            return cx * factor + dx, cy * factor + dy
+        for listener in self.listeners:
+            listener(mapping)
+        for path in self.paths.values():
+            path.draw(self)
+
+    def zoom(self, factor, cx, cy):
+        """Zoom di factor attorno al pixel (cx, cy), entro min_scale e max_scale."""
+        factor = min(max(self.scale * factor, self.min_scale), self.max_scale) / self.scale
+        self.transform(factor, cx * (1 - factor), cy * (1 - factor))
+
+    def pan(self, dx, dy):
+        self.transform(1, dx, dy)
+
+    def fit(self, x_max, y_max):
+        """
+        Adatta la vista a una traiettoria che arriva fino a x_max metri in
+        orizzontale e y_max in altezza, con il lancio nell'angolo in basso a sinistra.
+        """
+        self.fitted = (x_max, y_max)
+        width, height = self.size()
+        scale = (width - 2 * self.margin) / max(x_max, self.min_extent)
+        if y_max > 0:
+            scale = min(scale, (height - 2 * self.margin) / y_max)
+        factor = min(max(scale, self.min_scale), self.max_scale) / self.scale
+        self.transform(factor, self.margin - self.origin_x * factor,
+                       height - self.margin - self.origin_y * factor)
+
+    def refit(self):
+        if self.fitted is not None:
+            self.fit(*self.fitted)
+
+    def start_drag(self, event):
+        self.drag_from = (event.x, event.y)
+
+    def drag(self, event):
+        if self.drag_from is None:
+            return
+        x, y = self.drag_from
+        self.drag_from = (event.x, event.y)
+        self.pan(event.x - x, event.y - y)
+
+    def add_path(self, key, xs, ys, **options):
+        """
+        Aggiunge (o sostituisce, se key esiste già) una traiettoria completa in
+        metri con culling sui blocchi; options va a canvas.create_line.
+        """
+        self.remove_path(key)
+        path = self.paths[key] = CulledPath(self.pool, xs, ys, **options)
+        path.draw(self)
+        return path
+
+    def remove_path(self, key):
+        path = self.paths.pop(key, None)
+        if path is not None:
+            path.delete()
+
+    def clear(self):
+        """Svuota il canvas e dimentica le traiettorie aggiunte."""
+        self.canvas.delete("all")
+        self.pool.reset()
+        self.paths = {}
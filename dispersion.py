@@ -0,0 +1,200 @@
+"""
+Analisi di dispersione Monte Carlo dei tiri.
+
+Ogni tiro reale differisce da quello nominale: massa della freccia, velocità
+di uscita, efficienza dell'arco (k_arco) e della freccia (k_elastic), angolo di
+rilascio e vento variano da una freccia all'altra. Qui si campionano fino a
+milioni di tiri perturbati, simulati a blocchi con il motore batch (la
+memoria dipende da chunk_size, non dal numero di tiri), e si accumulano in
+streaming:
+- un istogramma della distanza d'impatto, che allarga i propri intervalli
+  quando arrivano valori fuori scala;
+- media, deviazione standard, minimo e massimo esatti;
+- la dimensione media del gruppo: distanza tra la freccia più corta e la più
+  lunga in gruppi di group_shots frecce consecutive.
+I percentili si ricavano dall'istogramma, con errore entro un intervallo.
+"""
+import numpy as np
+
+import trajectory_engine
+
+chunk_size = 200_000     # tiri simulati per blocco
+histogram_bins = 400     # intervalli dell'istogramma
+group_shots = 6          # frecce per gruppo (una volée)
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class ShotSpread:
+    """
+    Variabilità dei tiri (deviazioni standard di distribuzioni normali):
+
+    - angle: angolo di rilascio (gradi)
+    - inclination: inclinazione dell'arco (gradi)
+    - speed, mass: variazioni relative di velocità iniziale e massa
+    - k_arco, k_elastic: variazioni relative delle due efficienze
+    - wind_mean, wind: vento orizzontale medio e sua variabilità (m/s)
+    """
+
+    def __init__(self, angle=0.5, inclination=0.0, speed=0.02, mass=0.02,
+                 k_arco=0.02, k_elastic=0.01, wind_mean=0.0, wind=1.0):
+        self.angle = angle
+        self.inclination = inclination
+        self.speed = speed
+        self.mass = mass
+        self.k_arco = k_arco
+        self.k_elastic = k_elastic
+        self.wind_mean = wind_mean
+        self.wind = wind
+
+
+class StreamingHistogram:
+    """
+    Istogramma a intervalli uguali costruito a blocchi. Gli estremi sono presi
+    dal primo blocco; se un blocco successivo esce dall'intervallo coperto, la
+    larghezza degli intervalli viene raddoppiata (unendo le coppie vicine)
+    fino a coprirlo, senza perdere i conteggi precedenti.
+    """
+
+    def __init__(self, bins=histogram_bins):
+        self.bins = bins + bins % 2   # numero pari: le coppie si uniscono senza resti
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.low = None
+        self.width = None
+
+    @property
+    def edges(self):
+        return self.low + self.width * np.arange(self.bins + 1)
+
+    def _grow(self, lo, hi):
+        while lo < self.low or hi >= self.low + self.width * self.bins:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts = np.zeros(self.bins, dtype=np.int64)
+            if lo < self.low:
+                # Il nuovo intervallo si estende a sinistra
+                self.counts[self.bins // 2:] = merged
+                self.low -= self.width * self.bins
+            else:
+                self.counts[:self.bins // 2] = merged
+            self.width *= 2
+
+    def add(self, values):
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+        lo, hi = values.min(), values.max()
+        if self.low is None:
+            span = hi - lo
+            margin = 0.05 * span if span > 0 else max(abs(lo), 1.0) * 1e-3
+            self.low = lo - margin
+            self.width = (span + 2 * margin) / self.bins
+        self._grow(lo, hi)
+        index = np.minimum(((values - self.low) / self.width).astype(np.int64), self.bins - 1)
+        self.counts += np.bincount(index, minlength=self.bins)
+
+    def percentile(self, q):
+        """Percentile q (0-100) interpolato linearmente dentro l'intervallo che lo contiene."""
+        total = self.counts.sum()
+        if not total:
+            return np.nan
+        cumulative = np.cumsum(self.counts)
+        target = q / 100 * total
+        i = min(int(np.searchsorted(cumulative, target)), self.bins - 1)
+        before = cumulative[i - 1] if i else 0
+        frac = (target - before) / self.counts[i] if self.counts[i] else 0.0
+        return self.low + self.width * (i + frac)
+
+
+class DispersionResult:
+    """
+    Esito dell'analisi: tiri simulati e atterrati, statistiche della distanza
+    d'impatto (m), percentili {q: valore}, dimensione media del gruppo (m)
+    e istogramma.
+    """
+
+    def __init__(self, shots, landed, mean, std, minimum, maximum, percentiles,
+                 group_size, group_shots, histogram):
+        self.shots = shots
+        self.landed = landed
+        self.mean = mean
+        self.std = std
+        self.min = minimum
+        self.max = maximum
+        self.percentiles = percentiles
+        self.group_size = group_size
+        self.group_shots = group_shots
+        self.histogram = histogram
+
+    def density(self):
+        """Densità d'impatto (1/m) per intervallo e relativi estremi."""
+        h = self.histogram
+        return h.counts / max(self.landed, 1) / h.width, h.edges
+
+
+def sample_shots(rng, n, launch_angle, initial_speed, bow_inclination, mass,
+                 drag_coefficient, k_arco, k_elastic, spread):
+    """Parametri di n tiri perturbati, pronti per simulate_batch."""
+    def relative(sd, floor=0.0):
+        return np.maximum(1.0 + rng.normal(0.0, sd, n), floor)
+
+    return dict(
+        launch_angle=launch_angle + rng.normal(0.0, spread.angle, n),
+        initial_speed=initial_speed * relative(spread.speed),
+        bow_inclination=bow_inclination + rng.normal(0.0, spread.inclination, n),
+        mass=mass * relative(spread.mass, 0.1),
+        drag_coefficient=drag_coefficient,
+        launch_efficiency=k_arco * k_elastic * relative(spread.k_arco) * relative(spread.k_elastic),
+        wind=rng.normal(spread.wind_mean, spread.wind, n),
+    )
+
+
+def run_dispersion(launch_angle, initial_speed, bow_inclination=0.0,
+                   mass=trajectory_engine.m, drag_coefficient=trajectory_engine.k,
+                   k_arco=1.0, k_elastic=1.0, spread=None, shots=1_000_000,
+                   chunk_size=chunk_size, group_shots=group_shots, bins=histogram_bins,
+                   seed=None, model="point", **sim_kwargs):
+    """
+    Simula shots tiri perturbati attorno a quello nominale, a blocchi di
+    chunk_size, con il motore batch del modello di volo model (vedi
+    trajectory_engine.MODELS) e restituisce un DispersionResult. Gli argomenti
+    aggiuntivi (method, dt, ...) vanno al motore batch.
+    """
+    engine = trajectory_engine.engine(model)
+    spread = spread or ShotSpread()
+    rng = np.random.default_rng(seed)
+    histogram = StreamingHistogram(bins)
+    landed = 0
+    total = total_sq = 0.0
+    minimum, maximum = np.inf, -np.inf
+    group_total, groups = 0.0, 0
+
+    # Ogni blocco è un multiplo di group_shots, così i gruppi non si spezzano
+    chunk_size = max(group_shots, chunk_size - chunk_size % group_shots)
+    for start in range(0, shots, chunk_size):
+        n = min(chunk_size, shots - start)
+        params = sample_shots(rng, n, launch_angle, initial_speed, bow_inclination, mass,
+                              drag_coefficient, k_arco, k_elastic, spread)
+        result = engine.simulate_batch(**params, **sim_kwargs)
+        distance = np.where(result.landed, result.range, np.nan)
+
+        # Gruppi di group_shots frecce consecutive; quelli con una freccia persa non contano
+        full = n - n % group_shots
+        spread_of_group = np.ptp(distance[:full].reshape(-1, group_shots), axis=1)
+        spread_of_group = spread_of_group[np.isfinite(spread_of_group)]
+        group_total += spread_of_group.sum()
+        groups += spread_of_group.size
+
+        distance = distance[np.isfinite(distance)]
+        histogram.add(distance)
+        landed += distance.size
+        if distance.size:
+            total += distance.sum()
+            total_sq += np.square(distance).sum()
+            minimum = min(minimum, distance.min())
+            maximum = max(maximum, distance.max())
+
+    mean = total / landed if landed else np.nan
+    std = np.sqrt(max(total_sq / landed - mean * mean, 0.0)) if landed else np.nan
+    return DispersionResult(shots, landed, mean, std, minimum, maximum,
+                            {q: histogram.percentile(q) for q in PERCENTILES},
+                            group_total / groups if groups else np.nan,
+                            group_shots, histogram)
@@ -0,0 +1,408 @@
+"""
+Ambiente del tiro: densità dell'aria, vento e terreno.
+
+Gli script assumono aria ferma a densità costante (rho = 1.225) e un suolo
+piano a quota 0. Qui un Environment descrive invece:
+- la densità dell'aria in funzione della quota (atmosfera standard alla quota
+  del campo, oppure un profilo letto da file), che scala il drag rispetto
+  alla densità di riferimento di trajectory_engine.rho;
+- un campo di vento orizzontale in funzione di distanza e quota (profilo
+  con legge di potenza dal suolo, oppure una griglia letta da file), che si
+  somma al vento uniforme di ogni freccia;
+- il terreno come profilo altimetrico lungo la linea di tiro (da file), con
+  eventuali bersagli rialzati.
+
+Densità e vento sono precalcolati in tabelle su griglia uniforme
+(LookupTable): nel passo vettoriale della forza ogni valutazione costa un
+indice e un'interpolazione lineare, senza ricerche. Il terreno è una
+spezzata indicizzata per intervalli di x (Terrain): ogni passo delle frecce
+viene prima confrontato con la quota massima degli intervalli che attraversa
+e solo i pochi candidati vengono intersecati con i segmenti di quegli
+intervalli, così il costo non cresce con la dimensione del profilo.
+
+Tutte le quote sono relative al punto di lancio, come ground_height in
+trajectory_engine. Un ambiente si passa ai motori batch con
+environment=... e si può descrivere in un file JSON (vedi load):
+
+    {"altitude": 800,
+     "wind": {"speed": 4.0, "reference_height": 10.0},
+     "terrain": "terreno.csv",
+     "targets": [{"distance": 70.0, "height": 1.3}]}
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import trajectory_engine
+
+here = os.path.dirname(os.path.abspath(__file__))
+config_path = os.path.join(here, "ambiente.json")   # ambiente letto dagli script, se esiste
+
+# Griglia verticale delle tabelle di densità e vento (m rispetto al punto di lancio)
+table_bottom = -50.0
+table_top = 300.0
+table_step = 1.0
+
+# Atmosfera standard (troposfera)
+sea_level_density = 1.225       # kg/m^3
+sea_level_temperature = 288.15  # K
+lapse_rate = 0.0065             # K/m
+density_exponent = 4.2559       # g M / (R L) - 1
+
+# Profilo del vento
+reference_height = 10.0   # quota di misura del vento (m dal suolo)
+wind_exponent = 1 / 7     # esponente della legge di potenza (terreno aperto)
+launch_height = 1.5       # altezza del punto di lancio sul suolo (m)
+
+# Terreno
+far = 1e6                 # prolungamento orizzontale del profilo oltre i suoi estremi (m)
+segments_per_cell = 4     # segmenti medi per intervallo dell'indice
+min_cell = 1.0            # intervallo minimo dell'indice (m), circa un passo di integrazione
+target_depth = 0.3        # spessore predefinito di un bersaglio rialzato (m)
+surface_tolerance = 1e-3  # quota (m) sotto il terreno ancora considerata in superficie
+
+
+class LookupTable:
+    """
+    Valori su una griglia uniforme a uno o due assi, con interpolazione
+    lineare (bilineare); fuori dalla griglia vale il bordo più vicino.
+    """
+
+    def __init__(self, values, origin, spacing):
+        values = np.asarray(values, dtype=float)
+        # Almeno due nodi per asse, così l'interpolazione non ha casi speciali
+        for axis in range(values.ndim):
+            if values.shape[axis] == 1:
+                values = np.concatenate((values, values), axis=axis)
+        self.values = np.ascontiguousarray(values)
+        self.flat = self.values.ravel()
+        self.origin = tuple(float(o) for o in np.atleast_1d(origin))
+        self.spacing = tuple(float(s) for s in np.atleast_1d(spacing))
+        if not len(self.origin) == len(self.spacing) == values.ndim:
+            raise ValueError("origin e spacing devono avere un valore per asse della tabella")
+
+    def _index(self, coord, axis):
+        size = self.values.shape[axis]
+        position = np.clip((coord - self.origin[axis]) / self.spacing[axis], 0.0, size - 1)
+        index = np.minimum(position.astype(np.intp), size - 2)
+        return index, position - index
+
+    def __call__(self, *coords):
+        if len(coords) != self.values.ndim:
+            raise ValueError(f"La tabella ha {self.values.ndim} assi, coordinate: {len(coords)}")
+        i, a = self._index(np.asarray(coords[0], dtype=float), 0)
+        if self.values.ndim == 1:
+            return self.flat[i] + a * (self.flat[i + 1] - self.flat[i])
+        j, b = self._index(np.asarray(coords[1], dtype=float), 1)
+        stride = self.values.shape[1]
+        p = i * stride + j
+        low = self.flat[p] + b * (self.flat[p + 1] - self.flat[p])
+        high = self.flat[p + stride] + b * (self.flat[p + stride + 1] - self.flat[p + stride])
+        return low + a * (high - low)
+
+
+def _heights():
+    return np.arange(table_bottom, table_top + table_step / 2, table_step)
+
+
+def standard_density(altitude):
+    """Densità dell'aria (kg/m^3) dell'atmosfera standard alla quota altitude (m s.l.m.)."""
+    temperature = sea_level_temperature - lapse_rate * np.asarray(altitude, dtype=float)
+    return sea_level_density * (temperature / sea_level_temperature) ** density_exponent
+
+
+def density_table(altitude=0.0):
+    """Rapporto tra densità e trajectory_engine.rho per quota relativa al lancio."""
+    heights = _heights()
+    return LookupTable(standard_density(altitude + heights) / trajectory_engine.rho,
+                       heights[0], table_step)
+
+
+def wind_profile(speed, reference_height=reference_height, exponent=wind_exponent,
+                 launch_height=launch_height):
+    """
+    Vento (m/s) che cresce con l'altezza dal suolo come (z / reference_height)^exponent,
+    speed alla quota di misura; nullo al suolo e sotto. Tabella a due assi
+    (distanza, quota) con un solo nodo in distanza.
+    """
+    heights = _heights()
+    above = np.maximum(launch_height + heights, 0.0)
+    values = speed * (above / reference_height) ** exponent
+    return LookupTable(values[None, :], (0.0, heights[0]), (1.0, table_step))
+
+
+def _columns(path, *names):
+    """Colonne di un CSV con intestazione (NumPy, senza pandas); mancano quelle assenti."""
+    data = np.genfromtxt(path, delimiter=",", names=True, dtype=float, encoding="utf-8")
+    data = np.atleast_1d(data)
+    missing = [name for name in names[:2] if name not in data.dtype.names]
+    if missing:
+        raise ValueError(f"{path}: colonne mancanti: {', '.join(missing)}")
+    return [data[name] if name in data.dtype.names else None for name in names]
+
+
+def read_density(path):
+    """Profilo di densità da un CSV con colonne height (m dal lancio) e density (kg/m^3)."""
+    height, density = _columns(path, "height", "density")
+    order = np.argsort(height)
+    heights = _heights()
+    return LookupTable(np.interp(heights, height[order], density[order]) / trajectory_engine.rho,
+                       heights[0], table_step)
+
+
+def read_wind(path, x_step=1.0):
+    """
+    Campo di vento da un CSV con colonne height (m dal lancio), wind (m/s) e,
+    facoltativa, x (m): un profilo verticale per ogni distanza misurata,
+    ricampionato sulla griglia uniforme (x_step in distanza, table_step in quota).
+    """
+    height, wind, x = _columns(path, "height", "wind", "x")
+    x = np.zeros_like(height) if x is None else x
+    heights = _heights()
+    stations = np.unique(x)
+    profiles = []
+    for station in stations:
+        rows = x == station
+        order = np.argsort(height[rows])
+        profiles.append(np.interp(heights, height[rows][order], wind[rows][order]))
+    profiles = np.array(profiles)
+    if stations.size == 1:
+        return LookupTable(profiles, (stations[0], heights[0]), (1.0, table_step))
+    grid = np.arange(stations[0], stations[-1] + x_step / 2, x_step)
+    values = np.array([np.interp(grid, stations, profiles[:, j]) for j in range(heights.size)]).T
+    return LookupTable(values, (grid[0], heights[0]), (x_step, table_step))
+
+
+class Terrain:
+    """
+    Profilo del terreno lungo la linea di tiro: spezzata per i punti (xs,
+    heights) con xs non decrescenti (due punti con la stessa x descrivono
+    una parete verticale, ad esempio la faccia di un bersaglio), prolungata
+    in orizzontale oltre gli estremi.
+
+    L'indice divide [xs[0], xs[-1]] in intervalli uguali e ne conserva il primo
+    e l'ultimo segmento e la quota massima; intersect lo usa per scartare
+    senza calcoli i passi che passano sopra il terreno.
+    """
+
+    def __init__(self, xs, heights, cell=None):
+        xs = np.asarray(xs, dtype=float)
+        heights = np.asarray(heights, dtype=float)
+        if xs.ndim != 1 or xs.shape != heights.shape or xs.size < 2:
+            raise ValueError("Il profilo richiede almeno due punti (x, quota)")
+        if np.any(np.diff(xs) < 0) or not np.isfinite(xs).all() or not np.isfinite(heights).all():
+            raise ValueError("Le x del profilo devono essere finite e non decrescenti")
+        self.profile = (xs, heights)
+        self.xs = np.concatenate(([xs[0] - far], xs, [xs[-1] + far]))
+        self.heights = np.concatenate(([heights[0]], heights, [heights[-1]]))
+        self.bottom = heights.min()
+
+        self.x0 = xs[0]
+        span = max(xs[-1] - xs[0], 1e-9)
+        self.cell = cell or max(span * segments_per_cell / (xs.size - 1), min_cell)
+        self.cells = max(1, int(np.ceil(span / self.cell)))
+        seg_lo, seg_hi = self._cell(self.xs[:-1]), self._cell(self.xs[1:])
+        cells = np.arange(self.cells)
+        self.first = np.searchsorted(seg_hi, cells, side="left")
+        self.last = np.searchsorted(seg_lo, cells, side="right") - 1
+        seg_top = np.maximum(self.heights[:-1], self.heights[1:])
+        self.cell_top = np.full(self.cells, -np.inf)
+        for offset in range(int((seg_hi - seg_lo).max()) + 1):
+            spans = seg_lo + offset <= seg_hi
+            np.maximum.at(self.cell_top, seg_lo[spans] + offset, seg_top[spans])
+
+    @classmethod
+    def read(cls, path, cell=None):
+        """Profilo da un CSV con colonne x e height (m rispetto al punto di lancio)."""
+        x, height = _columns(path, "x", "height")
+        return cls(x, height, cell)
+
+    def _cell(self, x):
+        return np.clip(((x - self.x0) / self.cell).astype(np.intp), 0, self.cells - 1)
+
+    def _pairs(self, c0, c1):
+        """
+        Coppie (passo, segmento) per passi che attraversano gli intervalli da
+        c0 a c1: indice del passo, indice del segmento e inizio di ogni passo.
+        """
+        first = self.first[c0]
+        counts = self.last[c1] - first + 1
+        starts = np.cumsum(counts) - counts
+        owner = np.repeat(np.arange(c0.size), counts)
+        return owner, np.arange(counts.sum()) - starts[owner] + first[owner], starts
+
+    def height(self, x):
+        """Quota del terreno (m) alle distanze x."""
+        return np.interp(x, self.xs, self.heights)
+
+    def with_target(self, distance, height, depth=target_depth):
+        """
+        Nuovo profilo con un bersaglio rialzato (paglione): un blocco alto
+        height sopra il terreno, la cui faccia è a distance metri.
+        """
+        xs, heights = self.profile
+        base = np.interp([distance, distance + depth], xs, heights)
+        before, after = xs < distance, xs > distance + depth
+        return Terrain(
+            np.concatenate((xs[before], [distance, distance, distance + depth, distance + depth],
+                            xs[after])),
+            np.concatenate((heights[before], [base[0], base[0] + height, base[1] + height, base[1]],
+                            heights[after])))
+
+    def intersect(self, x0, y0, x1, y1):
+        """
+        Primo ingresso nel terreno dei passi (x0, y0) -> (x1, y1) di un batch di
+        frecce. Restituisce (hit, s): hit per ogni passo che entra nel terreno
+        e s, frazione del passo (0-1) al punto d'ingresso (NaN senza impatto).
+        """
+        x_lo, x_hi = np.minimum(x0, x1), np.maximum(x0, x1)
+        c0, c1 = self._cell(x_lo), self._cell(x_hi)
+
+        # Fase larga: quota massima degli intervalli attraversati dal passo
+        top = self.cell_top[c0]
+        reach = c1 - c0
+        for offset in range(1, int(reach.max(initial=0)) + 1):
+            ahead = self.cell_top[c0 + np.minimum(offset, reach)]
+            top = np.where(offset <= reach, np.maximum(top, ahead), top)
+        candidates = np.flatnonzero(np.minimum(y0, y1) <= top)
+
+        hit = np.zeros(np.shape(x0), dtype=bool)
+        s = np.full(np.shape(x0), np.nan)
+        if not candidates.size:
+            return hit, s
+
+        # Fase intermedia: un passo entra nel terreno solo se finisce sotto di esso o
+        # se un vertice del profilo sporge sopra la sua corda
+        px, py = x0[candidates], y0[candidates]
+        dx, dy = x1[candidates] - px, y1[candidates] - py
+        d0 = py - self.height(px)
+        d1 = py + dy - self.height(px + dx)
+        owner, segment, starts = self._pairs(c0[candidates], c1[candidates])
+        vx, vy = self.xs[segment], self.heights[segment]
+        slope = dy / np.where(dx != 0, dx, 1.0)
+        above = ((vx >= x_lo[candidates][owner]) & (vx <= x_hi[candidates][owner])
+                 & (vy > py[owner] + (vx - px[owner]) * slope[owner]))
+        close = (np.logical_or.reduceat(above, starts) | (d0 < -surface_tolerance) | (d1 < 0)
+                 | (dx == 0))
+        candidates, px, py, dx, dy, d0, d1 = (
+            a[close] for a in (candidates, px, py, dx, dy, d0, d1))
+        if not candidates.size:
+            return hit, s
+
+        # Fase stretta: intersezione con i segmenti degli intervalli attraversati,
+        # tutte le coppie (passo, segmento) insieme
+        owner, segment, starts = self._pairs(c0[candidates], c1[candidates])
+        ax, ay = self.xs[segment], self.heights[segment]
+        ex, ey = self.xs[segment + 1] - ax, self.heights[segment + 1] - ay
+        sx, sy = dx[owner], dy[owner]
+        denom = sx * ey - sy * ex
+        # Solo passi che entrano nel terreno (dall'alto, o da davanti una parete)
+        entering = denom > 0
+        safe = np.where(entering, denom, 1.0)
+        qx, qy = ax - px[owner], ay - py[owner]
+        t = (qx * ey - qy * ex) / safe
+        u = (qx * sy - qy * sx) / safe
+        valid = entering & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+        best = np.minimum.reduceat(np.where(valid, t, np.inf), starts)
+
+        # Passi che finiscono sotto il terreno senza intersezione trovata (un vertice
+        # colpito esattamente, o il lancio in superficie verso un pendio più ripido):
+        # interpolazione lineare della quota sul terreno. Una freccia che parte sotto
+        # il terreno lo colpisce subito
+        found = np.isfinite(best)
+        missed = ~found & (d0 >= -surface_tolerance) & (d1 < 0)
+        inside = ~found & (d0 < -surface_tolerance)
+        d0 = np.maximum(d0, 0.0)
+        best = np.where(missed, d0 / np.where(missed, d0 - d1, 1.0), best)
+        best = np.where(inside, 0.0, best)
+        found |= missed | inside
+
+        hit[candidates[found]] = True
+        s[candidates[found]] = best[found]
+        return hit, s
+
+
+class Environment:
+    """
+    Campi dell'ambiente, tutti facoltativi: density (LookupTable del rapporto
+    con trajectory_engine.rho, in funzione della quota), wind (LookupTable del
+    vento in funzione di distanza e quota, m/s) e terrain (Terrain).
+    """
+
+    def __init__(self, density=None, wind=None, terrain=None):
+        self.density = density
+        self.wind = wind
+        self.terrain = terrain
+        self.fingerprint = self._fingerprint()
+
+    def _fingerprint(self):
+        """Impronta dei campi, per le chiavi delle cache (trajectory_cache)."""
+        digest = hashlib.sha1()
+        for name, field in (("density", self.density), ("wind", self.wind)):
+            if field is not None:
+                digest.update(name.encode())
+                digest.update(repr((field.origin, field.spacing, field.values.shape)).encode())
+                digest.update(field.values.tobytes())
+        if self.terrain is not None:
+            digest.update(b"terrain")
+            for array in self.terrain.profile:
+                digest.update(array.tobytes())
+        return f"ambiente-{digest.hexdigest()[:16]}"
+
+    def apply(self, x, y, c, wind):
+        """Fattore di drag c scalato con la densità e vento uniforme più il campo, in (x, y)."""
+        if self.density is not None:
+            c = c * self.density(y)
+        if self.wind is not None:
+            wind = wind + self.wind(x, y)
+        return c, wind
+
+    def surface(self, level):
+        """Quota (m) sotto cui una freccia è certamente sotto il suolo, con ground_height level."""
+        return np.minimum(level + (0.0 if self.terrain is None else self.terrain.bottom), 0.0)
+
+
+def load(path=config_path):
+    """
+    Environment descritto dal file JSON in path; None se il file non esiste,
+    così gli script restano con aria ferma e suolo piano. Chiavi, tutte
+    facoltative (i file sono relativi alla cartella del JSON):
+    - altitude: quota del campo (m s.l.m.) per la densità dell'atmosfera standard;
+    - density: CSV height,density al posto dell'atmosfera standard;
+    - wind: CSV height,wind[,x] oppure {"speed", "reference_height",
+      "exponent", "launch_height"} per il profilo dal suolo;
+    - terrain: CSV x,height del profilo del terreno;
+    - targets: bersagli rialzati [{"distance", "height", "depth"}].
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        config = json.load(f)
+    folder = os.path.dirname(os.path.abspath(path))
+
+    def resolve(name):
+        return os.path.join(folder, name)
+
+    density = None
+    if "density" in config:
+        density = read_density(resolve(config["density"]))
+    elif "altitude" in config:
+        density = density_table(config["altitude"])
+
+    wind = config.get("wind")
+    if isinstance(wind, str):
+        wind = read_wind(resolve(wind))
+    elif wind is not None:
+        wind = wind_profile(**wind)
+
+    terrain = None
+    if "terrain" in config:
+        terrain = Terrain.read(resolve(config["terrain"]))
+    targets = config.get("targets", [])
+    if targets and terrain is None:
+        terrain = Terrain([0.0, 1.0], [0.0, 0.0])
+    for target in targets:
+        terrain = terrain.with_target(**target)
+    return Environment(density, wind, terrain)
@@ -0,0 +1,253 @@
+"""
+Punto d'ingresso da riga di comando, veloce ad avviarsi.
+
+Il percorso senza grafica (gittate, traiettorie) importa solo NumPy e il
+motore batch: niente tkinter, matplotlib o pandas, e nessun display. I moduli
+pesanti si caricano solo per i comandi che li usano: sweep (pandas), render e
+plot (matplotlib), gui (tkinter e, per prompt2_gpto1.py, matplotlib).
+
+Comandi:
+- range: gittata, quota massima e tempo di volo di uno o più tiri (griglia
+  angolo x velocità x inclinazione), in tabella o CSV;
+- trajectory: campioni t, x, y, vx, vy di un tiro in CSV;
+- sweep, render, service, calibrate: gli stessi argomenti di sweep.py,
+  headless_render.py, trajectory_service.py e calibration.py;
+- plot: grafico di un tiro in una finestra o su file (PNG/SVG);
+- gui: apre uno dei quattro script;
+- startup: misura l'avvio a freddo del percorso senza grafica (processi
+  nuovi) e lo confronta con startup_budget; esce con errore se lo supera o
+  se sono stati importati moduli grafici.
+
+Esempio:
+    python freccia.py range --angle 10:80:8 --speed 50
+    python freccia.py trajectory --angle 45 --speed 50 > tiro.csv
+    python freccia.py gui prompt2_gpt_o3_mini_high
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import trajectory_engine
+from sweep import parse_values
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPTS = ("prompt1_gpto1", "prompt2_gpto1", "prompt1_gpt_o3_mini_high",
+           "prompt2_gpt_o3_mini_high")
+
+# Comandi che passano i propri argomenti al main di un altro modulo
+PASSTHROUGH = {"sweep": "sweep", "render": "headless_render", "service": "trajectory_service",
+               "calibrate": "calibration"}
+
+# Moduli che il percorso senza grafica non deve importare
+HEAVY_MODULES = ("tkinter", "matplotlib", "pandas", "pyarrow", "scipy")
+
+startup_budget = 0.5   # tempo massimo (s) di un avvio a freddo di "range"
+startup_runs = 5       # processi avviati per la misura
+STARTUP_COMMAND = ("range", "--angle", "45", "--speed", "50")
+
+
+def add_shot_arguments(parser, grid=True):
+    """Parametri del tiro e del motore, comuni a range, trajectory e plot."""
+    kind = parse_values if grid else float
+    metavar = "VALORI" if grid else None
+    parser.add_argument("--angle", type=kind, default=[45.0] if grid else 45.0, metavar=metavar,
+                        help="angolo di lancio (gradi)")
+    parser.add_argument("--speed", type=kind, default=[50.0] if grid else 50.0, metavar=metavar,
+                        help="velocità iniziale (m/s)")
+    parser.add_argument("--inclination", type=kind, default=[0.0] if grid else 0.0,
+                        metavar=metavar, help="inclinazione dell'arco (gradi)")
+    parser.add_argument("--mass", type=float, default=trajectory_engine.m)
+    parser.add_argument("--k", type=float, default=trajectory_engine.k,
+                        help="fattore di drag (kg/m)")
+    parser.add_argument("--efficiency", type=float, default=1.0,
+                        help="efficienza di lancio, k_arco * k_elastic (0-1)")
+    parser.add_argument("--wind", type=float, default=0.0, help="vento orizzontale (m/s)")
+    parser.add_argument("--method", choices=trajectory_engine.METHODS, default="euler")
+    parser.add_argument("--dt", type=float, default=trajectory_engine.dt)
+    parser.add_argument("--environment", metavar="JSON",
+                        help="ambiente (densità, vento, terreno) descritto come in environment.py")
+
+
+def engine_kwargs(args):
+    kwargs = dict(mass=args.mass, drag_coefficient=args.k, launch_efficiency=args.efficiency,
+                  wind=args.wind, method=args.method, dt=args.dt)
+    if args.environment:
+        import environment
+
+        if not os.path.exists(args.environment):
+            raise SystemExit(f"{args.environment}: file non trovato")
+        kwargs["environment"] = environment.load(args.environment)
+    return kwargs
+
+
+def command_range(args):
+    angle, speed, inclination = (a.ravel() for a in np.meshgrid(
+        args.angle, args.speed, args.inclination, indexing="ij"))
+    result = trajectory_engine.simulate_batch(angle, speed, inclination, **engine_kwargs(args))
+    columns = (angle, speed, inclination, result.range, result.apex, result.flight_time,
+               result.landed)
+    if args.csv:
+        print("angle,speed,inclination,range,apex,flight_time,landed")
+        for a, s, i, r, h, t, landed in zip(*columns):
+            print(f"{a:.6g},{s:.6g},{i:.6g},{r:.6g},{h:.6g},{t:.6g},{bool(landed)}")
+        return
+    print(f"{'angolo':>7s} {'velocità':>9s} {'incl.':>6s} {'gittata':>9s} "
+          f"{'quota max':>10s} {'volo':>7s}")
+    for a, s, i, r, h, t, landed in zip(*columns):
+        note = "" if landed else "  (non atterrata)"
+        print(f"{a:6.1f}° {s:5.1f} m/s {i:5.1f}° {r:7.2f} m {h:8.2f} m {t:5.2f} s{note}")
+
+
+def simulate_shot(args):
+    """Stati di un tiro (playback.StateBuffer completo), chiusi dal punto d'impatto."""
+    import playback
+
+    buffer = playback.StateBuffer()
+    playback.integrate(buffer, args.angle, args.speed, args.inclination, **engine_kwargs(args))
+    if buffer.error is not None:
+        raise buffer.error
+    return buffer
+
+
+def command_trajectory(args):
+    buffer = simulate_shot(args)
+    print("t,x,y,vx,vy")
+    for row in zip(buffer.times, buffer.xs, buffer.ys, buffer.vxs, buffer.vys):
+        print(",".join(f"{v:.6g}" for v in row))
+
+
+def command_plot(args):
+    import headless_render
+
+    spec = {"launch_angle": args.angle, "initial_speed": args.speed,
+            "bow_inclination": args.inclination}
+    buffer = simulate_shot(args)
+    if args.out:
+        fmt = os.path.splitext(args.out)[1].lstrip(".").lower() or "png"
+        headless_render.Renderer().save(spec, buffer, args.out, fmt)
+        return
+    import matplotlib.pyplot as plt
+
+    figure = plt.figure(figsize=headless_render.figsize)
+    headless_render.Renderer(figure=figure).draw_shot(spec, buffer)
+    plt.show()
+
+
+def command_gui(args):
+    import runpy
+
+    runpy.run_path(os.path.join(here, f"{args.script}.py"), run_name="__main__")
+
+
+def measure_startup(runs=startup_runs):
+    """
+    Avvio a freddo del percorso senza grafica: tempi (s) di runs processi
+    nuovi che eseguono STARTUP_COMMAND, tempo dell'interprete vuoto, import
+    di primo livello con il loro tempo cumulato (s, da python -X importtime)
+    e nomi di tutti i moduli importati.
+    """
+    import statistics
+    import subprocess
+    import time
+
+    command = [sys.executable, os.path.abspath(__file__), *STARTUP_COMMAND]
+
+    def timed(cmd):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        return time.perf_counter() - start
+
+    baseline = statistics.median(timed([sys.executable, "-c", "pass"]) for _ in range(runs))
+    times = [timed(command) for _ in range(runs)]
+
+    trace = subprocess.run([sys.executable, "-X", "importtime", *command[1:]], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    imports = {}
+    modules = set()
+    for line in trace.splitlines():
+        fields = line.split("|")
+        if (not line.startswith("import time:") or len(fields) != 3
+                or not fields[1].strip().isdigit()):
+            continue
+        name = fields[2].rstrip()
+        modules.add(name.strip())
+        # Solo gli import di primo livello (quelli annidati sono indentati)
+        if name.startswith(" ") and not name.startswith("  "):
+            imports[name.strip()] = int(fields[1]) / 1e6
+    return times, baseline, imports, modules
+
+
+def command_startup(args):
+    import statistics
+
+    times, baseline, imports, modules = measure_startup(args.runs)
+    median = statistics.median(times)
+    heavy = sorted({name.split(".")[0] for name in modules} & set(HEAVY_MODULES))
+    print(f"avvio a freddo di '{' '.join(STARTUP_COMMAND)}': mediana {median * 1e3:.0f} ms "
+          f"(min {min(times) * 1e3:.0f}, max {max(times) * 1e3:.0f}) su {len(times)} processi; "
+          f"interprete vuoto {baseline * 1e3:.0f} ms; budget {args.budget * 1e3:.0f} ms")
+    print("import più costosi:")
+    for name, seconds in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:30s} {seconds * 1e3:7.1f} ms")
+    failed = False
+    if heavy:
+        print(f"moduli grafici importati senza necessità: {', '.join(heavy)}")
+        failed = True
+    if median > args.budget:
+        print(f"budget superato di {(median - args.budget) * 1e3:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="freccia.py", description="Traiettorie, gittate e sweep senza interfaccia grafica.",
+        epilog='Gli assi di range accettano "inizio:fine:numero", un elenco "a,b,c" o un '
+               'singolo valore.')
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("range", help="gittata, quota massima e tempo di volo")
+    add_shot_arguments(p)
+    p.add_argument("--csv", action="store_true", help="risultati in CSV")
+    p.set_defaults(run=command_range)
+
+    p = commands.add_parser("trajectory", help="campioni di un tiro in CSV")
+    add_shot_arguments(p, grid=False)
+    p.set_defaults(run=command_trajectory)
+
+    for name, module in PASSTHROUGH.items():
+        commands.add_parser(name, add_help=False,
+                            help=f"come {module}.py (python freccia.py {name} --help)")
+
+    p = commands.add_parser("plot", help="grafico di un tiro (finestra o file)")
+    add_shot_arguments(p, grid=False)
+    p.add_argument("--out", help="file PNG o SVG invece della finestra")
+    p.set_defaults(run=command_plot)
+
+    p = commands.add_parser("gui", help="apre uno degli script con interfaccia")
+    p.add_argument("script", choices=SCRIPTS)
+    p.set_defaults(run=command_gui)
+
+    p = commands.add_parser("startup", help="misura l'avvio a freddo del percorso senza grafica")
+    p.add_argument("--runs", type=int, default=startup_runs)
+    p.add_argument("--budget", type=float, default=startup_budget, help="secondi")
+    p.add_argument("--top", type=int, default=8, help="import più costosi da mostrare")
+    p.set_defaults(run=command_startup)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in PASSTHROUGH:
+        import importlib
+
+        return importlib.import_module(PASSTHROUGH[argv[0]]).main(argv[1:])
+    args = build_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
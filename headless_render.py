@@ -0,0 +1,305 @@
+"""
+Rendering senza display delle traiettorie, su file PNG/SVG e sequenze di frame.
+
+Le figure sono costruite con l'API a oggetti di matplotlib sul canvas Agg:
+nessuna finestra, nessun backend interattivo e nessun server grafico, quindi
+funziona anche su macchine di CI senza display. Lo stile è quello dei grafici
+degli script: traiettoria teorica rossa tratteggiata, reale blu continua,
+freccia come cerchio nero.
+
+- Renderer.save: un tiro su PNG o SVG (formato dall'estensione del file);
+- Renderer.frames: la sequenza di frame PNG dell'animazione a fps fissi. Lo
+  sfondo (assi, griglia, traiettoria teorica) è rasterizzato una volta, poi
+  ogni frame ridisegna solo la linea reale e la freccia (blitting, come in
+  prompt2_gpto1.py);
+- export_batch: migliaia di tiri su un pool di processi; ogni processo riusa
+  la stessa figura per tutti i suoi tiri. Un'esportazione interrotta si
+  riprende rilanciando lo stesso comando (le immagini già scritte vengono
+  saltate); render.json nella cartella descrive tiri e opzioni, e una
+  cartella con un'esportazione diversa viene rifiutata invece di mescolare
+  immagini di tiri diversi.
+
+I tiri sono simulati con il motore batch oppure letti da un archivio
+trajectory_store senza simularli di nuovo.
+
+Esempio:
+    python headless_render.py --angle 10:80:71 --speed 30:90:13 --out immagini
+    python headless_render.py --store archivio_tiri --frames --out animazioni
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import shutil
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.image import imsave
+
+import playback
+import trajectory_cache
+import trajectory_engine
+import trajectory_store
+from sweep import parse_values
+
+FORMATS = ("png", "svg")
+MANIFEST = "render.json"
+
+figsize = (7, 5)      # dimensioni della figura (pollici), come in prompt1_gpto1.py
+dpi = 100
+fps = 30              # frame al secondo delle animazioni
+task_size = 32        # tiri per processo in ogni compito del pool
+
+_stores = {}          # archivi aperti dal processo (percorso -> TrajectoryStore)
+
+
+def shot_states(spec, mass=trajectory_engine.m, drag_coefficient=trajectory_engine.k,
+                dt=trajectory_engine.dt, method="euler"):
+    """
+    Stati del tiro reale (playback.StateBuffer completo): letti dall'archivio se
+    spec indica "store" e "index", altrimenti simulati.
+    """
+    if "store" in spec:
+        store = _stores.get(spec["store"])
+        if store is None:
+            store = _stores[spec["store"]] = trajectory_store.TrajectoryStore(spec["store"])
+        return store.shot(spec["index"]).buffer()
+    buffer = playback.StateBuffer()
+    playback.integrate(buffer, spec["launch_angle"], spec["initial_speed"],
+                       spec.get("bow_inclination", 0.0), mass=mass,
+                       drag_coefficient=drag_coefficient, dt=dt, method=method)
+    if buffer.error is not None:
+        raise buffer.error
+    return buffer
+
+
+class Renderer:
+    """
+    Figura Agg riutilizzabile per disegnare molti tiri. Con figure si disegna
+    invece su una figura già esistente (ad esempio una finestra di pyplot).
+    """
+
+    def __init__(self, figsize=figsize, dpi=dpi, figure=None):
+        if figure is None:
+            figure = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+        self.canvas = figure.canvas
+        self.ax = self.figure.add_subplot(111)
+        self.theo_line, = self.ax.plot([], [], 'r--', label='Teorica (no attrito)')
+        self.real_line, = self.ax.plot([], [], 'b-', label='Reale (con attrito)')
+        self.marker, = self.ax.plot([], [], 'o', color='black', markersize=8)
+        self.ax.set_xlabel("Distanza (m)")
+        self.ax.set_ylabel("Altezza (m)")
+        self.ax.legend()
+        self.ax.grid(True)
+
+    def draw_shot(self, spec, buffer):
+        """Prepara la figura per il tiro: traiettorie complete, freccia all'impatto, limiti."""
+        x_theo, y_theo = trajectory_cache.theoretical_path(spec["launch_angle"],
+                                                          spec["initial_speed"])
+        self.theo_line.set_data(x_theo, y_theo)
+        self.real_line.set_data(buffer.xs, buffer.ys)
+        self.marker.set_data([buffer.xs[-1]], [buffer.ys[-1]])
+        self.ax.set_title(f"Tiro con angolo = {spec['launch_angle']:.1f}°, "
+                          f"velocità = {spec['initial_speed']:.1f} m/s")
+
+        # Limiti come in prompt2_gpto1.py: 10% di margine oltre la traiettoria più ampia
+        max_x = max(x_theo.max(), max(buffer.xs))
+        max_y = max(y_theo.max(), max(buffer.ys))
+        self.ax.set_xlim(0, max_x * 1.1 if max_x > 0 else 10)
+        self.ax.set_ylim(min(0, min(buffer.ys)), max_y * 1.1 if max_y > 0 else 10)
+
+    def save(self, spec, buffer, path, fmt="png"):
+        self.draw_shot(spec, buffer)
+        self.figure.savefig(path, format=fmt)
+
+    def frames(self, spec, buffer, out_dir, fps=fps, time_scale=1.0):
+        """
+        Scrive in out_dir i frame PNG (frame-00000.png, ...) dell'animazione del
+        tiro: un frame ogni 1/fps secondi di tempo reale, con il tempo simulato
+        che scorre time_scale volte più veloce. Restituisce il numero di frame.
+        """
+        self.draw_shot(spec, buffer)
+        for artist in (self.real_line, self.marker):
+            artist.set_animated(True)
+        self.canvas.draw()
+        background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+        xs, ys = [buffer.xs[0]], [buffer.ys[0]]
+        cursor = 1
+        flight_time = buffer.times[-1]
+        n = int(math.ceil(flight_time * fps / time_scale)) + 1
+        for i in range(n):
+            t = min(i * time_scale / fps, flight_time)
+            points, (x, y), cursor = buffer.read(cursor, t)
+            for (px, py) in points:
+                xs.append(px)
+                ys.append(py)
+            self.real_line.set_data(xs + [x], ys + [y])
+            self.marker.set_data([x], [y])
+
+            self.canvas.restore_region(background)
+            self.ax.draw_artist(self.real_line)
+            self.ax.draw_artist(self.marker)
+            imsave(os.path.join(out_dir, f"frame-{i:05d}.png"),
+                   np.asarray(self.canvas.buffer_rgba()))
+
+        for artist in (self.real_line, self.marker):
+            artist.set_animated(False)
+        return n
+
+
+_renderer = None
+
+
+def render_task(specs, out_dir, fmt="png", frames=False, fps=fps, time_scale=1.0, dpi=dpi,
+                **sim_kwargs):
+    """
+    Compito del pool: disegna i tiri di specs (ognuno con il proprio "name") in
+    out_dir, saltando quelli già presenti. Le scritture sono atomiche.
+    Restituisce il numero di tiri disegnati.
+    """
+    global _renderer
+    if _renderer is None or _renderer.figure.dpi != dpi:
+        _renderer = Renderer(dpi=dpi)
+    done = 0
+    for spec in specs:
+        path = os.path.join(out_dir, spec["name"] if frames else f"{spec['name']}.{fmt}")
+        if os.path.exists(path):
+            continue
+        buffer = shot_states(spec, **sim_kwargs)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if frames:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            _renderer.frames(spec, buffer, tmp_path, fps, time_scale)
+        else:
+            _renderer.save(spec, buffer, tmp_path, fmt)
+        os.replace(tmp_path, path)
+        done += 1
+    return done
+
+
+def prepare_output(specs, out_dir, options):
+    """
+    Crea la cartella di output o verifica che contenga la stessa esportazione
+    (tiri e opzioni in MANIFEST), ed elimina i file e le cartelle temporanei
+    lasciati da un'esecuzione interrotta. Solleva ValueError se la cartella
+    contiene un'esportazione diversa.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    description = json.loads(json.dumps({"specs": specs, "options": options}))
+    manifest = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            if json.load(f) != description:
+                raise ValueError(f"{out_dir} contiene immagini di tiri o opzioni diversi")
+    elif any(name != MANIFEST for name in os.listdir(out_dir)):
+        raise ValueError(f"{out_dir} non è vuota e non contiene {MANIFEST}")
+    else:
+        with open(manifest, "w") as f:
+            json.dump(description, f, indent=2)
+    for name in os.listdir(out_dir):
+        if name.endswith(".tmp"):
+            tmp_path = os.path.join(out_dir, name)
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path)
+            else:
+                os.remove(tmp_path)
+
+
+def export_batch(specs, out_dir, workers=None, progress=None, **options):
+    """
+    Disegna tutti i tiri di specs (dizionari con launch_angle, initial_speed,
+    bow_inclination oppure store e index) in out_dir su un pool di processi, a
+    compiti di task_size tiri. progress, se indicata, riceve (tiri completati,
+    tiri totali). options va a render_task. Restituisce i tiri disegnati;
+    solleva ValueError se out_dir contiene un'esportazione diversa.
+    """
+    specs = [dict(spec, name=spec.get("name", f"shot-{i:06d}")) for i, spec in enumerate(specs)]
+    prepare_output(specs, out_dir, options)
+    workers = workers or os.cpu_count()
+    rendered = completed = 0
+
+    def collect(futures):
+        nonlocal rendered, completed
+        for future in futures:
+            rendered += future.result()
+            completed += future.size
+            if progress:
+                progress(completed, len(specs))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Al più due compiti in coda per processo, come in sweep.py
+        running = set()
+        for start in range(0, len(specs), task_size):
+            task = specs[start:start + task_size]
+            future = pool.submit(render_task, task, out_dir, **options)
+            future.size = len(task)
+            running.add(future)
+            if len(running) >= 2 * workers:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                collect(finished)
+        collect(wait(running).done)
+    return rendered
+
+
+def store_specs(path, limit=None):
+    """Tiri di un archivio trajectory_store, con i parametri letti dall'indice."""
+    store = trajectory_store.TrajectoryStore(path)
+    index = store.index
+    n = len(index) if limit is None else min(limit, len(index))
+    return [{"store": path, "index": i, "launch_angle": float(index["launch_angle"][i]),
+             "initial_speed": float(index["initial_speed"][i])} for i in range(n)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rendering senza display delle traiettorie su PNG/SVG o sequenze di frame.",
+        epilog='Ogni asse accetta "inizio:fine:numero", un elenco "a,b,c" o un singolo valore.')
+    parser.add_argument("--angle", type=parse_values, default=[45.0], metavar="VALORI")
+    parser.add_argument("--speed", type=parse_values, default=[50.0], metavar="VALORI")
+    parser.add_argument("--inclination", type=parse_values, default=[0.0], metavar="VALORI")
+    parser.add_argument("--store", help="disegna i tiri di un archivio invece della griglia")
+    parser.add_argument("--limit", type=int, help="numero massimo di tiri dell'archivio")
+    parser.add_argument("--mass", type=float, default=trajectory_engine.m)
+    parser.add_argument("--k", type=float, default=trajectory_engine.k)
+    parser.add_argument("--method", choices=trajectory_engine.METHODS, default="euler")
+    parser.add_argument("--dt", type=float, default=trajectory_engine.dt)
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("--frames", action="store_true",
+                        help="sequenze di frame PNG dell'animazione (una cartella per tiro)")
+    parser.add_argument("--fps", type=float, default=fps)
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="velocità del tempo simulato nelle animazioni")
+    parser.add_argument("--dpi", type=float, default=dpi)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processi del pool (predefinito: tutti i core)")
+    parser.add_argument("--out", required=True, help="cartella delle immagini")
+    args = parser.parse_args(argv)
+
+    if args.store:
+        specs = store_specs(args.store, args.limit)
+    else:
+        specs = [{"launch_angle": a, "initial_speed": s, "bow_inclination": i}
+                 for a, s, i in itertools.product(args.angle, args.speed, args.inclination)]
+    print(f"{len(specs)} tiri", file=sys.stderr)
+    try:
+        rendered = export_batch(
+            specs, args.out, args.workers,
+            lambda done, n: print(f"{done}/{n}", file=sys.stderr),
+            fmt=args.format, frames=args.frames, fps=args.fps, time_scale=args.time_scale,
+            dpi=args.dpi, mass=args.mass, drag_coefficient=args.k, dt=args.dt,
+            method=args.method)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{rendered} tiri disegnati in {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Storico dei tiri per il confronto sovrapposto.
+
+Ogni tiro completato resta sul canvas con il proprio colore, insieme ai
+parametri che lo hanno prodotto e agli stati della simulazione, così da poterlo
+rivedere senza integrarlo di nuovo. Lo storico tiene al più size tiri: quando
+è pieno il più vecchio viene tolto e i suoi oggetti tornano al pool del
+Viewport, pronti per il tiro successivo, quindi memoria e oggetti del canvas
+restano limitati. Le traiettorie sono disegnate con culling come le altre
+curve complete (Viewport.add_path): anche decine di tiri sovrapposti costano
+solo i tratti visibili, e zoom e spostamenti non li ricreano.
+"""
+import collections
+
+from canvas_rendering import FIXED_TAG
+
+# Colori assegnati ai tiri, a rotazione
+COLORS = ("blue", "darkorange", "green", "purple", "brown",
+          "deeppink", "teal", "olive", "navy", "firebrick")
+
+history_size = 24    # tiri mantenuti sul canvas
+marker_radius = 4    # raggio (pixel) del marcatore del punto d'impatto
+
+
+class Shot:
+    """
+    Un tiro dello storico: numero progressivo, parametri (gradi e m/s),
+    colore e stati simulati (playback.StateBuffer, None finché il tiro non
+    è completo).
+    """
+
+    def __init__(self, number, launch_angle, initial_speed, bow_inclination, color):
+        self.number = number
+        self.launch_angle = launch_angle
+        self.initial_speed = initial_speed
+        self.bow_inclination = bow_inclination
+        self.color = color
+        self.buffer = None
+        self.marker = None
+        self.store_id = None    # indice nell'archivio (trajectory_store), se archiviato
+
+    @property
+    def key(self):
+        """Chiave della traiettoria nel Viewport."""
+        return f"shot-{self.number}"
+
+    def label(self):
+        text = (f"#{self.number}  {self.launch_angle:.1f}°  {self.initial_speed:.0f} m/s  "
+                f"incl. {self.bow_inclination:.0f}°")
+        if self.buffer is not None and self.buffer.xs:
+            text += f"  {self.buffer.xs[-1]:.1f} m"
+        return text
+
+
+class ShotHistory:
+    """Ultimi size tiri, dal più vecchio al più recente, disegnati su viewport."""
+
+    def __init__(self, viewport, size=history_size):
+        self.viewport = viewport
+        self.size = size
+        self.shots = collections.deque()
+        self.count = 0
+
+    def new_shot(self, launch_angle, initial_speed, bow_inclination):
+        """Aggiunge un tiro ancora da simulare; se lo storico è pieno toglie il più vecchio."""
+        self.count += 1
+        shot = Shot(self.count, launch_angle, initial_speed, bow_inclination,
+                    COLORS[(self.count - 1) % len(COLORS)])
+        self.shots.append(shot)
+        while len(self.shots) > self.size:
+            self.hide(self.shots.popleft())
+        return shot
+
+    def show(self, shot):
+        """Disegna il tiro completo (traiettoria e punto d'impatto) con il suo colore."""
+        self.hide(shot)
+        xs, ys = shot.buffer.xs, shot.buffer.ys
+        self.viewport.add_path(shot.key, xs, ys, fill=shot.color, tags="history")
+        cx, cy = self.viewport.to_canvas(xs[-1], ys[-1])
+        r = marker_radius
+        shot.marker = self.viewport.pool.acquire("oval", (cx - r, cy - r, cx + r, cy + r),
+                                                 fill=shot.color, outline=shot.color,
+                                                 tags=("history", FIXED_TAG))
+
+    def hide(self, shot):
+        """Toglie il tiro dal canvas (gli oggetti tornano al pool), lasciandolo nello storico."""
+        self.viewport.remove_path(shot.key)
+        if shot.marker is not None:
+            self.viewport.pool.release(shot.marker)
+            shot.marker = None
+
+    def remove(self, shot):
+        self.hide(shot)
+        self.shots.remove(shot)
+
+    def clear(self):
+        for shot in self.shots:
+            self.hide(shot)
+        self.shots.clear()
@@ -0,0 +1,161 @@
+"""
+Riproduzione dell'animazione disaccoppiata dal ciclo di eventi di Tk.
+
+La fisica del tiro non avanza più di un passo per ogni callback di
+master.after (con il tempo simulato legato ai ritardi di Tk e alla durata del
+ridisegno): un thread di lavoro integra il volo con il motore batch e pubblica
+gli stati (t, x, y) in un buffer. La GUI legge il buffer a frequenza di display
+e mostra la freccia all'istante simulato corrente, interpolando tra gli stati
+vicini; l'istante avanza con il tempo reale moltiplicato per un fattore di
+scala (rallentatore o avanti veloce). Se la fisica è più lenta del display,
+l'animazione attende i nuovi stati invece di bloccare l'interfaccia.
+"""
+import bisect
+import threading
+import time
+
+import numpy as np
+
+import trajectory_engine
+
+frame_ms = 16                       # intervallo tra due frame della GUI (ms)
+min_time_scale = 0.1                # rallentatore massimo
+max_time_scale = 4.0                # avanti veloce massimo
+
+
+class StateBuffer:
+    """
+    Stati (t, x, y, vx, vy) pubblicati dal thread di fisica in ordine di tempo e
+    letti dalla GUI. finished indica che non arriveranno altri stati; landed è
+    l'esito del tiro riportato dal motore (None finché non è noto).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.times = []
+        self.xs = []
+        self.ys = []
+        self.vxs = []
+        self.vys = []
+        self.finished = False
+        self.landed = None
+        self.error = None
+
+    def publish(self, times, xs, ys, vxs, vys, finished=False, landed=None):
+        with self._lock:
+            self.times.extend(times)
+            self.xs.extend(xs)
+            self.ys.extend(ys)
+            self.vxs.extend(vxs)
+            self.vys.extend(vys)
+            self.finished = self.finished or finished
+            if landed is not None:
+                self.landed = landed
+
+    def fail(self, error):
+        with self._lock:
+            self.error = error
+            self.finished = True
+
+    def last_time(self):
+        with self._lock:
+            return self.times[-1] if self.times else 0.0
+
+    def extent(self):
+        """Ascissa e quota massime raggiunte dagli stati pubblicati (m)."""
+        with self._lock:
+            if not self.times:
+                return 0.0, 0.0
+            return max(self.xs), max(self.ys)
+
+    def read(self, start, t):
+        """
+        Stati con indice da start in poi e istante <= t, più la posizione
+        interpolata all'istante t. Restituisce (punti, (x, y), indice successivo).
+        """
+        with self._lock:
+            if not self.times:
+                return [], (0.0, 0.0), start
+            end = bisect.bisect_right(self.times, t, lo=min(start, len(self.times)))
+            points = list(zip(self.xs[start:end], self.ys[start:end]))
+            if end == len(self.times):
+                position = (self.xs[-1], self.ys[-1])
+            else:
+                t0, t1 = self.times[end - 1], self.times[end]
+                s = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+                position = (self.xs[end - 1] + s * (self.xs[end] - self.xs[end - 1]),
+                            self.ys[end - 1] + s * (self.ys[end] - self.ys[end - 1]))
+        return points, position, end
+
+
+def integrate(buffer, launch_angle, initial_speed, bow_inclination=0.0, model="point",
+              **engine_kwargs):
+    """
+    Integra un tiro con il motore batch del modello di volo model (vedi
+    trajectory_engine.MODELS) e ne pubblica gli stati nel buffer, chiusi dal
+    punto d'impatto esatto (con la velocità dell'ultimo stato). Pensata per
+    girare nel thread di fisica.
+    """
+    try:
+        result = trajectory_engine.engine(model).simulate_batch(
+            [launch_angle], [initial_speed], [bow_inclination], record_paths=True,
+            **engine_kwargs)
+        xs, ys = result.paths[0][:, 0], result.paths[1][:, 0]
+        vxs, vys = result.velocities[0][:, 0], result.velocities[1][:, 0]
+        times = result.times[:, 0]
+        airborne = ~np.isnan(xs)
+        last_y = result.impact_height[0]
+        buffer.publish(np.append(times[airborne], result.flight_time[0]).tolist(),
+                       np.append(xs[airborne], result.range[0]).tolist(),
+                       np.append(ys[airborne], last_y).tolist(),
+                       np.append(vxs[airborne], vxs[airborne][-1]).tolist(),
+                       np.append(vys[airborne], vys[airborne][-1]).tolist(), finished=True,
+                       landed=bool(result.landed[0]))
+    except Exception as e:
+        buffer.fail(e)
+
+
+class Playback:
+    """
+    Un tiro in riproduzione: avvia il thread di fisica e, ad ogni frame,
+    avanza l'istante simulato secondo il tempo reale trascorso e la scala dei
+    tempi, senza superare gli stati già disponibili.
+
+    Con buffer (già completo, ad esempio quello di un tiro precedente) il tiro
+    viene solo rivisto: nessun thread e nessuna nuova integrazione.
+    """
+
+    def __init__(self, launch_angle, initial_speed, bow_inclination=0.0, buffer=None,
+                 **engine_kwargs):
+        self.time = 0.0         # istante simulato mostrato (s)
+        self.cursor = 1         # primo stato non ancora restituito (lo 0 è il lancio)
+        self.last_wall = None
+        if buffer is not None:
+            self.buffer = buffer
+            self.thread = None
+            return
+        self.buffer = StateBuffer()
+        self.thread = threading.Thread(target=integrate, daemon=True,
+                                       args=(self.buffer, launch_angle, initial_speed,
+                                             bow_inclination),
+                                       kwargs=engine_kwargs)
+        self.thread.start()
+
+    def advance(self, time_scale=1.0):
+        """
+        Avanza al frame corrente. Restituisce gli stati superati dall'ultimo
+        frame (lista di (x, y)), la posizione interpolata della freccia e se la
+        riproduzione è terminata.
+        """
+        if self.buffer.error is not None:
+            raise self.buffer.error
+        now = time.perf_counter()
+        if self.last_wall is not None:
+            scale = min(max(time_scale, min_time_scale), max_time_scale)
+            self.time = min(self.time + (now - self.last_wall) * scale,
+                            self.buffer.last_time())
+        self.last_wall = now
+
+        points, position, self.cursor = self.buffer.read(self.cursor, self.time)
+        done = self.buffer.finished and self.cursor >= len(self.buffer.times)
+        return points, position, done
@@ -0,0 +1,260 @@
+"""
+Strumentazione dei frame della GUI, attivabile a richiesta.
+
+Quando l'animazione scatta non si vede se la colpa è della fisica, della
+conversione metri -> pixel, delle chiamate al canvas o del ritardo con cui Tk
+esegue i callback. FrameProfiler misura ogni callback strumentato (un frame):
+- il tempo di ogni fase (blocchi "with profiler.phase(nome)");
+- il ritardo tra l'istante chiesto a master.after e quello in cui il
+  callback parte davvero;
+- gli oggetti vivi sul canvas (o gli artisti della figura) a fine frame.
+
+Le ultime window misure di ogni callback danno i percentili mobili mostrati
+dallo HUD (CanvasHUD sul tk.Canvas, FigureHUD sugli assi matplotlib); la
+traccia completa si salva in JSON o CSV per l'analisi a posteriori.
+
+Disattivato, ogni fase costa una chiamata di funzione e nessuna misura.
+"""
+import collections
+import csv
+import functools
+import json
+import time
+
+import numpy as np
+
+window = 240            # frame per callback nei percentili mobili (4 s a 60 Hz)
+trace_limit = 100_000   # frame conservati nella traccia (i più vecchi vengono scartati)
+hud_every = 10          # frame tra due aggiornamenti dello HUD
+HUD_PERCENTILES = (50, 95, 99)
+
+TRACE_VERSION = 1
+
+
+class _NullPhase:
+    """Fase fuori da un frame misurato: non fa nulla."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        phases = self.record["phases"]
+        phases[self.name] = (phases.get(self.name, 0.0)
+                             + (time.perf_counter() - self.start) * 1e3)
+        return False
+
+
+class FrameProfiler:
+    """
+    Misure per frame dei callback della GUI. count_items, se indicata,
+    restituisce gli oggetti vivi sul canvas; le funzioni in listeners
+    ricevono il profiler ogni hud_every frame (ad esempio per lo HUD).
+    """
+
+    def __init__(self, count_items=None, enabled=False, window=window):
+        self.count_items = count_items
+        self.enabled = enabled
+        self.window = window
+        self.listeners = []
+        self.trace = collections.deque(maxlen=trace_limit)
+        self.recent = {}          # callback -> ultimi frame (deque di record)
+        self.scheduled = {}       # callback -> (istante della richiesta, ritardo chiesto in ms)
+        self.frames = 0
+        self.start = time.perf_counter()
+        self._record = None
+
+    def schedule(self, callback, delay_ms):
+        """Da chiamare insieme a master.after(delay_ms, callback)."""
+        if self.enabled:
+            self.scheduled[callback] = (time.perf_counter(), delay_ms)
+
+    def phase(self, name):
+        """Blocco with che misura la fase name del frame in corso."""
+        if self._record is None:
+            return _NULL_PHASE
+        return _Phase(self._record, name)
+
+    def run(self, callback, func, *args, **kwargs):
+        """Esegue func come un frame del callback indicato."""
+        if not self.enabled or self._record is not None:
+            # Disattivato, o chiamato da un frame già in corso (ne fa parte)
+            return func(*args, **kwargs)
+        now = time.perf_counter()
+        latency = None
+        requested = self.scheduled.pop(callback, None)
+        if requested is not None:
+            latency = (now - requested[0]) * 1e3 - requested[1]
+        record = self._record = {"callback": callback, "frame": self.frames,
+                                 "t": now - self.start, "latency_ms": latency, "phases": {}}
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record["total_ms"] = (time.perf_counter() - now) * 1e3
+            self._record = None
+            # Un callback uscito subito (ad esempio l'anteprima durante l'animazione) non conta
+            if record["phases"]:
+                self._finish(record)
+
+    def _finish(self, record):
+        record["items"] = self.count_items() if self.count_items else None
+        self.trace.append(record)
+        recent = self.recent.get(record["callback"])
+        if recent is None:
+            recent = self.recent[record["callback"]] = collections.deque(maxlen=self.window)
+        recent.append(record)
+        self.frames += 1
+        if self.frames % hud_every == 0:
+            for listener in self.listeners:
+                listener(self)
+
+    def reset(self):
+        self.trace.clear()
+        self.recent.clear()
+        self.scheduled.clear()
+        self.frames = 0
+        self.start = time.perf_counter()
+
+    def summary(self, percentiles=HUD_PERCENTILES):
+        """
+        Percentili mobili per callback: {callback: {misura: {p: valore}}}, con
+        le misure totale, latenza, le fasi (ms) e gli oggetti.
+        """
+        summary = {}
+        for callback, records in self.recent.items():
+            series = {"totale": [r["total_ms"] for r in records],
+                      "latenza": [r["latency_ms"] for r in records
+                                  if r["latency_ms"] is not None]}
+            for record in records:
+                for name, value in record["phases"].items():
+                    series.setdefault(name, []).append(value)
+            series["oggetti"] = [r["items"] for r in records if r["items"] is not None]
+            summary[callback] = {name: dict(zip(percentiles,
+                                                np.percentile(values, percentiles).tolist()))
+                                 for name, values in series.items() if values}
+        return summary
+
+    def phase_names(self):
+        names = {}
+        for record in self.trace:
+            names.update(dict.fromkeys(record["phases"]))
+        return list(names)
+
+    def export(self, path):
+        """Scrive la traccia in path: CSV se termina con .csv, altrimenti JSON."""
+        if path.endswith(".csv"):
+            phases = self.phase_names()
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["callback", "frame", "t_s", "total_ms", "latency_ms", "items",
+                                 *(f"{name}_ms" for name in phases)])
+                for r in self.trace:
+                    writer.writerow([r["callback"], r["frame"], f"{r['t']:.6f}",
+                                     f"{r['total_ms']:.4f}",
+                                     "" if r["latency_ms"] is None else f"{r['latency_ms']:.4f}",
+                                     "" if r["items"] is None else r["items"],
+                                     *(f"{r['phases'][name]:.4f}" if name in r["phases"] else ""
+                                       for name in phases)])
+            return
+        with open(path, "w") as f:
+            json.dump({"version": TRACE_VERSION,
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                       "window": self.window,
+                       "summary": self.summary(),
+                       "frames": list(self.trace)}, f, indent=1)
+
+
+def profiled(callback):
+    """
+    Decoratore per i metodi della GUI: ogni chiamata è un frame di callback
+    per il FrameProfiler in self.profiler.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            return self.profiler.run(callback, method, self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def hud_text(profiler):
+    """Righe dello HUD: per ogni callback i percentili mobili di ogni misura."""
+    lines = []
+    header = " ".join(f"{'p' + str(p):>6s}" for p in HUD_PERCENTILES)
+    for callback, metrics in profiler.summary().items():
+        lines.append(f"{callback} ({len(profiler.recent[callback])} frame)")
+        for name, values in metrics.items():
+            unit = "" if name == "oggetti" else " ms"
+            lines.append(f"  {name:10s}" + " ".join(f"{v:6.1f}" for v in values.values()) + unit)
+    if lines:
+        lines.insert(0, f"{'':12s}{header}")
+    return "\n".join(lines)
+
+
+class CanvasHUD:
+    """
+    Testo dello HUD nell'angolo in alto a sinistra di un tk.Canvas, ricreato
+    se il canvas è stato svuotato. Zoom e spostamenti della vista lo muovono
+    con gli altri oggetti: on_view_change, registrata tra i listeners del
+    Viewport, lo riporta al suo posto.
+    """
+
+    def __init__(self, canvas, x=10, y=10, tags="hud"):
+        self.canvas = canvas
+        self.x = x
+        self.y = y
+        self.tags = tags
+        self.item = None
+
+    def update(self, profiler):
+        text = hud_text(profiler)
+        if self.item is None or not self.canvas.type(self.item):
+            self.item = self.canvas.create_text(self.x, self.y, anchor="nw", text=text,
+                                                font=("Courier", 9), fill="gray20",
+                                                tags=self.tags)
+        else:
+            self.canvas.itemconfigure(self.item, text=text, state="normal")
+            self.canvas.coords(self.item, self.x, self.y)
+        self.canvas.tag_raise(self.item)
+
+    def on_view_change(self, transform):
+        if self.item is not None and self.canvas.type(self.item):
+            self.canvas.coords(self.item, self.x, self.y)
+
+    def hide(self):
+        if self.item is not None and self.canvas.type(self.item):
+            self.canvas.itemconfigure(self.item, state="hidden")
+
+
+class FigureHUD:
+    """
+    Testo dello HUD sugli assi matplotlib, come artista animated: va
+    disegnato con gli altri artisti del blitting (ax.draw_artist(hud.text)).
+    """
+
+    def __init__(self, ax):
+        self.text = ax.text(0.01, 0.99, "", transform=ax.transAxes, va="top", ha="left",
+                            family="monospace", fontsize=7, color="0.2", animated=True,
+                            visible=False)
+
+    def update(self, profiler):
+        self.text.set_text(hud_text(profiler))
+        self.text.set_visible(True)
+
+    def hide(self):
+        self.text.set_visible(False)
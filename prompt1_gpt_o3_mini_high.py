@@ -1,35 +1,94 @@
 import tkinter as tk
-import math
+
+import history
+import playback
+import profiling
+import trajectory_cache
+import trajectory_store
+from canvas_rendering import IncrementalTrajectory, Viewport, simplify
 
 # Costanti fisiche e parametri della simulazione
 g = 9.81         # Accelerazione di gravità (m/s^2)
 dt = 0.02        # Passo temporale (s)
 m = 0.1          # Massa della freccia (kg)
 k = 0.02         # Fattore di attrito (drag); da regolare in base al modello
+launch_efficiency = 1.0     # Rapporto tra velocità effettiva e impostata (k_arco * k_elastic)
+inclination_exponent = 1.0  # Perdita per l'inclinazione dell'arco: cos(inclinazione)^esponente
 
-# Parametri per la rappresentazione grafica
+# Parametri per la rappresentazione grafica (vista iniziale, poi adattata al tiro)
 scale = 5           # 1 metro corrisponde a 5 pixel
 canvas_width = 800
 canvas_height = 600
 origin_x = 50       # Origine per la x (in pixel)
 origin_y = canvas_height - 50  # Origine per la y (in pixel)
 
-def to_canvas_coords(x, y):
+# Modalità di disegno dell'animazione: "incremental" estende gli oggetti esistenti,
+# "full" ricrea ad ogni frame tutta la traiettoria reale
+render_mode = "incremental"
+
+# Integratore del thread di fisica (vedi trajectory_engine.METHODS): con dt = 0.02 "rk4"
+# sbaglia la gittata di meno di un millimetro, "euler" di oltre un metro (vedi benchmark.py)
+physics_method = "rk4"
+
+# Modello di volo del thread di fisica: "point" punto materiale (trajectory_engine),
+# "rigid" corpo rigido con beccheggio, penne e flessione della canna (rigid_body, RK4)
+flight_model = "point"
+
+# Tiri mantenuti sul canvas in modalità confronto
+history_size = 24
+
+# Cartella dell'archivio dei tiri simulati (None per non archiviare)
+store_path = "archivio_tiri"
+
+# Traccia della profilazione dei frame (salvata in .json e .csv)
+trace_path = "traccia_frame"
+
+
+def configure_engine():
     """
-    Converte le coordinate fisiche (in metri) in coordinate canvas (in pixel).
-    Nota: l'asse y viene capovolto (y=0 in basso).
+    Costanti del modello con attrito, le stesse per il thread di fisica e per le chiavi
+    della cache: le stime qui sopra, sostituite dalle costanti misurate di un profilo di
+    calibrazione (calibration.py) se presente, con il modello di volo scelto e l'ambiente
+    del tiro (densità dell'aria, vento, terreno) da ambiente.json, se presente; senza il
+    file aria ferma e suolo piano (vedi environment.py). Letti all'avvio della finestra,
+    non all'importazione. Restituisce (engine_kwargs, ambiente o None).
     """
-    return origin_x + x * scale, origin_y - y * scale
+    import calibration
+    import environment
+
+    calibrated = calibration.load_profile()
+    engine_kwargs = dict(mass=calibrated.get("mass", m), drag_coefficient=calibrated.get("k", k),
+                         launch_efficiency=calibrated.get("launch_efficiency", launch_efficiency),
+                         inclination_exponent=calibrated.get("inclination_exponent",
+                                                             inclination_exponent),
+                         dt=dt, method=physics_method)
+    if flight_model == "rigid":
+        import rigid_body
+
+        engine_kwargs.update(model="rigid", dt=rigid_body.dt, method="rk4")
+
+    shot_environment = environment.load()
+    if shot_environment is not None:
+        engine_kwargs["environment"] = shot_environment
+    return engine_kwargs, shot_environment
+
 
 class SimulationApp:
     def __init__(self, master):
         self.master = master
         self.master.title("Simulazione Tiro Freccia")
         
+        # Costanti del modello con attrito e ambiente del tiro (profilo di calibrazione e
+        # ambiente.json letti qui, non all'importazione)
+        self.engine_kwargs, self.environment = configure_engine()
+        
         # Canvas per il disegno
         self.canvas = tk.Canvas(master, width=canvas_width, height=canvas_height, bg="white")
         self.canvas.pack(side=tk.TOP)
         
+        # Vista con zoom (rotella) e spostamento (trascinamento); doppio clic per riadattarla
+        self.viewport = Viewport(self.canvas, scale, origin_x, origin_y, canvas_width, canvas_height)
+        
         # Frame dei controlli
         control_frame = tk.Frame(master)
         control_frame.pack(side=tk.BOTTOM)
@@ -55,113 +114,287 @@ class SimulationApp:
                                             from_=10, to=100, orient=tk.HORIZONTAL)
         self.initial_speed_scale.grid(row=2, column=1)
         
+        # Scala dei tempi dell'animazione (rallentatore / avanti veloce)
+        tk.Label(control_frame, text="Scala Tempi (x)").grid(row=3, column=0)
+        self.time_scale_var = tk.DoubleVar(value=1.0)
+        self.time_scale_scale = tk.Scale(control_frame, variable=self.time_scale_var,
+                                         from_=playback.min_time_scale, to=playback.max_time_scale,
+                                         resolution=0.1, orient=tk.HORIZONTAL)
+        self.time_scale_scale.grid(row=3, column=1)
+        
         # Pulsante per avviare la simulazione
         self.launch_button = tk.Button(control_frame, text="Lancia", command=self.start_simulation)
-        self.launch_button.grid(row=3, column=0, columnspan=2)
+        self.launch_button.grid(row=4, column=0, columnspan=2)
+        
+        # Storico dei tiri: confronto sovrapposto e revisione di un tiro
+        self.history_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(control_frame, text="Confronta tiri",
+                       variable=self.history_var).grid(row=5, column=0, columnspan=2)
+        self.shot_list = tk.Listbox(control_frame, height=6, width=48)
+        self.shot_list.grid(row=6, column=0, columnspan=2)
+        self.replay_button = tk.Button(control_frame, text="Rivedi", command=self.replay_shot)
+        self.replay_button.grid(row=7, column=0, columnspan=2)
+        
+        # Archivio su disco dei tiri simulati
+        tk.Label(control_frame, text="Tiro Archiviato (n.)").grid(row=8, column=0)
+        self.archive_var = tk.StringVar(value="1")
+        tk.Entry(control_frame, textvariable=self.archive_var, width=10).grid(row=8, column=1)
+        self.load_button = tk.Button(control_frame, text="Carica", command=self.load_archived)
+        self.load_button.grid(row=9, column=0)
+        self.archive_label = tk.Label(control_frame, text="")
+        self.archive_label.grid(row=9, column=1)
+        
+        # Profilazione dei frame: HUD sul canvas e traccia su file
+        self.profiling_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(control_frame, text="Profilazione", variable=self.profiling_var,
+                       command=self.toggle_profiling).grid(row=10, column=0)
+        tk.Button(control_frame, text="Salva traccia", command=self.save_trace).grid(row=10, column=1)
         
         # Stato della simulazione
         self.simulation_running = False
         self.actual_trajectory = []       # Lista dei punti della traiettoria reale
-        self.theoretical_trajectory = []  # Lista dei punti della traiettoria teorica
+        self.theoretical_trajectory = ([], [])  # Ascisse e quote della traiettoria teorica
+        self.arrow_path = IncrementalTrajectory(self.canvas, self.viewport.to_canvas,
+                                                pool=self.viewport.pool)  # Linea e freccia persistenti
+        self.viewport.listeners.append(self.arrow_path.on_view_change)
+        self.playback = None              # Tiro in riproduzione (thread di fisica e buffer degli stati)
+        self.fitted = False               # Vista già adattata al tiro in corso
+        self.history = history.ShotHistory(self.viewport, history_size)
+        self.shot = None                  # Tiro animato (nuovo o rivisto)
+        self.after_id = None              # Prossimo frame programmato
+        self.store = trajectory_store.TrajectoryStore(store_path, "a") if store_path else None
+        if self.store is not None:
+            self.archive_label.config(text=f"Tiri archiviati: {len(self.store)}")
+        self.profiler = profiling.FrameProfiler(count_items=lambda: len(self.canvas.find_all()))
+        self.hud = profiling.CanvasHUD(self.canvas)
+        self.profiler.listeners.append(self.hud.update)
+        self.viewport.listeners.append(self.hud.on_view_change)
+        # Traiettorie già calcolate (teorica e stati dei tiri con attrito): rilanciare lo
+        # stesso tiro non richiede una nuova integrazione
+        self.trajectory_cache = trajectory_cache.TrajectoryCache()
+        # Profilo del terreno dell'ambiente, sotto le traiettorie
+        if self.environment is not None and self.environment.terrain is not None:
+            self.viewport.add_path("terrain", *self.environment.terrain.profile, fill="sienna")
         
     def start_simulation(self):
         """Inizializza i parametri e pre-computa la traiettoria teorica, poi avvia l'animazione."""
-        # Pulizia del canvas
-        self.canvas.delete("all")
+        # I tiri precedenti restano sul canvas (senza confronto si tiene solo il nuovo)
+        self.stop_shot()
+        if not self.history_var.get():
+            self.history.clear()
         self.simulation_running = True
+        self.fitted = False
         
         # Lettura dei parametri impostati
         bow_inclination = self.bow_inclination_var.get()  # in gradi
         launch_angle = self.launch_angle_var.get()        # in gradi
         initial_speed = self.initial_speed_var.get()      # in m/s
+        self.shot = self.history.new_shot(launch_angle, initial_speed, bow_inclination)
+        self.refresh_history()
         
-        # Calcolo dell'efficienza: si assume che la velocità efficace sia massima a 0°.
-        # (Si usa cos(inclinazione) – vedi ad es. trattamenti semplificati sull'energia elastica)
-        efficiency = math.cos(math.radians(bow_inclination))
-        effective_speed = initial_speed * efficiency
-        
-        # Calcolo dei componenti iniziali della velocità per la freccia reale
-        theta = math.radians(launch_angle)
-        self.vx = effective_speed * math.cos(theta)
-        self.vy = effective_speed * math.sin(theta)
+        # La freccia reale viene integrata da un thread di fisica (stesso modello: velocità
+        # efficace ridotta di cos(inclinazione), gravità e attrito) che pubblica gli stati in
+        # un buffer letto dall'animazione; un tiro già integrato con gli stessi parametri viene
+        # ripreso dalla cache
+        self.playback = playback.Playback(
+            launch_angle, initial_speed, bow_inclination, **self.engine_kwargs,
+            buffer=self.trajectory_cache.states(launch_angle, initial_speed, bow_inclination,
+                                                **self.engine_kwargs))
         
         # Posizione iniziale (metri)
         self.x = 0
         self.y = 0
         
-        # Pre-calcolo della traiettoria teorica (senza attrito)
-        self.theoretical_trajectory = []
-        t = 0
-        while True:
-            x_theo = initial_speed * math.cos(theta) * t
-            y_theo = initial_speed * math.sin(theta) * t - 0.5 * g * t**2
-            if y_theo < 0:
-                break
-            self.theoretical_trajectory.append((x_theo, y_theo))
-            t += dt
-        
-        # Disegno della traiettoria teorica come linea tratteggiata in rosso
-        if len(self.theoretical_trajectory) > 1:
-            points = []
-            for (xt, yt) in self.theoretical_trajectory:
-                cx, cy = to_canvas_coords(xt, yt)
-                points.extend([cx, cy])
-            self.canvas.create_line(points, fill="red", dash=(4, 2))
+        # Traiettoria teorica (senza attrito) in forma chiusa
+        self.theoretical_trajectory = self.trajectory_cache.theoretical(launch_angle,
+                                                                        initial_speed, dt, g)
+        
+        # Disegno della traiettoria teorica come linea tratteggiata in rosso (solo i tratti visibili)
+        xs, ys = self.theoretical_trajectory
+        if len(xs) > 1:
+            self.viewport.add_path("theoretical", xs, ys, fill="red", dash=(4, 2))
         
         # Inizializzazione della traiettoria reale
         self.actual_trajectory = [(self.x, self.y)]
+        self.arrow_path.fill = self.shot.color
+        if render_mode == "incremental":
+            self.arrow_path.start(self.x, self.y)
         
         # Avvio del loop di animazione
         self.update_simulation()
         
+    @profiling.profiled("update_simulation")
     def update_simulation(self):
-        """Aggiorna la posizione e la velocità della freccia integrando le equazioni del moto."""
+        """
+        Aggiorna l'animazione a frequenza di display con gli stati pubblicati dal thread di
+        fisica: la freccia è mostrata all'istante simulato corrente, interpolata tra due stati.
+        """
         if not self.simulation_running:
             return
         
-        # Calcolo della velocità (modulo)
-        v = math.sqrt(self.vx**2 + self.vy**2)
+        # Stati superati dall'ultimo frame e posizione interpolata della freccia (in m)
+        with self.profiler.phase("fisica"):
+            points, (self.x, self.y), done = self.playback.advance(self.time_scale_var.get())
+            self.actual_trajectory.extend(points)
+        if done:
+            self.simulation_running = False  # Termina la simulazione quando la freccia colpisce il suolo
         
-        # Accelerazioni:
-        # - La componente x è influenzata solo dall'attrito: a_x = - (k/m) * v * vx
-        # - La componente y è influenzata dalla gravità e dall'attrito: a_y = -g - (k/m) * v * vy
-        ax = - (k/m) * v * self.vx
-        ay = -g - (k/m) * v * self.vy
+        # Appena il thread di fisica ha finito, la vista si adatta al punto d'impatto
+        if not self.fitted and self.playback.buffer.finished:
+            with self.profiler.phase("vista"):
+                self.viewport.fit(*self.playback.buffer.extent())
+            self.fitted = True
         
-        # Aggiornamento delle velocità (in m/s)
-        self.vx += ax * dt
-        self.vy += ay * dt
+        if render_mode == "incremental":
+            # Estende la linea esistente con i soli punti nuovi e sposta la freccia
+            with self.profiler.phase("coordinate"):
+                coords, last = self.arrow_path.convert(points)
+                marker = self.viewport.to_canvas(self.x, self.y)
+            with self.profiler.phase("canvas"):
+                self.arrow_path.add(coords, last)
+                self.arrow_path.move_marker(*marker)
+        else:
+            self.redraw_trajectory()
         
-        # Aggiornamento della posizione (in m)
-        self.x += self.vx * dt
-        self.y += self.vy * dt
+        # Programma il prossimo frame se la simulazione è ancora attiva
+        if self.simulation_running:
+            self.after_id = self.master.after(playback.frame_ms, self.update_simulation)
+            self.profiler.schedule("update_simulation", playback.frame_ms)
+        else:
+            self.after_id = None
+            with self.profiler.phase("storico"):
+                self.finish_shot()
         
-        # Aggiungi il nuovo punto alla traiettoria reale se sopra il suolo
-        if self.y >= 0:
-            self.actual_trajectory.append((self.x, self.y))
+    def stop_shot(self):
+        """
+        Interrompe l'animazione in corso: un tiro rivisto torna nello storico così
+        com'era, uno nuovo non ancora completo viene scartato.
+        """
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+        if not self.simulation_running:
+            return
+        self.simulation_running = False
+        self.arrow_path.clear()
+        self.canvas.delete("arrow")
+        if self.shot.buffer is not None:
+            self.history.show(self.shot)
         else:
-            self.simulation_running = False  # Termina la simulazione quando la freccia colpisce il suolo
+            self.history.remove(self.shot)
+            self.refresh_history()
         
-        # Pulizia e ridisegno dell'animazione (tag "arrow" per gli oggetti aggiornabili)
+    def finish_shot(self):
+        """A fine animazione il tiro passa nello storico, con i suoi stati e il suo colore."""
+        self.shot.buffer = self.playback.buffer
+        if self.playback.thread is not None:
+            # Tiro appena integrato: un nuovo lancio con gli stessi parametri lo riprende dalla cache
+            self.trajectory_cache.put_states(self.shot.buffer, self.shot.launch_angle,
+                                             self.shot.initial_speed, self.shot.bow_inclination,
+                                             **self.engine_kwargs)
+        self.arrow_path.clear()
         self.canvas.delete("arrow")
+        self.history.show(self.shot)
+        self.archive_shot(self.shot)
+        self.refresh_history()
+        
+    def refresh_history(self):
+        """Aggiorna l'elenco dei tiri, ciascuno scritto nel proprio colore."""
+        self.shot_list.delete(0, tk.END)
+        for i, shot in enumerate(self.history.shots):
+            self.shot_list.insert(tk.END, shot.label())
+            self.shot_list.itemconfig(i, fg=shot.color)
+        
+    def replay_shot(self):
+        """Rivede il tiro selezionato dagli stati salvati, senza integrarlo di nuovo."""
+        selection = self.shot_list.curselection()
+        if not selection:
+            return
+        shot = self.history.shots[selection[0]]
+        if shot.buffer is None:
+            return
+        self.stop_shot()
+        self.history.hide(shot)
+        self.shot = shot
+        self.playback = playback.Playback(shot.launch_angle, shot.initial_speed,
+                                          shot.bow_inclination, buffer=shot.buffer)
+        self.simulation_running = True
+        self.fitted = False
+        self.x = 0
+        self.y = 0
+        self.actual_trajectory = [(self.x, self.y)]
+        self.arrow_path.fill = shot.color
+        if render_mode == "incremental":
+            self.arrow_path.start(self.x, self.y)
+        self.update_simulation()
+        
+    def archive_shot(self, shot):
+        """Aggiunge all'archivio su disco un tiro appena simulato."""
+        if self.store is None or shot.store_id is not None:
+            return
+        shot.store_id = self.store.append_buffer(shot.buffer, shot.launch_angle,
+                                                 shot.initial_speed, shot.bow_inclination,
+                                                 **self.engine_kwargs)
+        self.archive_label.config(text=f"Tiri archiviati: {len(self.store)}")
+        
+    def load_archived(self):
+        """
+        Aggiunge allo storico un tiro dell'archivio, letto tramite memory mapping senza
+        simularlo di nuovo: viene disegnato e si può rivedere con "Rivedi".
+        """
+        if self.store is None:
+            return
+        try:
+            number = int(self.archive_var.get())
+        except ValueError:
+            number = 0
+        if not 1 <= number <= len(self.store):
+            self.archive_label.config(text=f"Tiro non presente (1-{len(self.store)})")
+            return
+        self.stop_shot()
+        stored = self.store.shot(number - 1)
+        record = stored.record
+        shot = self.history.new_shot(float(record["launch_angle"]), float(record["initial_speed"]),
+                                     float(record["bow_inclination"]))
+        shot.buffer = stored.buffer()
+        shot.store_id = number - 1
+        self.history.show(shot)
+        self.refresh_history()
+        
+    def redraw_trajectory(self):
+        """Ridisegno completo (modalità "full"): ricrea linea e freccia da tutti i punti."""
+        # Pulizia e ridisegno dell'animazione (tag "arrow" per gli oggetti aggiornabili)
+        with self.profiler.phase("canvas"):
+            self.canvas.delete("arrow")
         
         # Disegna la traiettoria reale come linea blu
         if len(self.actual_trajectory) > 1:
-            points = []
-            for (xa, ya) in self.actual_trajectory:
-                cx, cy = to_canvas_coords(xa, ya)
-                points.extend([cx, cy])
-            self.canvas.create_line(points, fill="blue", tags="arrow")
+            with self.profiler.phase("coordinate"):
+                points = []
+                for (xa, ya) in self.actual_trajectory:
+                    cx, cy = self.viewport.to_canvas(xa, ya)
+                    points.extend([cx, cy])
+                points = simplify(points)
+            with self.profiler.phase("canvas"):
+                self.canvas.create_line(points, fill=self.shot.color, tags="arrow")
         
         # Disegna la freccia (rappresentata come un piccolo cerchio nero)
-        cx, cy = to_canvas_coords(self.x, self.y)
+        cx, cy = self.viewport.to_canvas(self.x, self.y)
         r = 5  # raggio in pixel
-        self.canvas.create_oval(cx-r, cy-r, cx+r, cy+r, fill="black", tags="arrow")
+        with self.profiler.phase("canvas"):
+            self.canvas.create_oval(cx-r, cy-r, cx+r, cy+r, fill="black", tags="arrow")
         
-        # Programma il prossimo aggiornamento se la simulazione è ancora attiva
-        if self.simulation_running:
-            self.master.after(int(dt*1000), self.update_simulation)
-            
+    def toggle_profiling(self):
+        """Attiva o disattiva la profilazione dei frame; da disattivata lo HUD sparisce."""
+        self.profiler.enabled = self.profiling_var.get()
+        if not self.profiler.enabled:
+            self.hud.hide()
+        
+    def save_trace(self):
+        """Salva la traccia dei frame misurati in trace_path.json e trace_path.csv."""
+        self.profiler.export(trace_path + ".json")
+        self.profiler.export(trace_path + ".csv")
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = SimulationApp(root)
@@ -1,7 +1,5 @@
-import tkinter as tk
+import math
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
 
 # Costanti fisiche
 g = 9.81
@@ -15,61 +13,122 @@ v_base = 30 # velocità di uscita "teorica" (m/s) prima delle perdite
 k_arco = 0.85       # efficienza arco (0-1)
 k_elastic = 0.95    # perdita su elasticità freccia (0-1)
 
-# Finestra Tkinter per controlli
-root = tk.Tk()
-root.title("Simulazione Tiro Freccia")
+dt = 0.01           # passo di integrazione (s)
 
-# Variabile per l'angolo di lancio (in gradi)
-angle_var = tk.DoubleVar(value=45.0)
+# Tkinter e matplotlib si importano solo quando servono: la finestra viene creata
+# da main() e il grafico da launch_simulation(), così generate_trajectory e
+# flight_time_bound si possono usare senza display né librerie grafiche
+root = None
+angle_var = None    # angolo di lancio (in gradi), variabile Tk creata da main()
+angle_label = None
 
 def update_angle(val):
     """Aggiorna l'angolo di lancio."""
     angle = angle_var.get()
     angle_label.config(text=f"Angolo di lancio: {angle:.1f}°")
 
-def launch_simulation():
-    angle_deg = angle_var.get()
-    theta = np.radians(angle_deg)
-
-    # Calcolo velocità iniziale reale tenendo conto delle perdite
-    v0 = v_base * k_arco * k_elastic
-
-    # Tempo di simulazione e step
-    t_max = 5.0
-    dt = 0.01
-    t_points = np.arange(0, t_max, dt)
-
-    # --- Traiettoria teorica ---
-    x_theo = v0 * np.cos(theta) * t_points
-    y_theo = v0 * np.sin(theta) * t_points - 0.5 * g * t_points**2
-
-    # --- Traiettoria reale (integrazione numerica con attrito) ---
+def load_calibration():
+    """
+    Costanti misurate: un profilo di calibrazione (calibration.py), se presente,
+    sostituisce le stime qui sopra. La calibrazione stima solo il prodotto delle due
+    perdite. Chiamata da main() all'apertura della finestra, non all'importazione.
+    """
+    global m, A, Cd, k_arco, k_elastic
+    import calibration
+
+    calibrated = calibration.load_profile()
+    m = calibrated.get("mass", m)
+    A = calibrated.get("area", A)
+    Cd = calibrated.get("Cd", Cd)
+    if "launch_efficiency" in calibrated:
+        k_arco, k_elastic = calibrated["launch_efficiency"], 1.0
+
+def flight_time_bound(v0x, v0y, c):
+    """
+    Limite superiore analitico del tempo di volo con drag quadratico
+    a = -c * |v| * v (c = F_drag / (m v^2)), partendo dal suolo. Si usa solo
+    che |v| >= |vy| e |v| >= vx:
+    - la salita dura al più t1 = atan(v0y * sqrt(c/g)) / sqrt(g c) e la quota
+      massima è al più H = ln(1 + c v0y^2 / g) / (2 c), come nel moto
+      verticale con drag;
+    - da t1 in poi vx <= u = v0x / (1 + c v0x t1);
+    - in discesa la freccia accelera verso il basso finché
+      c * sqrt(u^2 + vy^2) * |vy| < g; detta s* la velocità verticale che rende
+      vera l'uguaglianza, sotto s*/2 l'accelerazione è almeno g/2: |vy| arriva
+      a s*/2 entro s*/g secondi e poi la quota H si percorre in al più 2 H / s*.
+
+    Senza drag (c = 0, ad esempio un profilo con Cd = 0) è il tempo di volo nel vuoto.
+    """
+    v0y = max(v0y, 0.0)
+    if c <= 0:
+        return 2 * v0y / g
+    t_up = math.atan(v0y * math.sqrt(c / g)) / math.sqrt(g * c)
+    h_max = math.log1p(c * v0y ** 2 / g) / (2 * c)
+    u = v0x / (1 + c * v0x * t_up)
+    # s*^2 = (-u^2 + sqrt(u^4 + 4 (g/c)^2)) / 2, in forma senza cancellazione
+    s_star = math.sqrt(2 * (g / c) ** 2 / (u ** 2 + math.sqrt(u ** 4 + 4 * (g / c) ** 2)))
+    return t_up + s_star / g + 2 * h_max / s_star
+
+
+def generate_trajectory(theta, v0):
+    """
+    Traiettoria reale (Eulero, drag quadratico) e teorica per un tiro dal
+    suolo. Gli array hanno dimensione presa dal limite sul tempo di volo e
+    vengono riempiti sul posto. La traiettoria reale termina nel punto
+    d'impatto, interpolato nell'ultimo passo. Quella teorica copre solo
+    l'intervallo in volo, 0 <= t <= 2 v0y / g.
+    """
     vx = v0 * np.cos(theta)
     vy = v0 * np.sin(theta)
+    c = 0.5 * Cd * rho * A / m
+
+    # Buffer preallocati: un punto per passo fino al limite, più il punto iniziale
+    n_max = math.ceil(flight_time_bound(vx, vy, c) / dt) + 2
+    x = np.empty(n_max)
+    y = np.empty(n_max)
+    x[0] = y[0] = 0.0
+
+    # Ciclo su float Python: nessuna allocazione di array nel ciclo
+    vx, vy = float(vx), float(vy)
+    xi = yi = 0.0
+    i = 0
+    while i < n_max - 1:
+        v = math.sqrt(vx * vx + vy * vy)
+        # Accelerazione di drag: F_drag / m nella direzione opposta alla velocità
+        cv = c * v
+        vx -= cv * vx * dt
+        vy -= (g + cv * vy) * dt
+        x_new = xi + vx * dt
+        y_new = yi + vy * dt
+        i += 1
+        if y_new <= 0:
+            # Impatto: punto interpolato linearmente sul suolo
+            frac = yi / (yi - y_new)
+            x[i] = xi + frac * (x_new - xi)
+            y[i] = 0.0
+            break
+        x[i] = xi = x_new
+        y[i] = yi = y_new
+    x, y = x[:i + 1], y[:i + 1]
 
-    x, y = [0], [0]  # posizione iniziale
-
-    for i in range(1, len(t_points)):
-        v = np.sqrt(vx**2 + vy**2)
-
-        # Forza di drag
-        F_drag = 0.5 * Cd * rho * A * v**2
+    # Traiettoria teorica solo nell'intervallo in volo, con passo circa dt
+    t_flight = 2 * v0 * np.sin(theta) / g
+    t_theo = np.linspace(0, t_flight, max(int(np.ceil(t_flight / dt)), 1) + 1)
+    x_theo = v0 * np.cos(theta) * t_theo
+    y_theo = v0 * np.sin(theta) * t_theo - 0.5 * g * t_theo**2
+    return x, y, x_theo, y_theo
 
-        # Direzione della velocità
-        drag_x = -(F_drag/m) * (vx / v)
-        drag_y = -(F_drag/m) * (vy / v)
+def launch_simulation():
+    import matplotlib.pyplot as plt
 
-        # Aggiorno velocità
-        vx = vx + (drag_x) * dt
-        vy = vy - g * dt + (drag_y) * dt
+    angle_deg = angle_var.get()
+    theta = np.radians(angle_deg)
 
-        # Aggiorno posizione
-        x.append(x[-1] + vx*dt)
-        y.append(y[-1] + vy*dt)
+    # Calcolo velocità iniziale reale tenendo conto delle perdite
+    v0 = v_base * k_arco * k_elastic
 
-        # Se la freccia tocca il suolo, interrompo
-        if y[-1] <= 0:
-            break
+    # Traiettoria reale (con attrito) e teorica, fino all'impatto
+    x, y, x_theo, y_theo = generate_trajectory(theta, v0)
 
     # Plot con matplotlib
     plt.figure(figsize=(7,5))
@@ -83,17 +142,33 @@ def launch_simulation():
     plt.grid(True)
     plt.show()
 
-# Label e slider per l'angolo
-angle_label = tk.Label(root, text=f"Angolo di lancio: {angle_var.get()}°")
-angle_label.pack(pady=5)
+def main():
+    global root, angle_var, angle_label
+    import tkinter as tk
+
+    load_calibration()
+
+    # Finestra Tkinter per controlli
+    root = tk.Tk()
+    root.title("Simulazione Tiro Freccia")
+
+    # Variabile per l'angolo di lancio (in gradi)
+    angle_var = tk.DoubleVar(value=45.0)
+
+    # Label e slider per l'angolo
+    angle_label = tk.Label(root, text=f"Angolo di lancio: {angle_var.get()}°")
+    angle_label.pack(pady=5)
+
+    angle_scale = tk.Scale(root, from_=0, to=90, orient=tk.HORIZONTAL,
+                           variable=angle_var, resolution=1.0,
+                           command=update_angle)
+    angle_scale.pack(pady=5)
 
-angle_scale = tk.Scale(root, from_=0, to=90, orient=tk.HORIZONTAL,
-                       variable=angle_var, resolution=1.0,
-                       command=update_angle)
-angle_scale.pack(pady=5)
+    # Pulsante per lanciare la simulazione
+    launch_button = tk.Button(root, text="Lancia Freccia", command=launch_simulation)
+    launch_button.pack(pady=10)
 
-# Pulsante per lanciare la simulazione
-launch_button = tk.Button(root, text="Lancia Freccia", command=launch_simulation)
-launch_button.pack(pady=10)
+    root.mainloop()
 
-root.mainloop()
+if __name__ == "__main__":
+    main()
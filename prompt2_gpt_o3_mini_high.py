@@ -1,32 +1,97 @@
 import tkinter as tk
 import math
+import threading
+
+import numpy as np
+
+import history
+import playback
+import profiling
+import surrogate
+import trajectory_cache
+import trajectory_engine
+import trajectory_store
+from canvas_rendering import FIXED_TAG, IncrementalTrajectory, Viewport, simplify
 
 # Costanti fisiche e parametri della simulazione
 g = 9.81         # Accelerazione di gravità (m/s^2)
 dt = 0.02        # Passo temporale (s)
 m = 0.1          # Massa della freccia (kg)
 k = 0.02         # Coefficiente di attrito (drag)
+launch_efficiency = 1.0     # Rapporto tra velocità effettiva e impostata (k_arco * k_elastic)
+inclination_exponent = 1.0  # Perdita per l'inclinazione dell'arco: cos(inclinazione)^esponente
 # La velocità iniziale sarà ora parametrica (in m/s)
 
-# Parametri per la rappresentazione grafica
+# Parametri per la rappresentazione grafica (vista iniziale, poi adattata al tiro)
 scale_factor = 5           # 1 metro corrisponde a 5 pixel
 canvas_width = 800
 canvas_height = 600
 origin_x = 50              # Origine in x (in pixel)
 origin_y = canvas_height - 50  # Origine in y (in pixel)
 
-def to_canvas_coords(x, y):
+# Modalità di disegno dell'animazione: "incremental" estende gli oggetti esistenti,
+# "full" ricrea ad ogni frame tutta la traiettoria reale
+render_mode = "incremental"
+
+# Integratore del thread di fisica (vedi trajectory_engine.METHODS): con dt = 0.02 "rk4"
+# sbaglia la gittata di meno di un millimetro, "euler" di oltre un metro (vedi benchmark.py)
+physics_method = "rk4"
+
+# Modello di volo del thread di fisica: "point" punto materiale (trajectory_engine),
+# "rigid" corpo rigido con beccheggio, penne e flessione della canna (rigid_body, RK4)
+flight_model = "point"
+
+# Tiri perturbati simulati dall'analisi di dispersione
+dispersion_shots = 200_000
+
+# Tiri mantenuti sul canvas in modalità confronto
+history_size = 24
+
+# Cartella dell'archivio dei tiri simulati (None per non archiviare)
+store_path = "archivio_tiri"
+
+# Traccia della profilazione dei frame (salvata in .json e .csv)
+trace_path = "traccia_frame"
+
+
+def configure_engine():
     """
-    Converte coordinate fisiche (in metri) in coordinate canvas (in pixel).
-    Nota: l'asse y viene capovolto (y=0 in basso).
+    Costanti del modello con attrito, le stesse per il thread di fisica e per le chiavi
+    della cache: le stime qui sopra, sostituite dalle costanti misurate di un profilo di
+    calibrazione (calibration.py) se presente, con il modello di volo scelto e l'ambiente
+    del tiro (densità dell'aria, vento, terreno) da ambiente.json, se presente; senza il
+    file aria ferma e suolo piano (vedi environment.py). Letti all'avvio della finestra,
+    non all'importazione. Restituisce (engine_kwargs, ambiente o None).
     """
-    return origin_x + x * scale_factor, origin_y - y * scale_factor
+    import calibration
+    import environment
+
+    calibrated = calibration.load_profile()
+    engine_kwargs = dict(mass=calibrated.get("mass", m), drag_coefficient=calibrated.get("k", k),
+                         launch_efficiency=calibrated.get("launch_efficiency", launch_efficiency),
+                         inclination_exponent=calibrated.get("inclination_exponent",
+                                                             inclination_exponent),
+                         dt=dt, method=physics_method)
+    if flight_model == "rigid":
+        import rigid_body
+
+        engine_kwargs.update(model="rigid", dt=rigid_body.dt, method="rk4")
+
+    shot_environment = environment.load()
+    if shot_environment is not None:
+        engine_kwargs["environment"] = shot_environment
+    return engine_kwargs, shot_environment
+
 
 class SimulationApp:
     def __init__(self, master):
         self.master = master
         self.master.title("Simulazione Tiro Freccia")
         
+        # Costanti del modello con attrito e ambiente del tiro (profilo di calibrazione e
+        # ambiente.json letti qui, non all'importazione)
+        self.engine_kwargs, self.environment = configure_engine()
+        
         # Layout: frame dei controlli a sinistra, canvas a destra
         self.control_frame = tk.Frame(master)
         self.control_frame.pack(side=tk.LEFT, fill=tk.Y, padx=10, pady=10)
@@ -34,6 +99,10 @@ class SimulationApp:
         self.canvas = tk.Canvas(master, width=canvas_width, height=canvas_height, bg="white")
         self.canvas.pack(side=tk.RIGHT, expand=True, fill=tk.BOTH)
         
+        # Vista con zoom (rotella) e spostamento (trascinamento); doppio clic per riadattarla
+        self.viewport = Viewport(self.canvas, scale_factor, origin_x, origin_y,
+                                 canvas_width, canvas_height)
+        
         # Variabili per i parametri
         self.bow_inclination_var = tk.DoubleVar(value=0)   # Inclinazione arco in gradi
         self.launch_angle_var = tk.DoubleVar(value=45)       # Angolo di lancio in gradi
@@ -50,7 +119,7 @@ class SimulationApp:
         
         tk.Label(self.control_frame, text="Angolo di Lancio (°)").pack()
         self.launch_angle_scale = tk.Scale(self.control_frame, variable=self.launch_angle_var,
-                                           from_=0, to=90, orient=tk.HORIZONTAL,
+                                           from_=0, to=90, resolution=0.1, orient=tk.HORIZONTAL,
                                            command=self.update_preview)
         self.launch_angle_scale.pack()
         
@@ -60,17 +129,110 @@ class SimulationApp:
                                             command=self.update_preview)
         self.initial_speed_scale.pack()
         
+        # Scala dei tempi dell'animazione (rallentatore / avanti veloce)
+        self.time_scale_var = tk.DoubleVar(value=1.0)
+        tk.Label(self.control_frame, text="Scala Tempi (x)").pack()
+        self.time_scale_scale = tk.Scale(self.control_frame, variable=self.time_scale_var,
+                                         from_=playback.min_time_scale, to=playback.max_time_scale,
+                                         resolution=0.1, orient=tk.HORIZONTAL)
+        self.time_scale_scale.pack()
+        
+        # Profilazione dei frame: HUD sul canvas e traccia su file
+        self.profiling_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.control_frame, text="Profilazione", variable=self.profiling_var,
+                       command=self.toggle_profiling).pack()
+        tk.Button(self.control_frame, text="Salva traccia", command=self.save_trace).pack()
+        
         self.launch_button = tk.Button(self.control_frame, text="Lancia", command=self.start_simulation)
         self.launch_button.pack(pady=10)
         
+        # Storico dei tiri: confronto sovrapposto e revisione di un tiro
+        self.history_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(self.control_frame, text="Confronta tiri", variable=self.history_var).pack()
+        self.shot_list = tk.Listbox(self.control_frame, height=6, width=48)
+        self.shot_list.pack()
+        self.replay_button = tk.Button(self.control_frame, text="Rivedi", command=self.replay_shot)
+        self.replay_button.pack(pady=5)
+        
+        # Archivio su disco dei tiri simulati
+        tk.Label(self.control_frame, text="Tiro Archiviato (n.)").pack()
+        self.archive_var = tk.StringVar(value="1")
+        tk.Entry(self.control_frame, textvariable=self.archive_var, width=10).pack()
+        self.load_button = tk.Button(self.control_frame, text="Carica", command=self.load_archived)
+        self.load_button.pack(pady=5)
+        self.archive_label = tk.Label(self.control_frame, text="")
+        self.archive_label.pack()
+        
+        # Mira inversa: angolo di lancio per colpire un bersaglio a distanza (e quota) data
+        tk.Label(self.control_frame, text="Bersaglio", font=("Arial", 14)).pack(pady=5)
+        self.target_distance_var = tk.StringVar(value="8")
+        self.target_height_var = tk.StringVar(value="0")
+        tk.Label(self.control_frame, text="Distanza Bersaglio (m)").pack()
+        tk.Entry(self.control_frame, textvariable=self.target_distance_var, width=10).pack()
+        tk.Label(self.control_frame, text="Quota Bersaglio (m)").pack()
+        tk.Entry(self.control_frame, textvariable=self.target_height_var, width=10).pack()
+        self.aim_button = tk.Button(self.control_frame, text="Mira", command=self.aim_at_target)
+        self.aim_button.pack(pady=5)
+        self.aim_label = tk.Label(self.control_frame, text="", justify=tk.LEFT)
+        self.aim_label.pack()
+        if self.engine_kwargs.get("model", "point") != "point":
+            # Il risolutore usa il motore a punto materiale: con un altro modello di volo
+            # gli angoli trovati non colpirebbero il bersaglio nel tiro animato
+            self.aim_button.config(state=tk.DISABLED)
+            self.aim_label.config(text="Mira non disponibile con il modello a corpo rigido")
+        
+        # Dispersione Monte Carlo attorno al tiro corrente
+        tk.Label(self.control_frame, text="Dispersione", font=("Arial", 14)).pack(pady=5)
+        self.dispersion_button = tk.Button(self.control_frame, text="Analizza",
+                                           command=self.start_dispersion)
+        self.dispersion_button.pack(pady=5)
+        self.dispersion_label = tk.Label(self.control_frame, text="", justify=tk.LEFT)
+        self.dispersion_label.pack()
+        self.dispersion_thread = None
+        self.dispersion_result = None
+        
         # Stato della simulazione
         self.simulation_running = False
         self.actual_trajectory = []       # Punti della traiettoria reale
-        self.theoretical_trajectory = []  # Punti della traiettoria teorica
+        self.theoretical_trajectory = ([], [])  # Ascisse e quote della traiettoria teorica
+        self.arrow_path = IncrementalTrajectory(self.canvas, self.viewport.to_canvas,
+                                                pool=self.viewport.pool)  # Linea e freccia persistenti
+        self.viewport.listeners.append(self.arrow_path.on_view_change)
+        self.playback = None              # Tiro in riproduzione (thread di fisica e buffer degli stati)
+        self.history = history.ShotHistory(self.viewport, history_size)
+        self.shot = None                  # Tiro animato (nuovo o rivisto)
+        self.after_id = None              # Prossimo frame programmato
+        self.store = trajectory_store.TrajectoryStore(store_path, "a") if store_path else None
+        if self.store is not None:
+            self.archive_label.config(text=f"Tiri archiviati: {len(self.store)}")
+        self.profiler = profiling.FrameProfiler(count_items=lambda: len(self.canvas.find_all()))
+        self.hud = profiling.CanvasHUD(self.canvas)
+        self.profiler.listeners.append(self.hud.update)
+        self.viewport.listeners.append(self.hud.on_view_change)
+        
+        # Tabella precalcolata del modello con attrito (letta dalla cache su disco se disponibile),
+        # costruita con lo stesso integratore dell'animazione; solo per il punto materiale in
+        # aria ferma e suolo piano, le condizioni in cui è tabulata
+        constants = self.engine_kwargs
+        self.surrogate = None
+        if self.environment is None and constants.get("model", "point") == "point":
+            self.surrogate = surrogate.load_or_build(constants["drag_coefficient"],
+                                                     constants["mass"], method=constants["method"],
+                                                     dt=constants["dt"])
+            self.surrogate.launch_efficiency = constants["launch_efficiency"]
+            self.surrogate.inclination_exponent = constants["inclination_exponent"]
+        
+        # Traiettorie già calcolate (anteprima, teorica, stati dei tiri con attrito), condivise
+        # da anteprima, lancio e storico
+        self.trajectory_cache = trajectory_cache.TrajectoryCache()
+        # Profilo del terreno dell'ambiente, sotto le traiettorie
+        if self.environment is not None and self.environment.terrain is not None:
+            self.viewport.add_path("terrain", *self.environment.terrain.profile, fill="sienna")
         
         # Mostra subito il preview con i parametri iniziali
         self.update_preview()
     
+    @profiling.profiled("update_preview")
     def update_preview(self, *args):
         """
         Aggiorna il preview della traiettoria teorica e la posizione iniziale ogni volta che
@@ -79,133 +241,398 @@ class SimulationApp:
         if self.simulation_running:
             return
         
-        # Rimuove eventuali preview precedenti
-        self.canvas.delete("preview")
+        # Rimuove eventuali preview precedenti (e la dispersione, non più valida)
+        with self.profiler.phase("canvas"):
+            self.clear_preview()
         
         # Legge i parametri correnti
         bow_inclination = self.bow_inclination_var.get()   # gradi
         launch_angle = self.launch_angle_var.get()           # gradi
         initial_speed = self.initial_speed_var.get()         # m/s
         
-        theta = math.radians(launch_angle)
+        # Traiettoria reale (con attrito e inclinazione) interpolata dalla tabella precalcolata;
+        # la vista si adatta al punto d'impatto previsto
+        with self.profiler.phase("surrogato"):
+            key = self.trajectory_cache.key("surrogato", launch_angle, initial_speed,
+                                            bow_inclination, **self.engine_kwargs)
+            x_real, y_real = self.trajectory_cache.lookup(
+                key, lambda: self.preview_path(launch_angle, initial_speed, bow_inclination))
+        with self.profiler.phase("vista"):
+            self.viewport.fit(x_real[-1], y_real.max())
         
-        # Calcola la traiettoria teorica (senza attrito) utilizzando la velocità iniziale immessa.
+        # Traiettoria teorica (senza attrito) con la velocità iniziale immessa, in forma chiusa
+        # e dalla cache condivisa con il lancio.
         # Nota: in questo preview non consideriamo l'efficienza ridotta per inclinazione.
-        trajectory = []
-        t = 0
-        while True:
-            x_theo = initial_speed * math.cos(theta) * t
-            y_theo = initial_speed * math.sin(theta) * t - 0.5 * g * t**2
-            if y_theo < 0:
-                break
-            trajectory.append((x_theo, y_theo))
-            t += dt
-        
-        if len(trajectory) > 1:
-            points = []
-            for (xt, yt) in trajectory:
-                cx, cy = to_canvas_coords(xt, yt)
-                points.extend([cx, cy])
-            # Disegna la linea tratteggiata in rosso
-            self.canvas.create_line(points, fill="red", dash=(4,2), tags="preview")
-        
-        # Disegna la posizione iniziale (freccia o piccolo cerchio in nero in (0,0))
-        cx, cy = to_canvas_coords(0, 0)
-        r = 5
-        self.canvas.create_oval(cx - r, cy - r, cx + r, cy + r, fill="black", tags="preview")
+        with self.profiler.phase("teorica"):
+            xs, ys = self.trajectory_cache.theoretical(launch_angle, initial_speed, dt, g)
+        
+        with self.profiler.phase("canvas"):
+            if len(xs) > 1:
+                # Disegna la linea tratteggiata in rosso (solo i tratti visibili)
+                self.viewport.add_path("preview_theoretical", xs, ys, fill="red", dash=(4,2))
+            
+            self.viewport.add_path("preview_real", x_real, y_real, fill="blue", dash=(2,2))
+            
+            # Punto d'impatto previsto con la relativa gittata
+            cx, cy = self.viewport.to_canvas(x_real[-1], y_real[-1])
+            r = 4
+            self.canvas.create_oval(cx - r, cy - r, cx + r, cy + r, outline="blue",
+                                    tags=("preview", FIXED_TAG))
+            self.canvas.create_text(cx, cy + 12, text=f"{x_real[-1]:.1f} m", fill="blue",
+                                    tags="preview")
+            
+            # Disegna la posizione iniziale (freccia o piccolo cerchio in nero in (0,0))
+            cx, cy = self.viewport.to_canvas(0, 0)
+            r = 5
+            self.canvas.create_oval(cx - r, cy - r, cx + r, cy + r, fill="black",
+                                    tags=("preview", FIXED_TAG))
+    
+    def preview_path(self, launch_angle, initial_speed, bow_inclination):
+        """
+        Traiettoria reale dell'anteprima: dalla tabella precalcolata (punto materiale in
+        aria ferma e suolo piano) oppure, con un ambiente o il corpo rigido, integrata con
+        lo stesso motore e gli stessi argomenti del tiro animato.
+        """
+        if self.surrogate is not None:
+            return self.surrogate.path(launch_angle, initial_speed, bow_inclination)
+        return trajectory_engine.simulate(launch_angle, initial_speed, bow_inclination,
+                                          **self.engine_kwargs)
+    
+    def clear_preview(self):
+        """
+        Rimuove il preview e la dispersione. Le linee del preview tornano al pool del
+        Viewport (non vanno cancellate per tag, verranno riusate).
+        """
+        self.viewport.remove_path("preview_theoretical")
+        self.viewport.remove_path("preview_real")
+        self.canvas.delete("preview")
+        self.canvas.delete("dispersion")
+    
+    def aim_at_target(self):
+        """
+        Calcola gli angoli che colpiscono il bersaglio con velocità e inclinazione
+        correnti (stesse costanti, integratore, passo e ambiente dell'animazione),
+        imposta il tiro teso e ne mostra il preview.
+        """
+        try:
+            distance = float(self.target_distance_var.get())
+            height = float(self.target_height_var.get())
+        except ValueError:
+            self.aim_label.config(text="Valori del bersaglio non validi")
+            return
+        
+        import aiming
+        
+        solution = aiming.solve_launch_angle(distance, self.initial_speed_var.get(),
+                                             self.bow_inclination_var.get(), height,
+                                             **self.engine_kwargs)
+        low, high = float(solution.low), float(solution.high)
+        summary = (f"Gittata massima: {float(solution.max_range):.1f} m "
+                   f"a {float(solution.max_range_angle):.1f}°")
+        if math.isnan(high):
+            self.aim_label.config(text=f"Bersaglio fuori portata\n{summary}")
+            return
+        
+        # Senza tiro teso (bersaglio sotto il punto di lancio) si usa quello a campanile
+        self.launch_angle_var.set(high if math.isnan(low) else low)
+        low_text = "-" if math.isnan(low) else f"{low:.2f}°"
+        self.aim_label.config(text=f"Tiro teso: {low_text}\nTiro a campanile: {high:.2f}°\n{summary}")
+        self.update_preview()
+    
+    def start_dispersion(self):
+        """Avvia in un thread separato l'analisi di dispersione attorno al tiro corrente."""
+        if self.dispersion_thread is not None and self.dispersion_thread.is_alive():
+            return
+        
+        params = (self.launch_angle_var.get(), self.initial_speed_var.get(),
+                  self.bow_inclination_var.get())
+        self.dispersion_label.config(text="Analisi in corso...")
+        self.dispersion_button.config(state=tk.DISABLED)
+        self.dispersion_thread = threading.Thread(target=self.run_dispersion, args=params,
+                                                  daemon=True)
+        self.dispersion_thread.start()
+        self.master.after(playback.frame_ms, self.poll_dispersion)
+    
+    def run_dispersion(self, launch_angle, initial_speed, bow_inclination):
+        """Corpo del thread di analisi: l'esito (o l'errore) viene letto da poll_dispersion."""
+        import dispersion
+        
+        constants = self.engine_kwargs
+        try:
+            self.dispersion_result = dispersion.run_dispersion(
+                launch_angle, initial_speed, bow_inclination, mass=constants["mass"],
+                drag_coefficient=constants["drag_coefficient"],
+                k_arco=constants["launch_efficiency"],
+                inclination_exponent=constants["inclination_exponent"], shots=dispersion_shots,
+                dt=constants["dt"], method=constants["method"], model=flight_model,
+                environment=self.environment)
+        except Exception as e:
+            self.dispersion_result = e
+    
+    def poll_dispersion(self):
+        """Attende la fine dell'analisi senza bloccare l'interfaccia, poi la disegna."""
+        if self.dispersion_thread.is_alive():
+            self.master.after(playback.frame_ms, self.poll_dispersion)
+            return
+        result, self.dispersion_result = self.dispersion_result, None
+        self.dispersion_button.config(state=tk.NORMAL)
+        if isinstance(result, Exception):
+            # L'errore del thread di analisi resta nell'etichetta: rilanciarlo qui finirebbe
+            # in un traceback di Tk con l'interfaccia a metà
+            self.canvas.delete("dispersion")
+            self.dispersion_label.config(text=f"Analisi non riuscita:\n{result}")
+            return
+        self.draw_dispersion(result)
+    
+    def draw_dispersion(self, result):
+        """
+        Disegna sotto il suolo una banda con la densità dei punti d'impatto (più scura dove
+        cadono più frecce), la mediana e l'intervallo tra il 5° e il 95° percentile.
+        """
+        self.canvas.delete("dispersion")
+        
+        # Conteggi dell'istogramma raccolti per colonna di pixel
+        counts, edges = result.histogram.counts, result.histogram.edges
+        centers = 0.5 * (edges[:-1] + edges[1:])
+        columns = np.floor(self.viewport.to_canvas(centers, 0)[0]).astype(int)
+        first = columns.min()
+        per_column = np.bincount(columns - first, weights=counts)
+        _, ground = self.viewport.to_canvas(0, 0)
+        top = ground + 4
+        bottom = ground + 14
+        peak = per_column.max() or 1
+        for i, c in enumerate(per_column):
+            if c:
+                shade = int(255 * (1 - c / peak))
+                self.canvas.create_line(first + i, top, first + i, bottom,
+                                        fill=f"#{shade:02x}{shade:02x}ff", tags="dispersion")
+        
+        p5, p50, p95 = (result.percentiles[q] for q in (5, 50, 95))
+        x5, _ = self.viewport.to_canvas(p5, 0)
+        x50, _ = self.viewport.to_canvas(p50, 0)
+        x95, _ = self.viewport.to_canvas(p95, 0)
+        self.canvas.create_line(x5, bottom + 4, x95, bottom + 4, fill="navy", tags="dispersion")
+        self.canvas.create_line(x50, top - 2, x50, bottom + 6, fill="navy", width=2,
+                                tags="dispersion")
+        
+        self.dispersion_label.config(
+            text=(f"Tiri: {result.landed}/{result.shots}\n"
+                  f"Media: {result.mean:.2f} m (dev. std {result.std:.2f})\n"
+                  f"5°-50°-95° percentile: {p5:.2f} / {p50:.2f} / {p95:.2f} m\n"
+                  f"Gruppo da {result.group_shots} frecce: {result.group_size:.2f} m"))
     
     def start_simulation(self):
         """
         Avvia la simulazione reale: pulisce il canvas, calcola la traiettoria teorica e
         integra le equazioni del moto con attrito, mostrando l'animazione.
         """
-        # Pulisce il canvas (rimuove preview e eventuali tracciati precedenti)
-        self.canvas.delete("all")
+        # Rimuove il preview; i tiri precedenti restano sul canvas (senza confronto si
+        # tiene solo il nuovo)
+        self.stop_shot()
+        self.clear_preview()
+        if not self.history_var.get():
+            self.history.clear()
         self.simulation_running = True
         
         # Legge i parametri correnti
         bow_inclination = self.bow_inclination_var.get()   # gradi
         launch_angle = self.launch_angle_var.get()           # gradi
         initial_speed = self.initial_speed_var.get()         # m/s
+        self.shot = self.history.new_shot(launch_angle, initial_speed, bow_inclination)
+        self.refresh_history()
         
-        theta = math.radians(launch_angle)
-        # Calcola l'efficienza: la velocità effettiva si riduce con l'inclinazione dell'arco
-        efficiency = math.cos(math.radians(bow_inclination))
-        effective_speed = initial_speed * efficiency
-        
-        # Componenti della velocità per la simulazione reale
-        self.vx = effective_speed * math.cos(theta)
-        self.vy = effective_speed * math.sin(theta)
+        # La simulazione reale è integrata da un thread di fisica (velocità effettiva ridotta
+        # con l'inclinazione dell'arco, gravità e attrito) che pubblica gli stati in un buffer;
+        # un tiro già integrato con gli stessi parametri viene ripreso dalla cache
+        self.playback = playback.Playback(
+            launch_angle, initial_speed, bow_inclination, **self.engine_kwargs,
+            buffer=self.trajectory_cache.states(launch_angle, initial_speed, bow_inclination,
+                                                **self.engine_kwargs))
         
         # Posizione iniziale in metri
         self.x = 0
         self.y = 0
         
-        # Pre-calcola la traiettoria teorica (senza attrito) utilizzando la velocità iniziale
-        self.theoretical_trajectory = []
-        t = 0
-        while True:
-            x_theo = initial_speed * math.cos(theta) * t
-            y_theo = initial_speed * math.sin(theta) * t - 0.5 * g * t**2
-            if y_theo < 0:
-                break
-            self.theoretical_trajectory.append((x_theo, y_theo))
-            t += dt
-        
-        # Disegna la traiettoria teorica come linea tratteggiata in rosso
-        if len(self.theoretical_trajectory) > 1:
-            points = []
-            for (xt, yt) in self.theoretical_trajectory:
-                cx, cy = to_canvas_coords(xt, yt)
-                points.extend([cx, cy])
-            self.canvas.create_line(points, fill="red", dash=(4,2))
+        # Traiettoria teorica (senza attrito) in forma chiusa, già calcolata dall'anteprima
+        self.theoretical_trajectory = self.trajectory_cache.theoretical(launch_angle,
+                                                                        initial_speed, dt, g)
+        
+        # Disegna la traiettoria teorica come linea tratteggiata in rosso (solo i tratti visibili)
+        xs, ys = self.theoretical_trajectory
+        if len(xs) > 1:
+            self.viewport.add_path("theoretical", xs, ys, fill="red", dash=(4,2))
         
         # Inizializza la traiettoria reale
         self.actual_trajectory = [(self.x, self.y)]
+        self.arrow_path.fill = self.shot.color
+        if render_mode == "incremental":
+            self.arrow_path.start(self.x, self.y)
         
         # Avvia il loop di aggiornamento della simulazione
         self.update_simulation()
     
+    @profiling.profiled("update_simulation")
     def update_simulation(self):
-        """Integra il moto della freccia e aggiorna l'animazione in tempo reale."""
+        """
+        Aggiorna l'animazione a frequenza di display con gli stati pubblicati dal thread di
+        fisica, interpolando la posizione della freccia tra due stati.
+        """
         if not self.simulation_running:
             return
         
-        # Calcola il modulo della velocità
-        v = math.sqrt(self.vx**2 + self.vy**2)
-        
-        # Accelerazioni: attrito (drag) e gravità
-        ax = - (k / m) * v * self.vx
-        ay = -g - (k / m) * v * self.vy
-        
-        # Aggiorna le componenti della velocità e la posizione
-        self.vx += ax * dt
-        self.vy += ay * dt
-        self.x += self.vx * dt
-        self.y += self.vy * dt
+        # Stati superati dall'ultimo frame e posizione interpolata della freccia (in m)
+        with self.profiler.phase("fisica"):
+            points, (self.x, self.y), done = self.playback.advance(self.time_scale_var.get())
+            self.actual_trajectory.extend(points)
+        if done:
+            self.simulation_running = False  # Termina la simulazione se la freccia raggiunge il suolo
         
-        if self.y >= 0:
-            self.actual_trajectory.append((self.x, self.y))
+        # Aggiorna l'animazione: estende la linea esistente con i soli punti nuovi e sposta la freccia
+        if render_mode == "incremental":
+            with self.profiler.phase("coordinate"):
+                coords, last = self.arrow_path.convert(points)
+                marker = self.viewport.to_canvas(self.x, self.y)
+            with self.profiler.phase("canvas"):
+                self.arrow_path.add(coords, last)
+                self.arrow_path.move_marker(*marker)
         else:
-            self.simulation_running = False  # Termina la simulazione se la freccia raggiunge il suolo
+            self.redraw_trajectory()
         
-        # Aggiorna l'animazione: cancella gli elementi con tag "arrow" e ridisegna la traiettoria reale e la freccia
+        # Programma il prossimo frame se la simulazione è ancora attiva
+        if self.simulation_running:
+            self.after_id = self.master.after(playback.frame_ms, self.update_simulation)
+            self.profiler.schedule("update_simulation", playback.frame_ms)
+        else:
+            self.after_id = None
+            with self.profiler.phase("storico"):
+                self.finish_shot()
+    
+    def stop_shot(self):
+        """
+        Interrompe l'animazione in corso: un tiro rivisto torna nello storico così
+        com'era, uno nuovo non ancora completo viene scartato.
+        """
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+        if not self.simulation_running:
+            return
+        self.simulation_running = False
+        self.arrow_path.clear()
         self.canvas.delete("arrow")
+        if self.shot.buffer is not None:
+            self.history.show(self.shot)
+        else:
+            self.history.remove(self.shot)
+            self.refresh_history()
+    
+    def finish_shot(self):
+        """A fine animazione il tiro passa nello storico, con i suoi stati e il suo colore."""
+        self.shot.buffer = self.playback.buffer
+        if self.playback.thread is not None:
+            # Tiro appena integrato: un nuovo lancio con gli stessi parametri lo riprende dalla cache
+            self.trajectory_cache.put_states(self.shot.buffer, self.shot.launch_angle,
+                                             self.shot.initial_speed, self.shot.bow_inclination,
+                                             **self.engine_kwargs)
+        self.arrow_path.clear()
+        self.canvas.delete("arrow")
+        self.history.show(self.shot)
+        self.archive_shot(self.shot)
+        self.refresh_history()
+    
+    def refresh_history(self):
+        """Aggiorna l'elenco dei tiri, ciascuno scritto nel proprio colore."""
+        self.shot_list.delete(0, tk.END)
+        for i, shot in enumerate(self.history.shots):
+            self.shot_list.insert(tk.END, shot.label())
+            self.shot_list.itemconfig(i, fg=shot.color)
+    
+    def replay_shot(self):
+        """Rivede il tiro selezionato dagli stati salvati, senza integrarlo di nuovo."""
+        selection = self.shot_list.curselection()
+        if not selection:
+            return
+        shot = self.history.shots[selection[0]]
+        if shot.buffer is None:
+            return
+        self.stop_shot()
+        self.history.hide(shot)
+        self.shot = shot
+        self.playback = playback.Playback(shot.launch_angle, shot.initial_speed,
+                                          shot.bow_inclination, buffer=shot.buffer)
+        self.simulation_running = True
+        self.x = 0
+        self.y = 0
+        self.actual_trajectory = [(self.x, self.y)]
+        self.arrow_path.fill = shot.color
+        if render_mode == "incremental":
+            self.arrow_path.start(self.x, self.y)
+        self.update_simulation()
+    
+    def archive_shot(self, shot):
+        """Aggiunge all'archivio su disco un tiro appena simulato."""
+        if self.store is None or shot.store_id is not None:
+            return
+        shot.store_id = self.store.append_buffer(shot.buffer, shot.launch_angle,
+                                                 shot.initial_speed, shot.bow_inclination,
+                                                 **self.engine_kwargs)
+        self.archive_label.config(text=f"Tiri archiviati: {len(self.store)}")
+    
+    def load_archived(self):
+        """
+        Aggiunge allo storico un tiro dell'archivio, letto tramite memory mapping senza
+        simularlo di nuovo: viene disegnato e si può rivedere con "Rivedi".
+        """
+        if self.store is None:
+            return
+        try:
+            number = int(self.archive_var.get())
+        except ValueError:
+            number = 0
+        if not 1 <= number <= len(self.store):
+            self.archive_label.config(text=f"Tiro non presente (1-{len(self.store)})")
+            return
+        self.stop_shot()
+        stored = self.store.shot(number - 1)
+        record = stored.record
+        shot = self.history.new_shot(float(record["launch_angle"]), float(record["initial_speed"]),
+                                     float(record["bow_inclination"]))
+        shot.buffer = stored.buffer()
+        shot.store_id = number - 1
+        self.history.show(shot)
+        self.refresh_history()
+    
+    def redraw_trajectory(self):
+        """Ridisegno completo (modalità "full"): ricrea linea e freccia da tutti i punti."""
+        # Cancella gli elementi con tag "arrow" e ridisegna la traiettoria reale e la freccia
+        with self.profiler.phase("canvas"):
+            self.canvas.delete("arrow")
         if len(self.actual_trajectory) > 1:
-            points = []
-            for (xa, ya) in self.actual_trajectory:
-                cx, cy = to_canvas_coords(xa, ya)
-                points.extend([cx, cy])
-            self.canvas.create_line(points, fill="blue", tags="arrow")
+            with self.profiler.phase("coordinate"):
+                points = []
+                for (xa, ya) in self.actual_trajectory:
+                    cx, cy = self.viewport.to_canvas(xa, ya)
+                    points.extend([cx, cy])
+                points = simplify(points)
+            with self.profiler.phase("canvas"):
+                self.canvas.create_line(points, fill=self.shot.color, tags="arrow")
         
         # Disegna la freccia attuale come un piccolo cerchio nero
-        cx, cy = to_canvas_coords(self.x, self.y)
+        cx, cy = self.viewport.to_canvas(self.x, self.y)
         r = 5
-        self.canvas.create_oval(cx - r, cy - r, cx + r, cy + r, fill="black", tags="arrow")
-        
-        # Programma il prossimo aggiornamento se la simulazione è ancora attiva
-        if self.simulation_running:
-            self.master.after(int(dt * 1000), self.update_simulation)
+        with self.profiler.phase("canvas"):
+            self.canvas.create_oval(cx - r, cy - r, cx + r, cy + r, fill="black", tags="arrow")
+    
+    def toggle_profiling(self):
+        """Attiva o disattiva la profilazione dei frame; da disattivata lo HUD sparisce."""
+        self.profiler.enabled = self.profiling_var.get()
+        if not self.profiler.enabled:
+            self.hud.hide()
+    
+    def save_trace(self):
+        """Salva la traccia dei frame misurati in trace_path.json e trace_path.csv."""
+        self.profiler.export(trace_path + ".json")
+        self.profiler.export(trace_path + ".csv")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,14 +1,17 @@
 import tkinter as tk
 from tkinter import ttk
 import numpy as np
-import matplotlib
-matplotlib.use("TkAgg")
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+
+import profiling
 
 # Costanti fisiche
 g = 9.81  # accelerazione di gravità (m/s^2)
 
+# Parametri dell'anteprima veloce
+frame_ms = 16              # intervallo minimo tra due ridisegni (circa un frame a 60 Hz)
+arrow_length_scale = 0.2   # fattore per ridurre la freccia sul grafico
+trace_path = "traccia_frame"  # traccia della profilazione dei frame (salvata in .json e .csv)
+
 class FrecciaSimulatore(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -28,12 +31,28 @@ class FrecciaSimulatore(tk.Tk):
         # Creo i controlli nella left_frame
         self.create_controls(self.left_frame)
 
-        # Creo la figura matplotlib nella right_frame
+        # Creo la figura matplotlib nella right_frame (matplotlib si importa solo
+        # quando si apre la finestra, non all'import del modulo)
+        import matplotlib
+        matplotlib.use("TkAgg")
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
         self.fig = Figure(figsize=(5, 4), dpi=100)
         self.ax = self.fig.add_subplot(111)
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.right_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
+        # Artisti persistenti e sfondo statico per il blitting
+        self.background = None
+        self.update_pending = False
+        self.create_artists()
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+        # Profilazione dei frame (disattivata finché non la si accende dai controlli)
+        self.profiler = profiling.FrameProfiler(count_items=lambda: len(self.fig.findobj()))
+        self.hud = profiling.FigureHUD(self.ax)
+        self.profiler.listeners.append(self.hud.update)
+
         # Disegno iniziale
         self.update_plot()
 
@@ -42,7 +61,7 @@ class FrecciaSimulatore(tk.Tk):
         ttk.Label(container, text="Angolo di lancio (°):").pack(pady=5)
         angle_scale = ttk.Scale(
             container, from_=0, to=90, orient=tk.HORIZONTAL,
-            variable=self.angle_deg, command=lambda x: self.update_plot()
+            variable=self.angle_deg, command=lambda x: self.request_update()
         )
         angle_scale.pack(fill=tk.X, padx=5)
 
@@ -50,10 +69,16 @@ class FrecciaSimulatore(tk.Tk):
         ttk.Label(container, text="Velocità Iniziale (m/s):").pack(pady=5)
         velocity_scale = ttk.Scale(
             container, from_=5, to=100, orient=tk.HORIZONTAL,
-            variable=self.velocity, command=lambda x: self.update_plot()
+            variable=self.velocity, command=lambda x: self.request_update()
         )
         velocity_scale.pack(fill=tk.X, padx=5)
 
+        # Profilazione dei frame: HUD sul grafico e traccia su file
+        self.profiling_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(container, text="Profilazione", variable=self.profiling_var,
+                        command=self.toggle_profiling).pack(pady=5)
+        ttk.Button(container, text="Salva traccia", command=self.save_trace).pack()
+
         # Pulsante per aggiornare “manualmente” (se preferisci)
         # In questo caso abbiamo già "update_plot()" dentro i command delle slider
         # ma se vuoi un pulsante dedicato puoi aggiungerlo:
@@ -61,57 +86,117 @@ class FrecciaSimulatore(tk.Tk):
         # update_button = ttk.Button(container, text="Aggiorna", command=self.update_plot)
         # update_button.pack(pady=10)
 
-    def update_plot(self):
-        # Pulisce l'axes
-        self.ax.clear()
-
-        # Legge i parametri
-        angle = np.radians(self.angle_deg.get())
-        v0 = self.velocity.get()
-
-        # Genero un array di tempi
-        # stimo un tempo massimo: tempo di volo approssimato con formula 2*v0*sin(theta)/g
-        t_flight = 2 * v0 * np.sin(angle) / g  
-        t = np.linspace(0, t_flight, 100)
-
-        # Calcolo la traiettoria teorica (senza attrito)
-        x_theo = v0 * np.cos(angle) * t
-        y_theo = v0 * np.sin(angle) * t - 0.5 * g * t**2
-
-        # Disegno la traiettoria teorica tratteggiata
-        self.ax.plot(x_theo, y_theo, 'r--', label='Traiettoria Teorica')
+    def create_artists(self):
+        """
+        Crea una sola volta gli elementi del grafico. Linea e freccia sono
+        "animated": non fanno parte dello sfondo e vengono aggiornati con set_data
+        e disegnati con il blitting.
+        """
+        self.theo_line, = self.ax.plot([], [], 'r--', label='Traiettoria Teorica',
+                                       animated=True)
 
         # Disegno la "freccia" (arrow) che mostra la direzione e l'intensità della velocità iniziale
         # Per comodità, la disegno partendo dall'origine (0,0).
-        # dx, dy = lunghezza orizzontale/verticale
-        arrow_length_scale = 0.2  # fattore per ridurre la freccia sul grafico
-        dx = v0 * np.cos(angle) * arrow_length_scale
-        dy = v0 * np.sin(angle) * arrow_length_scale
-
-        self.ax.arrow(
-            0, 0, dx, dy,
+        self.velocity_arrow = self.ax.arrow(
+            0, 0, 1, 1,
             width=0.02,  # spessore "fusto" della freccia
             head_width=0.5, head_length=0.5,  # dimensioni della punta
             length_includes_head=True,
             color='blue',
-            label='Velocità Iniziale'
+            label='Velocità Iniziale',
+            animated=True
         )
 
-        # Imposto i limiti dell’asse
-        # Potrei farlo in base al range della traiettoria
-        max_x = max(x_theo) * 1.1
-        max_y = max(y_theo) * 1.1
-        self.ax.set_xlim(0, max_x if max_x > 0 else 10)
-        self.ax.set_ylim(0, max_y if max_y > 0 else 10)
-
         self.ax.set_xlabel("Distanza (m)")
         self.ax.set_ylabel("Altezza (m)")
         self.ax.set_title("Tiro con Freccia - Traiettoria Teorica")
         self.ax.legend()
         self.ax.grid(True)
 
-        # Aggiorno il canvas
-        self.canvas.draw()
+    def on_draw(self, event):
+        """Dopo ogni ridisegno completo salva lo sfondo statico e ridisegna gli artisti animati."""
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        self.ax.draw_artist(self.theo_line)
+        self.ax.draw_artist(self.velocity_arrow)
+        self.ax.draw_artist(self.hud.text)
+
+    def request_update(self):
+        """
+        Raggruppa gli eventi delle slider: al massimo un ridisegno per frame,
+        con i valori più recenti.
+        """
+        if not self.update_pending:
+            self.update_pending = True
+            self.after(frame_ms, self.flush_update)
+            self.profiler.schedule("update_plot", frame_ms)
+
+    def flush_update(self):
+        self.update_pending = False
+        self.update_plot()
+
+    @profiling.profiled("update_plot")
+    def update_plot(self):
+        # Legge i parametri
+        angle = np.radians(self.angle_deg.get())
+        v0 = self.velocity.get()
+
+        with self.profiler.phase("calcolo"):
+            # Genero un array di tempi
+            # stimo un tempo massimo: tempo di volo approssimato con formula 2*v0*sin(theta)/g
+            t_flight = 2 * v0 * np.sin(angle) / g  
+            t = np.linspace(0, t_flight, 100)
+
+            # Calcolo la traiettoria teorica (senza attrito)
+            x_theo = v0 * np.cos(angle) * t
+            y_theo = v0 * np.sin(angle) * t - 0.5 * g * t**2
+
+        # Aggiorno la traiettoria teorica e la freccia della velocità iniziale
+        with self.profiler.phase("artisti"):
+            self.theo_line.set_data(x_theo, y_theo)
+            dx = v0 * np.cos(angle) * arrow_length_scale
+            dy = v0 * np.sin(angle) * arrow_length_scale
+            self.velocity_arrow.set_data(dx=dx, dy=dy)
+
+        # I limiti dell'asse si ricalcolano solo se la traiettoria esce dalla vista
+        # (o diventa troppo piccola per leggerla): in quel caso serve un ridisegno completo
+        max_x = max(x_theo.max(), dx)
+        max_y = max(y_theo.max(), dy)
+        with self.profiler.phase("disegno"):
+            if self.limits_changed(max_x, max_y) or self.background is None:
+                self.canvas.draw()
+                return
+
+            # Percorso veloce: sfondo in cache + artisti animati
+            self.canvas.restore_region(self.background)
+            self.draw_artists()
+            self.canvas.blit(self.ax.bbox)
+
+    def limits_changed(self, max_x, max_y):
+        """Aggiorna i limiti dell'asse se necessario e restituisce True se sono cambiati."""
+        x_lim = self.ax.get_xlim()[1]
+        y_lim = self.ax.get_ylim()[1]
+        outside = max_x > x_lim or max_y > y_lim
+        too_small = max_x < 0.25 * x_lim and max_y < 0.25 * y_lim
+        if not (outside or too_small) and self.background is not None:
+            return False
+        self.ax.set_xlim(0, max_x * 1.1 if max_x > 0 else 10)
+        self.ax.set_ylim(0, max_y * 1.1 if max_y > 0 else 10)
+        return True
+
+    def toggle_profiling(self):
+        """Attiva o disattiva la profilazione dei frame; da disattivata lo HUD sparisce."""
+        self.profiler.enabled = self.profiling_var.get()
+        if not self.profiler.enabled:
+            self.hud.hide()
+            self.request_update()
+
+    def save_trace(self):
+        """Salva la traccia dei frame misurati in trace_path.json e trace_path.csv."""
+        self.profiler.export(trace_path + ".json")
+        self.profiler.export(trace_path + ".csv")
 
 if __name__ == "__main__":
     app = FrecciaSimulatore()
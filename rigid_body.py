@@ -0,0 +1,404 @@
+"""
+Modello di volo a corpo rigido (6 gradi di libertà) per batch di frecce.
+
+Il modello di trajectory_engine tratta la freccia come un punto materiale con
+drag isotropo: non vede l'angolo d'attacco, il beccheggio che riporta la punta
+lungo la traiettoria e la deriva del vento laterale. Qui ogni freccia ha in 3D
+posizione, velocità, asse (versore dalla cocca alla punta; il rollio non conta
+per una freccia assialsimmetrica) e velocità angolare, integrati insieme per
+tutto il batch con Runge-Kutta 4 a passo fisso. Assi: x lungo il tiro, y in
+alto, z a destra.
+
+Forze aerodinamiche, calcolate con la velocità relativa all'aria di ogni
+superficie (che include la rotazione, da cui lo smorzamento del beccheggio):
+- resistenza assiale k * |u| * (u . asse) lungo l'asse: ad angolo d'attacco
+  nullo coincide con il drag k * |u| * u del motore a punto materiale;
+- resistenza trasversale della canna (flusso incrociato), applicata a metà
+  canna, dietro il baricentro;
+- forza normale delle penne, lontano dietro il baricentro: il momento che ne
+  risulta allinea la freccia alla velocità (stabilizzazione dell'impennaggio).
+
+Paradosso dell'arciere: al rilascio la canna parte flessa di paradox metri
+(sul piano orizzontale, rilascio con le dita) e oscilla sul primo modo
+libero-libero, con frequenza ricavata dallo spine (freccia statica della
+canna, norma ATA) e smorzamento bending_damping. L'energia di flessione viene
+sottratta alla velocità di lancio (la "perdita sull'elasticità" del prompt,
+riportata in elastic_efficiency) e la coda flessa inclina le penne, che
+spingono la freccia di lato finché l'oscillazione non si smorza.
+
+simulate_batch accetta gli stessi parametri del motore a punto materiale (più
+crosswind, launch_yaw e la geometria in Arrow) e restituisce un
+BatchResult con la proiezione sul piano verticale di tiro: i percorsi (x, y)
+possono animare il canvas 2D come quelli del motore (playback.integrate con
+model="rigid").
+"""
+import numpy as np
+
+import trajectory_engine
+from trajectory_engine import BatchResult, _PathRecorder, effective_speed, g, k, m, rho
+
+METHODS = ("rk4",)
+
+dt = 0.01                  # passo di integrazione (s) dopo il rilascio
+launch_step = 0.25         # passo durante l'oscillazione della canna, per radiante di pulsazione
+bending_tolerance = 1e-4   # inclinazione delle penne (rad) sotto cui l'oscillazione è trascurabile
+t_max = trajectory_engine.t_max
+
+# Geometria e struttura predefinite della freccia
+length = 0.75            # lunghezza della freccia (m)
+diameter = 0.0075        # diametro della canna (m)
+foc = 0.10               # baricentro davanti al centro della canna (frazione della lunghezza)
+shaft_crossflow = 1.2    # coefficiente di resistenza trasversale della canna (cilindro)
+fletching_area = 0.0045  # superficie complessiva delle penne (m^2)
+fletching_normal = 1.8   # pendenza della forza normale delle penne (1/rad)
+fletching_offset = 0.06  # distanza del centro delle penne dalla cocca (m)
+spine = 0.0127           # freccia statica della canna (m): 0.500" = spine 500
+bending_damping = 0.06   # smorzamento relativo della flessione
+paradox = 0.015          # flessione della punta al rilascio (m)
+
+SPINE_LOAD = 8.63        # carico della prova di spine ATA (N, 1.94 lbf)
+SPINE_SPAN = 0.7112      # luce della prova di spine ATA (m, 28")
+FREE_FREE = 4.730        # beta * L del primo modo di flessione libero-libero
+MODE_SLOPE = 4.647       # pendenza all'estremità del modo (per L) con flessione unitaria
+
+
+class Arrow:
+    """Geometria e struttura della freccia (valori predefiniti di modulo)."""
+
+    def __init__(self, length=length, diameter=diameter, foc=foc,
+                 shaft_crossflow=shaft_crossflow, fletching_area=fletching_area,
+                 fletching_normal=fletching_normal, fletching_offset=fletching_offset,
+                 spine=spine, bending_damping=bending_damping, paradox=paradox):
+        self.length = length
+        self.diameter = diameter
+        self.foc = foc
+        self.shaft_crossflow = shaft_crossflow
+        self.fletching_area = fletching_area
+        self.fletching_normal = fletching_normal
+        self.fletching_offset = fletching_offset
+        self.spine = spine
+        self.bending_damping = bending_damping
+        self.paradox = paradox
+
+    @property
+    def stiffness(self):
+        """Rigidezza flessionale EI (N m^2) dalla prova di spine: s = F L^3 / (48 EI)."""
+        return SPINE_LOAD * SPINE_SPAN ** 3 / (48 * self.spine)
+
+    def bending_frequency(self, mass):
+        """Pulsazione (rad/s) del primo modo di flessione, canna di massa uniforme."""
+        return FREE_FREE ** 2 * np.sqrt(self.stiffness / (mass * self.length ** 3))
+
+
+class RigidBodyResult(BatchResult):
+    """
+    BatchResult del modello a corpo rigido (range, apex, paths, ... sul piano
+    verticale di tiro), con in più:
+    - drift: spostamento laterale al punto d'impatto (m, positivo a destra);
+    - drift_paths: z negli stessi campioni di paths (None senza percorsi);
+    - max_angle_of_attack: angolo massimo tra asse e velocità relativa (gradi);
+    - elastic_efficiency: rapporto tra velocità dopo e prima della perdita
+      per la flessione della canna.
+    """
+
+    def __init__(self, range_, apex, flight_time, landed, steps, evaluations, paths, times,
+                 velocities, drift, drift_paths, max_angle_of_attack, elastic_efficiency,
+                 impact_height=None, height_at_target=None):
+        super().__init__(range_, apex, flight_time, landed, steps, evaluations, paths, times,
+                         height_at_target, velocities, impact_height)
+        self.drift = drift
+        self.drift_paths = drift_paths
+        self.max_angle_of_attack = max_angle_of_attack
+        self.elastic_efficiency = elastic_efficiency
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _cross(a, b):
+    return np.array((a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2],
+                     a[0] * b[1] - a[1] * b[0]))
+
+
+def _norm(a):
+    return np.sqrt(_dot(a, a))
+
+
+class _Flight:
+    """Parametri per freccia delle frecce ancora in volo e derivata dello stato."""
+
+    def __init__(self, arrow, mass, drag, wind, crosswind, rho, environment=None):
+        self.environment = environment
+        self.mass = mass
+        self.drag = drag
+        self.wind = np.array((wind, np.zeros_like(wind), crosswind))
+        self.inertia = mass * arrow.length ** 2 / 12
+        self.shaft_arm = arrow.foc * arrow.length
+        self.fletching_arm = (0.5 + arrow.foc) * arrow.length - arrow.fletching_offset
+        self.shaft_factor = 0.5 * rho * arrow.shaft_crossflow * arrow.diameter * arrow.length
+        self.fletching_factor = 0.5 * rho * arrow.fletching_normal * arrow.fletching_area
+        # Oscillazione della canna in forma chiusa (non dipende dal volo)
+        self.omega = arrow.bending_frequency(mass)
+        self.zeta = arrow.bending_damping
+        self.omega_d = self.omega * np.sqrt(1 - self.zeta ** 2)
+        self.tail_slope = MODE_SLOPE * arrow.paradox / arrow.length
+
+    def keep(self, mask):
+        for name in ("mass", "drag", "inertia", "omega", "omega_d"):
+            setattr(self, name, getattr(self, name)[mask])
+        self.wind = self.wind[:, mask]
+
+    def settle_time(self):
+        """
+        Istante dopo il quale la flessione non inclina più le penne di oltre
+        bending_tolerance in nessuna freccia: fin lì serve il passo breve.
+        """
+        if self.tail_slope <= bending_tolerance:
+            return 0.0
+        if self.zeta <= 0:
+            return np.inf
+        return np.log(self.tail_slope / bending_tolerance) / (self.zeta * self.omega.min())
+
+    def bending(self, t):
+        """Inclinazione delle penne (rad) dovuta alla flessione della canna all'istante t."""
+        decay = np.exp(-self.zeta * self.omega * t)
+        return self.tail_slope * decay * (np.cos(self.omega_d * t)
+                                          + self.zeta * self.omega / self.omega_d
+                                          * np.sin(self.omega_d * t))
+
+    def air(self, state):
+        """
+        Velocità relativa all'aria e rapporto tra densità locale e rho, con i
+        campi dell'ambiente valutati sul piano di tiro.
+        """
+        u = state[3:6] - self.wind
+        density = 1.0
+        environment = self.environment
+        if environment is not None:
+            if environment.density is not None:
+                density = environment.density(state[1])
+            if environment.wind is not None:
+                u[0] -= environment.wind(state[0], state[1])
+        return u, density
+
+    def derivatives(self, state, t):
+        v, axis, spin = state[3:6], state[6:9], state[9:12]
+        u, density = self.air(state)
+        speed = _norm(u)
+        turn = _cross(spin, axis)
+
+        # Resistenza assiale
+        force = -self.drag * speed * _dot(u, axis) * axis
+
+        # Canna: flusso incrociato a metà canna
+        u_shaft = u - self.shaft_arm * turn
+        cross_shaft = u_shaft - _dot(u_shaft, axis) * axis
+        shaft = -self.shaft_factor * _norm(cross_shaft) * cross_shaft
+
+        # Penne, inclinate dalla flessione sul piano orizzontale (normale all'asse)
+        side = _cross(axis, np.array((0.0, 1.0, 0.0))[:, None])
+        side_norm = _norm(side)
+        side = np.where(side_norm > 1e-9, side / np.maximum(side_norm, 1e-9),
+                        np.array((0.0, 0.0, 1.0))[:, None])
+        tail = axis + self.bending(t) * side
+        tail = tail / _norm(tail)
+        u_tail = u - self.fletching_arm * turn
+        cross_tail = u_tail - _dot(u_tail, tail) * tail
+        fletching = -self.fletching_factor * _norm(u_tail) * cross_tail
+
+        force, shaft, fletching = density * force, density * shaft, density * fletching
+        acceleration = (force + shaft + fletching) / self.mass
+        acceleration[1] -= g
+        moment = -_cross(axis, self.shaft_arm * shaft + self.fletching_arm * fletching)
+        angular = moment / self.inertia
+        angular = angular - _dot(angular, axis) * axis
+        return np.concatenate((v, acceleration, turn, angular))
+
+    def step(self, state, t, h):
+        k1 = self.derivatives(state, t)
+        k2 = self.derivatives(state + 0.5 * h * k1, t + 0.5 * h)
+        k3 = self.derivatives(state + 0.5 * h * k2, t + 0.5 * h)
+        k4 = self.derivatives(state + h * k3, t + h)
+        new = state + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        # Asse unitario e velocità angolare senza componente di rollio
+        new[6:9] /= _norm(new[6:9])
+        new[9:12] -= _dot(new[9:12], new[6:9]) * new[6:9]
+        return new
+
+    def angle_of_attack(self, state):
+        u, _ = self.air(state)
+        cosine = _dot(u, state[6:9]) / np.maximum(_norm(u), 1e-12)
+        return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def simulate_batch(launch_angle, initial_speed, bow_inclination=0.0, mass=m,
+                   drag_coefficient=k, dt=dt, t_max=t_max, record_paths=False,
+                   sample_every=1, method="rk4", ground_height=0.0, target_distance=None,
+                   launch_efficiency=1.0, wind=0.0, inclination_exponent=1.0, crosswind=0.0,
+                   launch_yaw=0.0, arrow=None, rho=rho, environment=None):
+    """
+    Integra un batch di frecce con il modello a corpo rigido. Gli argomenti
+    comuni hanno lo stesso significato che in trajectory_engine.simulate_batch
+    (drag_coefficient è la resistenza assiale k, in kg/m) e accettano array
+    con broadcasting, come crosswind (vento laterale in m/s, positivo verso
+    destra) e launch_yaw (direzione di lancio a destra del piano di tiro,
+    gradi). arrow (Arrow) descrive geometria e spine, comuni a tutto il batch.
+    environment (environment.Environment) ha lo stesso effetto che nel motore
+    a punto materiale, con i campi e il terreno valutati sul piano di tiro
+    (x, y): la deriva laterale non cambia il terreno sotto la freccia.
+    target_distance ferma ogni freccia alla distanza orizzontale indicata e
+    ne riporta la quota in height_at_target, come nel motore a punto
+    materiale. I tiri con parametri non validi (non finiti, velocità o massa
+    non positive) non vengono integrati e hanno esiti NaN.
+
+    Il passo è dt, salvo durante l'oscillazione della canna (fino a quando
+    la flessione diventa trascurabile), quando è ridotto a
+    launch_step / pulsazione di flessione per seguirla.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Metodo di integrazione non disponibile per il corpo rigido: "
+                         f"{method!r} (disponibili: {', '.join(METHODS)})")
+    arrow = arrow or Arrow()
+
+    (angle, speed, inclination, mass, drag, level, stop_x, efficiency, wind, exponent,
+     crosswind, yaw) = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in
+          (launch_angle, initial_speed, bow_inclination, mass, drag_coefficient, ground_height,
+           np.inf if target_distance is None else target_distance, launch_efficiency, wind,
+           inclination_exponent, crosswind, launch_yaw)))
+    shape = angle.shape
+    (angle, speed, inclination, mass, drag, level, stop_x, efficiency, wind, exponent, crosswind,
+     yaw) = (a.ravel() for a in (angle, speed, inclination, mass, drag, level, stop_x, efficiency,
+                                 wind, exponent, crosswind, yaw))
+    n = angle.size
+
+    with np.errstate(invalid="ignore"):  # masse non positive: scartate come non valide più sotto
+        flight = _Flight(arrow, mass, drag, wind, crosswind, rho, environment)
+    terrain = None if environment is None else environment.terrain
+
+    # Velocità di lancio: perdite dell'arco e inclinazione come nel motore, poi l'energia
+    # che resta nella flessione della canna (massa modale m/4 per flessione della punta)
+    v_eff = effective_speed(speed, inclination, efficiency, exponent)
+    bending = flight.omega * arrow.paradox / (2 * np.maximum(v_eff, 1e-12))
+    elastic_efficiency = np.sqrt(np.clip(1 - bending ** 2, 0.0, 1.0))
+    v_launch = v_eff * elastic_efficiency
+
+    theta, psi = np.radians(angle), np.radians(yaw)
+    direction = np.array((np.cos(theta) * np.cos(psi), np.sin(theta), np.cos(theta) * np.sin(psi)))
+    state = np.zeros((12, n))
+    state[3:6] = v_launch * direction
+    state[6:9] = direction
+    active = np.arange(n)
+    t = 0.0
+
+    range_ = np.zeros(n)
+    drift = np.zeros(n)
+    apex = np.zeros(n)
+    flight_time = np.zeros(n)
+    landed = np.zeros(n, dtype=bool)
+    steps = np.zeros(n, dtype=np.int64)
+    max_alpha = np.zeros(n)
+    impact_height = np.zeros(n)
+    height_at_target = np.full(n, np.nan)
+
+    # Tiri con parametri non validi (NaN, velocità o massa non positive): nessuna integrazione
+    invalid = ~(np.isfinite(state).all(axis=0) & np.isfinite(drag) & np.isfinite(wind)
+                & np.isfinite(crosswind) & np.isfinite(flight.omega)) | (v_eff <= 0) | (mass <= 0)
+    if invalid.any():
+        range_[invalid] = drift[invalid] = apex[invalid] = flight_time[invalid] = np.nan
+        impact_height[invalid] = max_alpha[invalid] = elastic_efficiency[invalid] = np.nan
+        active = active[~invalid]
+        state, level, stop_x = state[:, ~invalid], level[~invalid], stop_x[~invalid]
+        flight.keep(~invalid)
+
+    settle = flight.settle_time() if active.size else 0.0
+    launch_dt = min(dt, launch_step / flight.omega.max()) if active.size else dt
+
+    recorder = _PathRecorder(n, sample_every) if record_paths else None
+    if recorder is not None:
+        recorder.add(active, steps[active], state[:6].copy(), np.zeros(active.size))
+
+    while active.size:
+        h = launch_dt if t < settle else dt
+        new = flight.step(state, t, h)
+        t_new = t + h
+        steps[active] += 1
+        apex[active] = np.maximum(apex[active], new[1])
+        max_alpha[active] = np.maximum(max_alpha[active], flight.angle_of_attack(new))
+
+        y0, y1 = state[1], new[1]
+        if terrain is None:
+            hit = (y0 >= level) & (y1 < level)
+        else:
+            hit, frac_terrain = terrain.intersect(state[0], y0 - level, new[0], y1 - level)
+        if hit.any():
+            idx = active[hit]
+            if terrain is None:
+                frac = (y0[hit] - level[hit]) / (y0[hit] - y1[hit])
+            else:
+                frac = frac_terrain[hit]
+            range_[idx] = state[0][hit] + frac * (new[0][hit] - state[0][hit])
+            impact_height[idx] = y0[hit] + frac * (y1[hit] - y0[hit])
+            drift[idx] = state[2][hit] + frac * (new[2][hit] - state[2][hit])
+            flight_time[idx] = t + frac * h
+            landed[idx] = True
+
+        # Passaggio per la distanza del bersaglio, se prima dell'impatto
+        reached = (state[0] < stop_x) & (new[0] >= stop_x)
+        if reached.any():
+            frac_x = (stop_x[reached] - state[0][reached]) / (new[0][reached] - state[0][reached])
+            y_x = y0[reached] + frac_x * (y1[reached] - y0[reached])
+            floor_x = level[reached]
+            if terrain is not None:
+                floor_x = floor_x + terrain.height(stop_x[reached])
+            valid = y_x >= floor_x
+            idx = active[reached][valid]
+            height_at_target[idx] = impact_height[idx] = y_x[valid]
+            range_[idx] = stop_x[reached][valid]
+            drift[idx] = (state[2][reached] + frac_x * (new[2][reached]
+                                                        - state[2][reached]))[valid]
+            flight_time[idx] = (t + frac_x * h)[valid]
+            landed[idx] = False
+            reached[reached] = valid
+
+        state = new
+        t = t_new
+
+        if recorder is not None:
+            keep = ~hit & ~reached & (steps[active] % sample_every == 0)
+            if keep.any():
+                recorder.add(active[keep], steps[active[keep]], state[:6, keep],
+                             np.full(keep.sum(), t))
+
+        if environment is None:
+            floor = np.minimum(level, 0.0)
+        else:
+            floor = environment.surface(level)
+        expired = ~hit & ~reached & ((t >= t_max) | (state[1] < floor))
+        if expired.any():
+            idx = active[expired]
+            range_[idx] = state[0][expired]
+            impact_height[idx] = state[1][expired]
+            drift[idx] = state[2][expired]
+            flight_time[idx] = t
+
+        done = hit | expired | reached
+        if done.any():
+            keep = ~done
+            active, state, level, stop_x = active[keep], state[:, keep], level[keep], stop_x[keep]
+            flight.keep(keep)
+
+    paths = times = velocities = drift_paths = None
+    if recorder is not None:
+        recorded, times = recorder.arrays(shape)
+        paths = (recorded[:, 0], recorded[:, 1])
+        drift_paths = recorded[:, 2]
+        velocities = (recorded[:, 3], recorded[:, 4])
+
+    return RigidBodyResult(range_.reshape(shape), apex.reshape(shape), flight_time.reshape(shape),
+                           landed.reshape(shape), steps.reshape(shape), 4 * steps.reshape(shape),
+                           paths, times, velocities, drift.reshape(shape), drift_paths,
+                           max_alpha.reshape(shape), elastic_efficiency.reshape(shape),
+                           impact_height.reshape(shape),
+                           None if target_distance is None else height_at_target.reshape(shape))
@@ -0,0 +1,210 @@
+"""
+Tabella precalcolata degli esiti del modello con attrito per l'anteprima "reale".
+
+Per i valori correnti di k e m si simula una griglia di tiri (angolo di lancio x
+velocità) con il motore batch e si salvano gittata, quota massima, tempo di volo
+e la forma del percorso ricampionata su pochi punti. L'inclinazione dell'arco
+non richiede un asse dedicato: nel modello entra solo come riduzione della
+velocità (v * cos(inclinazione)), quindi la griglia è su (angolo, velocità
+effettiva) ed è esatta anche per l'inclinazione.
+
+La tabella è salvata su disco in .cache/, con un nome che dipende da costanti
+fisiche, griglia e integratore: viene ricostruita solo quando questi cambiano.
+I tiri fuori dalla griglia (velocità effettiva oltre max_speed, angoli fuori da
+0-90°) non vengono troncati al bordo ma simulati direttamente con il motore.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import trajectory_engine
+
+# Griglia predefinita
+angle_step = 1.0     # passo sull'angolo di lancio (gradi)
+speed_step = 1.0     # passo sulla velocità effettiva (m/s)
+max_speed = 100.0    # velocità massima tabulata (m/s)
+path_points = 48     # punti del percorso ricampionato per ogni tiro
+chunk_size = 2048    # tiri simulati per blocco durante la costruzione
+
+TABLE_VERSION = 1
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+def _bilinear(table, i, j, fi, fj):
+    """Interpolazione bilineare di table[i, j, ...] con pesi fi, fj."""
+    fi = fi.reshape(fi.shape + (1,) * (table.ndim - 2))
+    fj = fj.reshape(fj.shape + (1,) * (table.ndim - 2))
+    return ((1 - fi) * (1 - fj) * table[i, j] + fi * (1 - fj) * table[i + 1, j]
+            + (1 - fi) * fj * table[i, j + 1] + fi * fj * table[i + 1, j + 1])
+
+
+class SurrogateTable:
+    """
+    Esiti del modello con attrito su una griglia regolare (angolo, velocità
+    effettiva), interrogabili per interpolazione bilineare. launch_efficiency
+    e inclination_exponent convertono la velocità iniziale in velocità
+    effettiva (trajectory_engine.effective_speed) e non richiedono una nuova
+    tabella. Costanti e integratore della tabella servono a simulare i tiri
+    fuori dalla griglia.
+    """
+
+    def __init__(self, angles, speeds, range_, apex, flight_time, path_x, path_y,
+                 drag_coefficient=trajectory_engine.k, mass=trajectory_engine.m,
+                 method="euler", dt=trajectory_engine.dt):
+        self.launch_efficiency = 1.0
+        self.inclination_exponent = 1.0
+        self.drag_coefficient = drag_coefficient
+        self.mass = mass
+        self.method = method
+        self.dt = dt
+        self.angles = angles
+        self.speeds = speeds
+        self.range = range_
+        self.apex = apex
+        self.flight_time = flight_time
+        self.path_x = path_x
+        self.path_y = path_y
+
+    def _locate(self, launch_angle, initial_speed, bow_inclination):
+        """
+        Celle della griglia e pesi dell'interpolazione, più angoli, velocità
+        effettive e maschera dei tiri fuori dalla griglia.
+        """
+        v_eff = trajectory_engine.effective_speed(initial_speed, bow_inclination,
+                                                  self.launch_efficiency,
+                                                  self.inclination_exponent)
+        a = np.asarray(launch_angle, dtype=float)
+        a, v_eff = np.broadcast_arrays(a, v_eff)
+        ga = (a - self.angles[0]) / (self.angles[1] - self.angles[0])
+        gv = (v_eff - self.speeds[0]) / (self.speeds[1] - self.speeds[0])
+        outside = (ga < 0) | (ga > len(self.angles) - 1) | (gv < 0) | (gv > len(self.speeds) - 1)
+        ga = np.clip(ga, 0, len(self.angles) - 1)
+        gv = np.clip(gv, 0, len(self.speeds) - 1)
+        i = np.minimum(ga.astype(int), len(self.angles) - 2)
+        j = np.minimum(gv.astype(int), len(self.speeds) - 2)
+        return i, j, ga - i, gv - j, a, v_eff, outside
+
+    def _simulate(self, launch_angle, v_eff, record_paths=False):
+        """Tiri simulati con il motore, con le costanti e l'integratore della tabella."""
+        return trajectory_engine.simulate_batch(launch_angle, v_eff, 0.0, self.mass,
+                                                self.drag_coefficient, dt=self.dt,
+                                                method=self.method, record_paths=record_paths)
+
+    def query(self, launch_angle, initial_speed, bow_inclination=0.0):
+        """
+        Gittata, quota massima e tempo di volo interpolati (array con
+        broadcasting sugli argomenti); simulati per i tiri fuori dalla griglia.
+        """
+        i, j, fi, fj, a, v_eff, outside = self._locate(launch_angle, initial_speed,
+                                                       bow_inclination)
+        range_ = _bilinear(self.range, i, j, fi, fj)
+        apex = _bilinear(self.apex, i, j, fi, fj)
+        flight_time = _bilinear(self.flight_time, i, j, fi, fj)
+        if outside.any():
+            result = self._simulate(a[outside], v_eff[outside])
+            range_[outside] = result.range
+            apex[outside] = result.apex
+            flight_time[outside] = result.flight_time
+        return range_, apex, flight_time
+
+    def path(self, launch_angle, initial_speed, bow_inclination=0.0):
+        """
+        Percorso (x, y) interpolato per un singolo tiro, dal lancio all'impatto;
+        simulato se il tiro è fuori dalla griglia.
+        """
+        i, j, fi, fj, a, v_eff, outside = self._locate(launch_angle, initial_speed,
+                                                       bow_inclination)
+        if outside.any():
+            path_x, path_y = _resample_paths(self._simulate(a.reshape(1), v_eff.reshape(1), True),
+                                             path_points)
+            return path_x[0].astype(float), path_y[0].astype(float)
+        return (_bilinear(self.path_x, i, j, fi, fj).astype(float),
+                _bilinear(self.path_y, i, j, fi, fj).astype(float))
+
+
+def _resample_paths(result, n_points):
+    """Ricampiona ogni percorso su n_points istanti equispaziati del tempo di volo."""
+    xs, ys = result.paths
+    times = result.times
+    s = np.linspace(0.0, 1.0, n_points)
+    out_x = np.zeros((xs.shape[1], n_points), dtype=np.float32)
+    out_y = np.zeros((xs.shape[1], n_points), dtype=np.float32)
+    for shot in range(xs.shape[1]):
+        airborne = ~np.isnan(xs[:, shot])
+        t = np.append(times[airborne, shot], result.flight_time[shot])
+        x = np.append(xs[airborne, shot], result.range[shot])
+        y = np.append(ys[airborne, shot], 0.0)
+        t_query = s * result.flight_time[shot]
+        out_x[shot] = np.interp(t_query, t, x)
+        out_y[shot] = np.interp(t_query, t, y)
+    return out_x, out_y
+
+
+def build_table(drag_coefficient=trajectory_engine.k, mass=trajectory_engine.m,
+                method="euler", dt=trajectory_engine.dt):
+    """Simula la griglia completa con il motore batch, a blocchi di chunk_size tiri."""
+    angles = np.arange(0.0, 90.0 + angle_step / 2, angle_step)
+    speeds = np.arange(0.0, max_speed + speed_step / 2, speed_step)
+    grid_a, grid_v = np.meshgrid(angles, speeds, indexing="ij")
+    grid_a, grid_v = grid_a.ravel(), grid_v.ravel()
+
+    n = grid_a.size
+    range_ = np.zeros(n)
+    apex = np.zeros(n)
+    flight_time = np.zeros(n)
+    path_x = np.zeros((n, path_points), dtype=np.float32)
+    path_y = np.zeros((n, path_points), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        block = slice(start, start + chunk_size)
+        result = trajectory_engine.simulate_batch(
+            grid_a[block], grid_v[block], 0.0, mass, drag_coefficient,
+            dt=dt, method=method, record_paths=True)
+        range_[block] = result.range
+        apex[block] = result.apex
+        flight_time[block] = result.flight_time
+        path_x[block], path_y[block] = _resample_paths(result, path_points)
+
+    shape = (len(angles), len(speeds))
+    return SurrogateTable(angles, speeds, range_.reshape(shape), apex.reshape(shape),
+                          flight_time.reshape(shape),
+                          path_x.reshape(shape + (path_points,)),
+                          path_y.reshape(shape + (path_points,)),
+                          drag_coefficient, mass, method, dt)
+
+
+def cache_key(drag_coefficient, mass, method, dt):
+    """Chiave della tabella: costanti fisiche, griglia e integratore."""
+    spec = {
+        "version": TABLE_VERSION, "g": trajectory_engine.g,
+        "k": float(drag_coefficient), "m": float(mass), "method": method, "dt": float(dt),
+        "angle_step": angle_step, "speed_step": speed_step, "max_speed": max_speed,
+        "path_points": path_points,
+    }
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_or_build(drag_coefficient=trajectory_engine.k, mass=trajectory_engine.m,
+                  method="euler", dt=trajectory_engine.dt):
+    """
+    Restituisce la tabella per le costanti indicate, leggendola dalla cache su
+    disco se presente, altrimenti costruendola e salvandola.
+    """
+    path = os.path.join(cache_dir, f"surrogate-{cache_key(drag_coefficient, mass, method, dt)}.npz")
+    if os.path.exists(path):
+        with np.load(path) as data:
+            return SurrogateTable(data["angles"], data["speeds"], data["range"],
+                                  data["apex"], data["flight_time"],
+                                  data["path_x"], data["path_y"],
+                                  drag_coefficient, mass, method, dt)
+
+    table = build_table(drag_coefficient, mass, method, dt)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Scrittura atomica: un file parziale non viene mai letto come tabella valida
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, angles=table.angles, speeds=table.speeds, range=table.range,
+             apex=table.apex, flight_time=table.flight_time,
+             path_x=table.path_x, path_y=table.path_y)
+    os.replace(tmp_path, path)
+    return table
@@ -0,0 +1,302 @@
+"""
+Sweep di parametri da riga di comando con il motore batch.
+
+La griglia è il prodotto cartesiano degli intervalli richiesti (angolo,
+velocità, inclinazione, k oppure Cd, massa, k_arco, k_elastic) e non viene mai
+costruita per intero: è divisa in blocchi di indici lineari consecutivi e ogni
+blocco ricava i propri punti con np.unravel_index. I blocchi vengono simulati
+da un pool di processi (uno per core, con un numero limitato di blocchi in
+coda) e ciascuno è scritto come file Parquet o CSV separato nella cartella di
+output, con scrittura atomica.
+
+Uno sweep interrotto si riprende rilanciando lo stesso comando: i blocchi già
+scritti vengono saltati. La cartella contiene anche sweep.json con la
+descrizione dello sweep, per non mescolare risultati di griglie diverse.
+
+Con --paths vengono archiviate anche le traiettorie complete, un archivio
+trajectory_store per blocco (cartelle paths-NNNNNN), simulate a sotto-blocchi
+di paths_chunk tiri per limitare la memoria.
+
+Con --model rigid i tiri usano il modello a corpo rigido di rigid_body.py (RK4,
+passo rigid_body.dt se non indicato) e ogni punto riporta anche deriva
+laterale, angolo d'attacco massimo ed efficienza elastica.
+
+pandas viene importato solo dalle funzioni che scrivono o leggono i blocchi:
+parse_values e la descrizione della griglia si possono usare (ad esempio da
+freccia.py) senza pagarne il tempo di import.
+
+Esempio:
+    python sweep.py --angle 0:90:91 --speed 10:100:91 --k 0.005:0.05:10 --out risultati
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import trajectory_engine
+import trajectory_store
+
+# Assi della griglia e valori predefiniti (un solo valore se non indicati)
+AXES = (
+    ("angle", 45.0),                  # angolo di lancio (gradi)
+    ("speed", 50.0),                  # velocità iniziale (m/s)
+    ("inclination", 0.0),             # inclinazione dell'arco (gradi)
+    ("k", trajectory_engine.k),       # fattore di drag (kg/m)
+    ("mass", trajectory_engine.m),    # massa della freccia (kg)
+    ("k_arco", 1.0),                  # efficienza dell'arco (0-1)
+    ("k_elastic", 1.0),               # perdita sull'elasticità della freccia (0-1)
+)
+
+FORMATS = ("parquet", "csv")
+
+chunk_size = 65536   # punti della griglia per blocco (un file per blocco)
+area = 0.005         # sezione della freccia (m^2) per convertire Cd in k, come in prompt1_gpto1.py
+paths_chunk = 4096   # tiri simulati insieme quando si archiviano le traiettorie
+
+SWEEP_VERSION = 1
+MANIFEST = "sweep.json"
+
+
+def parse_values(text):
+    """
+    Valori di un asse: "inizio:fine:numero" (estremi inclusi), un elenco
+    separato da virgole oppure un singolo numero.
+    """
+    if ":" in text:
+        start, stop, num = text.split(":")
+        return np.linspace(float(start), float(stop), int(num)).tolist()
+    return [float(v) for v in text.split(",")]
+
+
+def grid_shape(spec):
+    return tuple(len(values) for values in spec["axes"].values())
+
+
+def grid_points(spec, start, stop):
+    """Punti della griglia con indice lineare in [start, stop), colonna per colonna."""
+    index = np.arange(start, min(stop, int(np.prod(grid_shape(spec)))), dtype=np.int64)
+    positions = np.unravel_index(index, grid_shape(spec))
+    columns = {"point": index}
+    for (name, values), pos in zip(spec["axes"].items(), positions):
+        columns[name] = np.asarray(values, dtype=float)[pos]
+    if "cd" in columns:
+        columns["k"] = trajectory_engine.drag_factor(columns["cd"], spec["area"], spec["rho"])
+    return columns
+
+
+def part_path(out_dir, chunk, fmt):
+    return os.path.join(out_dir, f"part-{chunk:06d}.{fmt}")
+
+
+def paths_path(out_dir, chunk):
+    return os.path.join(out_dir, f"paths-{chunk:06d}")
+
+
+OUTCOMES = ("range", "apex", "flight_time", "landed")
+RIGID_OUTCOMES = ("drift", "max_angle_of_attack", "elastic_efficiency")  # solo con --model rigid
+
+
+def outcomes_of(spec):
+    """Esiti scritti per ogni punto: quelli del modello a corpo rigido si aggiungono."""
+    return OUTCOMES + RIGID_OUTCOMES if spec.get("model") == "rigid" else OUTCOMES
+
+
+def record_paths(spec, params, path):
+    """
+    Simula i tiri a sotto-blocchi di paths_chunk (i percorsi completi occupano
+    molta più memoria degli esiti) e ne archivia le traiettorie in path, con
+    scrittura atomica. Restituisce gli esiti come colonne.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    engine = trajectory_engine.engine(spec.get("model", "point"))
+    outcomes = {name: [] for name in outcomes_of(spec)}
+    with trajectory_store.TrajectoryStore(tmp_path, "a") as store:
+        for start in range(0, len(params["launch_angle"]), paths_chunk):
+            part = {name: values[start:start + paths_chunk] for name, values in params.items()}
+            result = engine.simulate_batch(**part, dt=spec["dt"], method=spec["method"],
+                                           record_paths=True)
+            store.append_batch(result, **part, dt=spec["dt"], method=spec["method"],
+                               model=spec.get("model", "point"))
+            for name in outcomes:
+                outcomes[name].append(getattr(result, name))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return {name: np.concatenate(values) for name, values in outcomes.items()}
+
+
+def run_chunk(spec, chunk, out_dir):
+    """Simula un blocco della griglia e ne scrive i risultati; restituisce i punti simulati."""
+    import pandas as pd
+
+    start = chunk * spec["chunk_size"]
+    frame = pd.DataFrame(grid_points(spec, start, start + spec["chunk_size"]))
+    params = dict(launch_angle=frame["angle"].to_numpy(), initial_speed=frame["speed"].to_numpy(),
+                  bow_inclination=frame["inclination"].to_numpy(), mass=frame["mass"].to_numpy(),
+                  drag_coefficient=frame["k"].to_numpy(),
+                  launch_efficiency=(frame["k_arco"] * frame["k_elastic"]).to_numpy())
+    if spec.get("paths"):
+        outcomes = record_paths(spec, params, paths_path(out_dir, chunk))
+    else:
+        engine = trajectory_engine.engine(spec.get("model", "point"))
+        result = engine.simulate_batch(**params, dt=spec["dt"], method=spec["method"])
+        outcomes = {name: getattr(result, name) for name in outcomes_of(spec)}
+    for name in outcomes_of(spec):
+        frame[name] = outcomes[name]
+
+    # Scrittura atomica: un blocco presente su disco è sempre completo
+    path = part_path(out_dir, chunk, spec["format"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if spec["format"] == "parquet":
+        frame.to_parquet(tmp_path, index=False)
+    else:
+        frame.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return len(frame)
+
+
+def prepare_output(spec, out_dir):
+    """
+    Crea la cartella di output o verifica che contenga lo stesso sweep, ed
+    elimina i file (e gli archivi) temporanei lasciati da un'esecuzione interrotta.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            if json.load(f) != spec:
+                raise ValueError(f"{out_dir} contiene uno sweep con parametri diversi")
+    else:
+        with open(manifest, "w") as f:
+            json.dump(spec, f, indent=2)
+    for tmp_path in glob.glob(os.path.join(out_dir, "*.tmp")):
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        else:
+            os.remove(tmp_path)
+
+
+def run_sweep(spec, out_dir, workers=None, progress=None):
+    """
+    Esegue (o riprende) lo sweep descritto da spec nella cartella out_dir.
+    progress, se indicato, viene chiamata con (blocchi completati, blocchi totali).
+    Restituisce il numero di punti simulati in questa esecuzione.
+    """
+    prepare_output(spec, out_dir)
+    n_chunks = -(-int(np.prod(grid_shape(spec))) // spec["chunk_size"])
+    pending = [c for c in range(n_chunks)
+               if not os.path.exists(part_path(out_dir, c, spec["format"]))]
+    done = n_chunks - len(pending)
+    workers = workers or os.cpu_count()
+    simulated = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Al più due blocchi in coda per processo: la memoria non cresce con la griglia
+        running = set()
+        for chunk in pending:
+            running.add(pool.submit(run_chunk, spec, chunk, out_dir))
+            if len(running) >= 2 * workers:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    simulated += future.result()
+                    done += 1
+                    if progress:
+                        progress(done, n_chunks)
+        for future in wait(running).done:
+            simulated += future.result()
+            done += 1
+            if progress:
+                progress(done, n_chunks)
+    return simulated
+
+
+def read_results(out_dir, columns=None):
+    """Legge in un unico DataFrame i blocchi già scritti di uno sweep."""
+    import pandas as pd
+
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        fmt = json.load(f)["format"]
+    parts = sorted(glob.glob(os.path.join(out_dir, f"part-*.{fmt}")))
+    if fmt == "parquet":
+        frames = [pd.read_parquet(p, columns=columns) for p in parts]
+    else:
+        frames = [pd.read_csv(p, usecols=columns) for p in parts]
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Sweep di parametri del tiro con attrito, risultati a blocchi in Parquet/CSV.",
+        epilog='Ogni asse accetta "inizio:fine:numero", un elenco "a,b,c" o un singolo valore.')
+    for name, default in AXES:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=parse_values,
+                            default=[default], metavar="VALORI")
+    parser.add_argument("--cd", type=parse_values, metavar="VALORI",
+                        help="coefficiente di drag al posto di --k (k = 0.5 * Cd * rho * A)")
+    parser.add_argument("--area", type=float, default=area, help="sezione della freccia (m^2)")
+    parser.add_argument("--rho", type=float, default=trajectory_engine.rho,
+                        help="densità dell'aria (kg/m^3)")
+    parser.add_argument("--model", choices=trajectory_engine.MODELS, default="point",
+                        help="modello di volo: punto materiale o corpo rigido (rigid_body.py)")
+    parser.add_argument("--method", choices=trajectory_engine.METHODS, default=None,
+                        help="integratore (predefinito: euler, rk4 con --model rigid)")
+    parser.add_argument("--dt", type=float, default=None,
+                        help="passo (s); predefinito quello del modello di volo")
+    parser.add_argument("--chunk-size", type=int, default=chunk_size)
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--paths", action="store_true",
+                        help="archivia anche le traiettorie complete (trajectory_store)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processi del pool (predefinito: tutti i core)")
+    parser.add_argument("--out", required=True, help="cartella dei risultati")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    engine = trajectory_engine.engine(args.model)
+    method = args.method or engine.METHODS[0]
+    if method not in engine.METHODS:
+        parser.error(f"--model {args.model} supporta solo --method {', '.join(engine.METHODS)}")
+
+    axes = {name: getattr(args, name) for name, _ in AXES}
+    if args.cd is not None:
+        # Cd sostituisce k come asse della griglia
+        axes = {("cd" if name == "k" else name): (args.cd if name == "k" else values)
+                for name, values in axes.items()}
+    spec = {"version": SWEEP_VERSION, "axes": axes, "area": args.area, "rho": args.rho,
+            "method": method, "dt": args.dt or engine.dt, "chunk_size": args.chunk_size,
+            "format": args.format}
+    if args.paths:
+        spec["paths"] = True
+    if args.model != "point":
+        spec["model"] = args.model
+
+    if args.format == "parquet":
+        import pandas as pd
+
+        try:
+            pd.io.parquet.get_engine("auto")
+        except ImportError:
+            parser.error("Parquet richiede pyarrow o fastparquet (oppure usare --format csv)")
+
+    try:
+        prepare_output(spec, args.out)
+    except ValueError as e:
+        parser.error(str(e))
+
+    total = int(np.prod(grid_shape(spec)))
+    print(f"{total} punti in blocchi da {args.chunk_size}", file=sys.stderr)
+    simulated = run_sweep(spec, args.out, args.workers,
+                          lambda done, n: print(f"blocco {done}/{n}", file=sys.stderr))
+    print(f"{simulated} punti simulati, risultati in {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Cache delle traiettorie condivisa da anteprima, lancio e riproduzione.
+
+Ad ogni evento degli slider l'anteprima ricalcolava la traiettoria senza
+attrito punto per punto, il lancio la ricalcolava da capo e il thread di fisica
+integrava di nuovo il tiro con attrito anche a parametri invariati. Qui ogni
+risultato viene calcolato una volta sola e conservato:
+- chiave: tipo di risultato, parametri del tiro quantizzati (angolo e
+  inclinazione a angle_quantum gradi, velocità a speed_quantum m/s) e
+  costanti fisiche arrotondate a constant_digits cifre significative; tiri che
+  differiscono meno di un quanto condividono il risultato;
+- valori: tuple di array NumPy contigui (la traiettoria senza attrito è
+  calcolata in forma chiusa, gli stati del tiro con attrito sono una matrice
+  5 x n invece di cinque liste di float Python, con l'esito del tiro);
+- LRU limitata in byte (max_bytes): oltre il limite vengono scartati i
+  risultati usati meno di recente.
+"""
+import collections
+
+import numpy as np
+
+import playback
+import trajectory_engine
+
+max_bytes = 32 << 20      # memoria massima dei risultati conservati (byte)
+entry_overhead = 256      # byte contati per ogni voce oltre agli array (chiave, tupla)
+
+angle_quantum = 0.01      # gradi
+speed_quantum = 0.01      # m/s
+constant_digits = 6       # cifre significative delle costanti fisiche nella chiave
+
+
+def _quantize(value, quantum):
+    return round(float(value) / quantum) * quantum
+
+
+def _significant(value):
+    if value is None or isinstance(value, str):
+        return value
+    if hasattr(value, "fingerprint"):
+        # Oggetti con un'impronta del contenuto, come environment.Environment
+        return value.fingerprint
+    return float(f"{float(value):.{constant_digits}g}")
+
+
+def theoretical_path(launch_angle, initial_speed, dt=trajectory_engine.dt, g=trajectory_engine.g):
+    """
+    Traiettoria senza attrito in forma chiusa: punti agli istanti multipli di
+    dt finché la freccia è sopra il suolo, chiusi dal punto d'impatto esatto.
+    """
+    theta = np.radians(launch_angle)
+    vx = initial_speed * np.cos(theta)
+    vy = initial_speed * np.sin(theta)
+    t_flight = max(2 * vy / g, 0.0)
+    t = np.arange(int(t_flight / dt) + 1) * dt
+    xs = vx * t
+    ys = vy * t - 0.5 * g * t * t
+    above = ys >= 0
+    xs, ys = xs[above], ys[above]
+    if t_flight > t[above][-1]:
+        xs = np.append(xs, vx * t_flight)
+        ys = np.append(ys, 0.0)
+    return xs, ys
+
+
+class TrajectoryCache:
+    """
+    Risultati per chiave quantizzata, con scarto LRU oltre max_bytes e
+    contatori di successi, mancati e scarti.
+    """
+
+    def __init__(self, max_bytes=max_bytes):
+        self.max_bytes = max_bytes
+        self.items = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(kind, launch_angle, initial_speed, bow_inclination=0.0, **constants):
+        """Chiave quantizzata di un risultato di tipo kind per un tiro."""
+        return (kind, _quantize(launch_angle, angle_quantum),
+                _quantize(initial_speed, speed_quantum),
+                _quantize(bow_inclination, angle_quantum),
+                *((name, _significant(value)) for name, value in sorted(constants.items())))
+
+    def get(self, key):
+        arrays = self.items.get(key)
+        if arrays is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return arrays
+
+    def put(self, key, arrays):
+        arrays = tuple(np.ascontiguousarray(a) for a in arrays)
+        old = self.items.pop(key, None)
+        if old is not None:
+            self.bytes -= self._size(old)
+        self.items[key] = arrays
+        self.bytes += self._size(arrays)
+        while self.bytes > self.max_bytes and self.items:
+            _, evicted = self.items.popitem(last=False)
+            self.bytes -= self._size(evicted)
+            self.evictions += 1
+        return arrays
+
+    @staticmethod
+    def _size(arrays):
+        return entry_overhead + sum(a.nbytes for a in arrays)
+
+    def lookup(self, key, compute):
+        """Risultato per key, calcolato con compute() (tupla di array) solo se manca."""
+        arrays = self.get(key)
+        return arrays if arrays is not None else self.put(key, compute())
+
+    def clear(self):
+        self.items.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self.items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None}
+
+    def theoretical(self, launch_angle, initial_speed, dt=trajectory_engine.dt,
+                    g=trajectory_engine.g):
+        """Traiettoria senza attrito (xs, ys), vedi theoretical_path."""
+        return self.lookup(self.key("teorica", launch_angle, initial_speed, dt=dt, g=g),
+                           lambda: theoretical_path(launch_angle, initial_speed, dt, g))
+
+    def states(self, launch_angle, initial_speed, bow_inclination=0.0, **engine_kwargs):
+        """
+        StateBuffer completo del tiro con attrito già integrato con gli stessi
+        parametri (per playback.Playback), None se non è in cache.
+        """
+        arrays = self.get(self.key("stati", launch_angle, initial_speed, bow_inclination,
+                                   **engine_kwargs))
+        if arrays is None:
+            return None
+        states, landed = arrays
+        buffer = playback.StateBuffer()
+        buffer.publish(*(row.tolist() for row in states), finished=True, landed=bool(landed))
+        return buffer
+
+    def put_states(self, buffer, launch_angle, initial_speed, bow_inclination=0.0,
+                   **engine_kwargs):
+        """Conserva gli stati di un tiro integrato senza errori (buffer completo)."""
+        if not buffer.finished or buffer.error is not None:
+            return
+        states = np.array((buffer.times, buffer.xs, buffer.ys, buffer.vxs, buffer.vys))
+        self.put(self.key("stati", launch_angle, initial_speed, bow_inclination,
+                          **engine_kwargs), (states, np.array(bool(buffer.landed))))
@@ -0,0 +1,508 @@
+"""
+Motore di traiettorie "headless" per il modello con attrito dell'aria.
+
+Integra in un colpo solo migliaia di frecce rappresentate come vettori di stato
+NumPy, senza alcuna dipendenza da Tkinter. Il modello fisico è lo stesso degli
+script GUI: velocità effettiva ridotta di cos(inclinazione arco) e drag
+quadratico a = -(k/m) * |v| * v, più la gravità.
+
+Integratori disponibili (argomento method):
+- "euler": Eulero semi-implicito a passo fisso, identico a update_simulation
+- "rk4": Runge-Kutta classico del quarto ordine a passo fisso
+- "rk45": Dormand-Prince 5(4) a passo adattivo per ogni freccia (rtol/atol)
+Con "rk4" e "rk45" l'istante d'impatto viene trovato risolvendo l'interpolante
+di Hermite cubico all'interno dell'ultimo passo.
+"""
+import sys
+
+import numpy as np
+
+# Costanti fisiche e parametri predefiniti (gli stessi degli script o3-mini)
+g = 9.81         # Accelerazione di gravità (m/s^2)
+dt = 0.02        # Passo temporale (s)
+m = 0.1          # Massa della freccia (kg)
+k = 0.02         # Fattore di attrito (drag) in kg/m
+rho = 1.225      # Densità dell'aria (kg/m^3)
+
+t_max = 60.0     # Tempo massimo di volo simulato (s), di sicurezza
+
+# Tolleranze predefinite per l'integratore adattivo
+rtol = 1e-6
+atol = 1e-6
+
+METHODS = ("euler", "rk4", "rk45")
+
+# Modelli di volo: "point" questo modulo, "rigid" il corpo rigido di rigid_body.py
+MODELS = ("point", "rigid")
+
+# Valutazioni della forza per passo accettato
+EVALUATIONS_PER_STEP = {"euler": 1, "rk4": 4, "rk45": 6}
+
+# Tableau di Dormand-Prince 5(4)
+_DP_C = (0.0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1.0, 1.0)
+_DP_A = (
+    (),
+    (1 / 5,),
+    (3 / 40, 9 / 40),
+    (44 / 45, -56 / 15, 32 / 9),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+    (35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+)
+_DP_E = (71 / 57600, 0.0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+
+def drag_factor(Cd, A, rho=rho):
+    """
+    Converte coefficiente di drag e sezione nel fattore k usato dal motore:
+    0.5 * Cd * rho * A * v^2 = k * v^2 (il modello di prompt1_gpto1.py).
+    """
+    return 0.5 * Cd * rho * A
+
+
+def effective_speed(initial_speed, bow_inclination, efficiency=1.0, inclination_exponent=1.0):
+    """
+    Velocità di uscita effettiva: massima a 0° di inclinazione dell'arco,
+    ridotta di cos(inclinazione) come negli script GUI e moltiplicata per
+    l'efficienza di lancio (k_arco * k_elastic in prompt1_gpto1.py). Con
+    inclination_exponent diverso da 1 la perdita diventa
+    cos(inclinazione)^inclination_exponent (valore stimato da calibration.py).
+    """
+    return (np.asarray(initial_speed, dtype=float)
+            * np.cos(np.radians(bow_inclination)) ** inclination_exponent * efficiency)
+
+
+def derivatives(state, c, wind=0.0, environment=None):
+    """
+    Derivata dello stato (x, y, vx, vy), array di forma (4, n), con
+    c = k/m per ogni freccia. Il drag agisce sulla velocità relativa all'aria,
+    con vento orizzontale wind (m/s, positivo a favore del tiro). Con
+    environment (environment.Environment) c e wind seguono i campi di densità
+    e vento nella posizione di ogni freccia.
+    """
+    if environment is not None:
+        c, wind = environment.apply(state[0], state[1], c, wind)
+    vx, vy = state[2], state[3]
+    ux = vx - wind
+    cv = c * np.sqrt(ux * ux + vy * vy)
+    return np.array((vx, vy, -cv * ux, -g - cv * vy))
+
+
+class BatchResult:
+    """
+    Risultati di una simulazione batch, un elemento per tiro.
+
+    - range: distanza orizzontale al punto d'impatto (m)
+    - apex: quota massima raggiunta (m)
+    - flight_time: tempo di volo fino all'impatto (s)
+    - landed: True se la freccia ha toccato il suolo entro t_max
+    - steps: numero di passi di integrazione accettati
+    - evaluations: numero di valutazioni della forza (passi rifiutati inclusi)
+    - paths: (x, y) di forma (n_campioni, n_tiri), NaN dopo l'impatto;
+      None se i percorsi non sono stati richiesti
+    - times: istanti dei campioni, stessa forma di paths
+    - height_at_target: quota al passaggio per target_distance, NaN se la
+      freccia è caduta prima (None se target_distance non è stato richiesto)
+    - velocities: (vx, vy) negli stessi campioni di paths
+    - impact_height: quota del punto d'impatto (m; per le frecce non
+      atterrate quella dell'ultimo stato)
+    """
+
+    def __init__(self, range_, apex, flight_time, landed, steps, evaluations=None,
+                 paths=None, times=None, height_at_target=None, velocities=None,
+                 impact_height=None):
+        self.range = range_
+        self.apex = apex
+        self.flight_time = flight_time
+        self.landed = landed
+        self.steps = steps
+        self.evaluations = evaluations
+        self.paths = paths
+        self.times = times
+        self.height_at_target = height_at_target
+        self.velocities = velocities
+        self.impact_height = impact_height
+
+    def __len__(self):
+        return len(self.range)
+
+
+class _PathRecorder:
+    """
+    Campioni dei percorsi delle sole frecce in volo: per ogni campione gli
+    indici dei tiri, la riga (passi accettati del tiro / sample_every), lo
+    stato e l'istante. La memoria cresce con i campioni effettivi e non con
+    n_tiri per il volo più lungo; gli array completi, con NaN dopo l'ultimo
+    campione di ogni tiro, si costruiscono una volta sola alla fine.
+    """
+
+    def __init__(self, n, sample_every):
+        self.n = n
+        self.sample_every = sample_every
+        self.chunks = []
+
+    def add(self, shots, steps, state, t):
+        self.chunks.append((shots, steps // self.sample_every, state, t))
+
+    def arrays(self, shape):
+        """Stati (n_campioni, righe dello stato) + shape e istanti (n_campioni,) + shape."""
+        length = max(chunk[1].max(initial=0) for chunk in self.chunks) + 1
+        size = len(self.chunks[0][2])
+        recorded = np.full((length, size, self.n), np.nan)
+        times = np.full((length, self.n), np.nan)
+        # Un campione alla volta, liberando i blocchi già copiati
+        self.chunks.reverse()
+        while self.chunks:
+            shots, rows, state, t = self.chunks.pop()
+            recorded[rows, :, shots] = state.T
+            times[rows, shots] = t
+        return recorded.reshape((length, size) + shape), times.reshape((length,) + shape)
+
+
+def _hermite(p0, d0, p1, d1, h, s):
+    """Interpolante cubico di Hermite sul passo [0, h] valutato in s in [0, 1]."""
+    s2 = s * s
+    s3 = s2 * s
+    return ((2 * s3 - 3 * s2 + 1) * p0 + (s3 - 2 * s2 + s) * h * d0
+            + (-2 * s3 + 3 * s2) * p1 + (s3 - s2) * h * d1)
+
+
+def _crossing(s0, s1, h, level, axis=1, iterations=40):
+    """
+    Frazione s del passo in cui la coordinata axis (0 = x, 1 = y) vale level.
+    Per y si cerca la discesa sotto level, per x il superamento di level.
+    Bisezione vettoriale sull'interpolante di Hermite (posizione e velocità).
+    """
+    sign = 1.0 if axis == 1 else -1.0
+    lo = np.zeros_like(h)
+    hi = np.ones_like(h)
+    for _ in range(iterations):
+        mid = 0.5 * (lo + hi)
+        before = sign * (_hermite(s0[axis], s0[axis + 2], s1[axis], s1[axis + 2],
+                                  h, mid) - level) >= 0
+        lo = np.where(before, mid, lo)
+        hi = np.where(before, hi, mid)
+    return 0.5 * (lo + hi)
+
+
+def _terrain_crossing(s0, s1, h, level, terrain, iterations=40):
+    """
+    Frazione s del passo in cui la freccia entra nel terreno (spostato di
+    level), per passi che finiscono sotto il terreno: bisezione come in
+    _crossing, sulla quota dell'interpolante di Hermite meno quella del terreno.
+    """
+    lo = np.zeros_like(h)
+    hi = np.ones_like(h)
+    for _ in range(iterations):
+        mid = 0.5 * (lo + hi)
+        x = _hermite(s0[0], s0[2], s1[0], s1[2], h, mid)
+        y = _hermite(s0[1], s0[3], s1[1], s1[3], h, mid)
+        before = y - level - terrain.height(x) >= 0
+        lo = np.where(before, mid, lo)
+        hi = np.where(before, hi, mid)
+    return 0.5 * (lo + hi)
+
+
+def _euler_step(state, c, h, wind=0.0, environment=None):
+    """Eulero semi-implicito: prima le velocità, poi le posizioni."""
+    if environment is not None:
+        c, wind = environment.apply(state[0], state[1], c, wind)
+    vx, vy = state[2], state[3]
+    ux = vx - wind
+    cv = c * np.sqrt(ux * ux + vy * vy)
+    vx = vx - cv * ux * h
+    vy = vy - (g + cv * vy) * h
+    return np.array((state[0] + vx * h, state[1] + vy * h, vx, vy))
+
+
+def _rk4_step(state, c, h, wind=0.0, environment=None):
+    k1 = derivatives(state, c, wind, environment)
+    k2 = derivatives(state + 0.5 * h * k1, c, wind, environment)
+    k3 = derivatives(state + 0.5 * h * k2, c, wind, environment)
+    k4 = derivatives(state + h * k3, c, wind, environment)
+    return state + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+def _dopri_step(state, c, h, k1, wind=0.0, environment=None):
+    """
+    Passo di Dormand-Prince. Restituisce (nuovo stato, stima dell'errore,
+    derivata nel nuovo stato), quest'ultima riusabile come k1 (FSAL).
+    """
+    ks = [k1]
+    for a in _DP_A[1:]:
+        inc = sum(a_j * k_j for a_j, k_j in zip(a, ks) if a_j)
+        ks.append(derivatives(state + h * inc, c, wind, environment))
+    new = state + h * sum(b * k_j for b, k_j in zip(_DP_A[6], ks[:6]) if b)
+    # La settima valutazione è nel nuovo stato (FSAL)
+    err = h * sum(e * k_j for e, k_j in zip(_DP_E, ks) if e)
+    return new, err, ks[6]
+
+
+def simulate_batch(launch_angle, initial_speed, bow_inclination=0.0, mass=m,
+                   drag_coefficient=k, dt=dt, t_max=t_max, record_paths=False,
+                   sample_every=1, method="euler", rtol=rtol, atol=atol,
+                   ground_height=0.0, target_distance=None, launch_efficiency=1.0,
+                   wind=0.0, inclination_exponent=1.0, environment=None):
+    """
+    Integra un batch di frecce con il modello con attrito.
+
+    Gli argomenti sono array (o scalari) con broadcasting NumPy: angolo di lancio
+    e inclinazione in gradi, velocità iniziale in m/s, massa in kg, fattore di
+    drag k in kg/m, efficienza di lancio (0-1, perdite di arco e freccia) e
+    vento orizzontale in m/s (positivo a favore del tiro). Ad ogni passo vengono aggiornate solo le frecce ancora in
+    volo; quelle arrivate al suolo vengono escluse dal vettore di stato attivo.
+    inclination_exponent (anche array) è l'esponente della perdita
+    cos(inclinazione) della velocità (vedi effective_speed).
+
+    method sceglie l'integratore ("euler", "rk4", "rk45"). Per i metodi a passo
+    fisso dt è il passo; per "rk45" è solo il passo iniziale, poi adattato per
+    ogni freccia secondo rtol/atol. Con "euler" l'impatto è interpolato
+    linearmente come nelle GUI, negli altri casi risolvendo l'interpolante
+    cubico dell'ultimo passo.
+
+    ground_height è la quota (m, anche array) del piano d'impatto rispetto al
+    punto di lancio: un bersaglio rialzato o un terreno più basso. L'impatto
+    avviene quando la freccia lo attraversa scendendo; le frecce che ricadono
+    sotto min(ground_height, 0) senza averlo raggiunto si fermano con
+    landed = False.
+
+    environment (environment.Environment) aggiunge densità dell'aria e vento
+    variabili con la posizione e il terreno: con environment.terrain l'impatto
+    avviene quando la freccia entra nel profilo del terreno (spostato di
+    ground_height), trovato con lo stesso interpolante dell'impatto sul piano
+    (lineare sul passo se entra da una parete o da una cresta), e la quota
+    d'impatto è in impact_height.
+
+    Se target_distance è indicato (m, anche array), ogni freccia si ferma quando
+    lo raggiunge in orizzontale e in height_at_target viene riportata la sua
+    quota in quel punto.
+
+    Se record_paths è True, restituisce anche i percorsi campionati ogni
+    sample_every passi accettati.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Metodo di integrazione sconosciuto: {method!r} "
+                         f"(disponibili: {', '.join(METHODS)})")
+
+    (angle, speed, inclination, mass, drag, level, stop_x, efficiency,
+     wind, exponent) = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in
+          (launch_angle, initial_speed, bow_inclination, mass, drag_coefficient,
+           ground_height, np.inf if target_distance is None else target_distance,
+           launch_efficiency, wind, inclination_exponent)))
+    shape = angle.shape
+    angle, speed, inclination, mass, drag, level, stop_x, efficiency, wind, exponent = (
+        a.ravel() for a in (angle, speed, inclination, mass, drag, level, stop_x, efficiency,
+                            wind, exponent))
+    n = angle.size
+
+    theta = np.radians(angle)
+    v_eff = effective_speed(speed, inclination, efficiency, exponent)
+
+    # Stato (x, y, vx, vy) delle frecce ancora in volo
+    state = np.zeros((4, n))
+    state[2] = v_eff * np.cos(theta)
+    state[3] = v_eff * np.sin(theta)
+    c = drag / mass
+    t = np.zeros(n)
+    h = np.full(n, float(dt))
+    active = np.arange(n)
+
+    # Risultati per tiro
+    range_ = np.zeros(n)
+    apex = np.zeros(n)
+    flight_time = np.zeros(n)
+    landed = np.zeros(n, dtype=bool)
+    steps = np.zeros(n, dtype=np.int64)
+    evaluations = np.zeros(n, dtype=np.int64)
+    height_at_target = np.full(n, np.nan)
+    impact_height = np.zeros(n)
+    terrain = None if environment is None else environment.terrain
+
+    # Tiri con parametri non validi (NaN): nessuna integrazione
+    invalid = ~(np.isfinite(state).all(axis=0) & np.isfinite(c) & np.isfinite(wind))
+    if invalid.any():
+        range_[invalid] = apex[invalid] = flight_time[invalid] = impact_height[invalid] = np.nan
+        active = active[~invalid]
+        state, c, t, h, level, stop_x, wind = (
+            state[:, ~invalid], c[~invalid], t[~invalid], h[~invalid], level[~invalid],
+            stop_x[~invalid], wind[~invalid])
+
+    k1 = None
+    if method == "rk45":
+        k1 = derivatives(state, c, wind, environment)
+        evaluations += 1
+
+    recorder = _PathRecorder(n, sample_every) if record_paths else None
+    if recorder is not None:
+        recorder.add(active, steps[active], state.copy(), t.copy())
+
+    while active.size:
+        # Un passo per tutte le frecce attive
+        if method == "rk45":
+            new, err, k_new = _dopri_step(state, c, h, k1, wind, environment)
+            evaluations[active] += 6
+            scale = atol + rtol * np.maximum(np.abs(state), np.abs(new))
+            err_norm = np.sqrt(np.mean((err / scale) ** 2, axis=0))
+            accepted = err_norm <= 1.0
+            # Controllo del passo: h * 0.9 * err^(-1/5), limitato in [0.2, 5]
+            factor = 0.9 * np.power(np.maximum(err_norm, 1e-10), -0.2)
+            h_next = h * np.clip(factor, 0.2, 5.0)
+        else:
+            if method == "euler":
+                new = _euler_step(state, c, h, wind, environment)
+            else:
+                new = _rk4_step(state, c, h, wind, environment)
+            evaluations[active] += EVALUATIONS_PER_STEP[method]
+            accepted = np.ones(active.size, dtype=bool)
+            h_next = h
+
+        h_step = h
+        t_new = t + h_step
+        steps[active] += accepted
+
+        y0, y1 = state[1], new[1]
+        if terrain is None:
+            hit = accepted & (y0 >= level) & (y1 < level)
+        else:
+            hit, frac_terrain = terrain.intersect(state[0], y0 - level, new[0], y1 - level)
+            hit &= accepted
+
+        # Quota massima: nel passo in cui vy cambia segno si valuta l'interpolante
+        top = np.maximum(y0, y1)
+        if method != "euler":
+            turning = accepted & (state[3] > 0) & (new[3] <= 0)
+            if turning.any():
+                s = state[3][turning] / (state[3][turning] - new[3][turning])
+                y_top = _hermite(y0[turning], state[3][turning], y1[turning],
+                                 new[3][turning], h_step[turning], s)
+                top[turning] = np.maximum(top[turning], y_top)
+        top = np.where(accepted, top, 0.0)
+        apex[active] = np.maximum(apex[active], top)
+
+        if hit.any():
+            idx = active[hit]
+            s0, s1, hh = state[:, hit], new[:, hit], h_step[hit]
+            if terrain is not None:
+                # Ingresso nel terreno, lineare sul passo; con gli integratori di ordine alto
+                # sull'interpolante, se il passo finisce sotto il terreno
+                frac = frac_terrain[hit]
+                range_[idx] = s0[0] + frac * (s1[0] - s0[0])
+                impact_height[idx] = s0[1] + frac * (s1[1] - s0[1])
+                if method != "euler":
+                    below = s1[1] - level[hit] < terrain.height(s1[0])
+                    if below.any():
+                        b0, b1, hb = s0[:, below], s1[:, below], hh[below]
+                        frac[below] = _terrain_crossing(b0, b1, hb, level[hit][below], terrain)
+                        range_[idx[below]] = _hermite(b0[0], b0[2], b1[0], b1[2], hb,
+                                                      frac[below])
+                        impact_height[idx[below]] = _hermite(b0[1], b0[3], b1[1], b1[3], hb,
+                                                             frac[below])
+            elif method == "euler":
+                # Interpolazione lineare come nelle GUI
+                frac = (s0[1] - level[hit]) / (s0[1] - s1[1])
+                range_[idx] = s0[0] + frac * (s1[0] - s0[0])
+                impact_height[idx] = level[hit]
+            else:
+                frac = _crossing(s0, s1, hh, level[hit])
+                range_[idx] = _hermite(s0[0], s0[2], s1[0], s1[2], hh, frac)
+                impact_height[idx] = level[hit]
+            flight_time[idx] = t[hit] + frac * hh
+            landed[idx] = True
+
+        # Passaggio per la distanza del bersaglio, se prima dell'impatto
+        reached = accepted & (state[0] < stop_x) & (new[0] >= stop_x)
+        if reached.any():
+            s0, s1, hh = state[:, reached], new[:, reached], h_step[reached]
+            level_x = stop_x[reached]
+            if method == "euler":
+                frac_x = (level_x - s0[0]) / (s1[0] - s0[0])
+                y_x = s0[1] + frac_x * (s1[1] - s0[1])
+            else:
+                frac_x = _crossing(s0, s1, hh, level_x, axis=0)
+                y_x = _hermite(s0[1], s0[3], s1[1], s1[3], hh, frac_x)
+            floor_x = level[reached]
+            if terrain is not None:
+                floor_x = floor_x + terrain.height(level_x)
+            valid = y_x >= floor_x
+            idx = active[reached][valid]
+            height_at_target[idx] = impact_height[idx] = y_x[valid]
+            range_[idx] = level_x[valid]
+            flight_time[idx] = (t[reached] + frac_x * hh)[valid]
+            landed[idx] = False
+            reached[reached] = valid
+
+        # Avanza lo stato delle frecce accettate
+        state = np.where(accepted, new, state)
+        t = np.where(accepted, t_new, t)
+        h = h_next
+        if k1 is not None:
+            k1 = np.where(accepted, k_new, k1)
+
+        if recorder is not None:
+            # Solo le frecce ancora in volo al termine di un passo accettato multiplo
+            # di sample_every (contando i passi accettati di ogni tiro)
+            keep = accepted & ~hit & ~reached & (steps[active] % sample_every == 0)
+            if keep.any():
+                recorder.add(active[keep], steps[active[keep]], state[:, keep], t[keep])
+
+        # Frecce ancora in volo allo scadere di t_max, o ricadute sotto il piano
+        # d'impatto senza averlo mai raggiunto
+        if environment is None:
+            floor = np.minimum(level, 0.0)
+        else:
+            floor = environment.surface(level)
+        expired = ~hit & ~reached & ((t >= t_max) | (state[1] < floor))
+        if expired.any():
+            idx = active[expired]
+            range_[idx] = state[0][expired]
+            impact_height[idx] = state[1][expired]
+            flight_time[idx] = t[expired]
+
+        done = hit | expired | reached
+        if done.any():
+            keep = ~done
+            active, state, c, t, h, level, stop_x, wind = (
+                active[keep], state[:, keep], c[keep], t[keep], h[keep], level[keep],
+                stop_x[keep], wind[keep])
+            if k1 is not None:
+                k1 = k1[:, keep]
+
+    paths = times = velocities = None
+    if recorder is not None:
+        recorded, times = recorder.arrays(shape)
+        paths = (recorded[:, 0], recorded[:, 1])
+        velocities = (recorded[:, 2], recorded[:, 3])
+
+    return BatchResult(range_.reshape(shape), apex.reshape(shape),
+                       flight_time.reshape(shape), landed.reshape(shape),
+                       steps.reshape(shape), evaluations.reshape(shape),
+                       paths, times,
+                       None if target_distance is None else height_at_target.reshape(shape),
+                       velocities, impact_height.reshape(shape))
+
+
+def simulate(launch_angle, initial_speed, bow_inclination=0.0, model="point", **kwargs):
+    """
+    Simula un singolo tiro con il modello di volo model e restituisce la
+    traiettoria come array (x, y), terminata nel punto d'impatto.
+    """
+    result = engine(model).simulate_batch([launch_angle], [initial_speed], [bow_inclination],
+                                          record_paths=True, **kwargs)
+    xs, ys = result.paths[0][:, 0], result.paths[1][:, 0]
+    airborne = ~np.isnan(xs)
+    xs = np.append(xs[airborne], result.range[0])
+    ys = np.append(ys[airborne], result.impact_height[0])
+    return xs, ys
+
+
+def engine(model="point"):
+    """Modulo con il simulate_batch del modello di volo model (vedi MODELS)."""
+    if model == "point":
+        return sys.modules[__name__]
+    if model == "rigid":
+        import rigid_body
+
+        return rigid_body
+    raise ValueError(f"Modello di volo sconosciuto: {model!r} "
+                     f"(disponibili: {', '.join(MODELS)})")
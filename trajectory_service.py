@@ -0,0 +1,543 @@
+"""
+Servizio HTTP/JSON locale per gittate e angoli di tiro, con il modello con attrito.
+
+Altri strumenti (tabelle di tiro, cruscotti di allenamento) chiedono al
+servizio gittate e angoli invece di aprire la GUI. Solo libreria standard
+(asyncio) e NumPy:
+- le richieste che arrivano insieme vengono raccolte per batch_window_ms
+  millisecondi (o fino a max_batch tiri) e risolte con una sola simulazione
+  batch, in un thread separato, così il ciclo di eventi continua ad accettare
+  richieste; richieste identiche nello stesso batch condividono il risultato.
+  Le mire, molto più costose, hanno un thread proprio e batch di al più
+  max_aim_batch bersagli, così non fermano le richieste di gittata;
+- i risultati restano in una cache LRU con chiave quantizzata (angolo,
+  velocità, inclinazione, costanti fisiche, integratore): i valori vengono
+  arrotondati ai quanti prima di simulare, quindi ogni chiave ha un solo
+  risultato. Successi, mancati e scarti sono esposti su /metrics.
+
+Richieste (GET con parametri nella query, oppure POST con un oggetto JSON,
+una lista di oggetti o {"shots": [...]}):
+- /range: angle, speed, inclination, mass, k, efficiency, wind, method, dt
+  -> range, apex, flight_time, landed;
+- /aim: distance, height, speed, inclination, mass, k, efficiency, wind,
+  method, dt -> low, high (gradi, null se irraggiungibile), max_range_angle,
+  max_range;
+- /metrics, /health.
+
+ServiceClient è un client sincrono per gli altri strumenti e per le prove;
+il comando bench misura la portata con molte connessioni concorrenti.
+
+Esempio:
+    python trajectory_service.py serve --port 8765
+    curl "http://127.0.0.1:8765/range?angle=45&speed=50"
+    python trajectory_service.py bench --requests 20000 --concurrency 64
+"""
+import argparse
+import asyncio
+import collections
+import http.client
+import json
+import math
+import random
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+
+import aiming
+import trajectory_engine
+
+host = "127.0.0.1"
+port = 8765
+batch_window_ms = 2.0     # attesa massima per raccogliere un batch (ms)
+max_batch = 8192          # tiri oltre i quali il batch parte subito
+max_aim_batch = 256       # bersagli per batch di mira (ognuno costa una scansione)
+max_speed = 150.0         # velocità di lancio massima accettata (m/s)
+dt_range = (1e-4, 0.1)    # passo temporale accettato (s): più fine terrebbe occupato il calcolo
+cache_size = 200_000      # risultati nella cache LRU
+max_body = 1 << 20        # dimensione massima del corpo di una richiesta (byte)
+
+angle_quantum = 0.01      # gradi
+speed_quantum = 0.01      # m/s
+distance_quantum = 0.01   # m (distanza e quota del bersaglio)
+constant_digits = 6       # cifre significative delle costanti fisiche nella chiave
+
+# Parametri di ogni tipo di richiesta, con i valori predefiniti
+RANGE_PARAMETERS = {"angle": 45.0, "speed": 50.0, "inclination": 0.0}
+AIM_PARAMETERS = {"distance": None, "height": 0.0, "speed": 50.0, "inclination": 0.0}
+CONSTANTS = {"mass": trajectory_engine.m, "k": trajectory_engine.k, "efficiency": 1.0,
+             "wind": 0.0, "dt": trajectory_engine.dt}
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _quantize(value, quantum):
+    return round(value / quantum) * quantum
+
+
+def _significant(value):
+    return float(f"{value:.{constant_digits}g}")
+
+
+def _number(value):
+    """Valore JSON: i NaN (bersaglio irraggiungibile) diventano null."""
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def parse_shot(raw, fields):
+    """
+    Parametri di un tiro da un dizionario (query o JSON), con i valori
+    predefiniti di fields e CONSTANTS, quantizzati come nella chiave della
+    cache. Solleva ValueError per parametri mancanti o non validi.
+    """
+    unknown = set(raw) - set(fields) - set(CONSTANTS) - {"method"}
+    if unknown:
+        raise ValueError(f"Parametri sconosciuti: {', '.join(sorted(unknown))}")
+    shot = {}
+    for name, default in {**fields, **CONSTANTS}.items():
+        value = raw.get(name, default)
+        if value is None:
+            raise ValueError(f"Parametro mancante: {name}")
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} non è un numero: {value!r}") from None
+        if not math.isfinite(value):
+            raise ValueError(f"{name} non è finito")
+        shot[name] = value
+    for name in ("speed", "mass", "dt"):
+        if shot[name] <= 0:
+            raise ValueError(f"{name} deve essere positivo")
+    if shot["speed"] > max_speed:
+        raise ValueError(f"speed oltre il limite di {max_speed:g} m/s")
+    if shot["k"] < 0:
+        raise ValueError("k non può essere negativo")
+    if not 0 < shot["efficiency"] <= 1:
+        raise ValueError("efficiency deve essere in (0, 1]")
+    if not dt_range[0] <= shot["dt"] <= dt_range[1]:
+        raise ValueError(f"dt deve essere in [{dt_range[0]:g}, {dt_range[1]:g}] s")
+    for name in ("angle", "inclination"):
+        if name in shot and not -90 <= shot[name] <= 90:
+            raise ValueError(f"{name} deve essere in [-90, 90] gradi")
+
+    shot["method"] = raw.get("method", "euler")
+    if shot["method"] not in trajectory_engine.METHODS:
+        raise ValueError(f"Metodo di integrazione sconosciuto: {shot['method']!r} "
+                         f"(disponibili: {', '.join(trajectory_engine.METHODS)})")
+
+    for name in ("angle", "inclination"):
+        if name in shot:
+            shot[name] = _quantize(shot[name], angle_quantum)
+    shot["speed"] = _quantize(shot["speed"], speed_quantum)
+    for name in ("distance", "height"):
+        if name in shot:
+            shot[name] = _quantize(shot[name], distance_quantum)
+    for name in CONSTANTS:
+        shot[name] = _significant(shot[name])
+    return shot
+
+
+class LRUCache:
+    """Cache LRU con contatori di successi, mancati e scarti."""
+
+    def __init__(self, size=cache_size):
+        self.size = size
+        self.items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self.items), "capacity": self.size, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None}
+
+
+class BatchQueue:
+    """
+    Raccoglie le richieste per gruppo (parametri che il motore vuole scalari,
+    come integratore e passo) e le passa insieme a compute(group, shots), che
+    gira in executor e restituisce un risultato per tiro. Il batch parte
+    window secondi dopo la prima richiesta, o subito oltre max_batch tiri;
+    se il batch precedente è ancora in calcolo, le richieste continuano ad
+    accumularsi e partono quando termina (sotto carico i batch si allungano
+    da soli invece di mettersi in coda nell'executor).
+    """
+
+    def __init__(self, compute, executor, window=batch_window_ms / 1e3, max_batch=max_batch):
+        self.compute = compute
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = {}      # gruppo -> {chiave: (tiro, future)}
+        self.count = 0
+        self.timer = None
+        self.running = 0       # batch in calcolo
+        self.batches = 0
+        self.shots = 0
+        self.largest = 0
+        self.coalesced = 0
+        self.compute_time = 0.0
+
+    def submit(self, group, key, shot):
+        loop = asyncio.get_running_loop()
+        items = self.pending.setdefault(group, {})
+        entry = items.get(key)
+        if entry is not None:
+            # Stesso tiro già in attesa nel batch: un solo calcolo
+            self.coalesced += 1
+            return entry[1]
+        future = loop.create_future()
+        items[key] = (shot, future)
+        self.count += 1
+        if self.count >= self.max_batch:
+            self.flush(force=True)
+        elif self.timer is None and not self.running:
+            self.timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self, force=False):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.running and not force:
+            return      # partirà alla fine del batch in corso
+        pending, self.pending, self.count = self.pending, {}, 0
+        for group, items in pending.items():
+            self.running += 1
+            asyncio.ensure_future(self._run(group, items))
+
+    async def _run(self, group, items):
+        entries = list(items.values())
+        start = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.compute, group, [shot for shot, _ in entries])
+        except Exception as e:
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.running -= 1
+            if self.pending and not self.running:
+                self.flush()
+        self.compute_time += time.perf_counter() - start
+        self.batches += 1
+        self.shots += len(entries)
+        self.largest = max(self.largest, len(entries))
+        for (_, future), result in zip(entries, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {"batches": self.batches, "shots": self.shots, "largest_batch": self.largest,
+                "mean_batch": self.shots / self.batches if self.batches else None,
+                "coalesced": self.coalesced, "compute_s": self.compute_time}
+
+
+def compute_ranges(group, shots):
+    method, dt = group
+    columns = {name: np.array([shot[name] for shot in shots])
+               for name in ("angle", "speed", "inclination", "mass", "k", "efficiency", "wind")}
+    result = trajectory_engine.simulate_batch(
+        columns["angle"], columns["speed"], columns["inclination"], mass=columns["mass"],
+        drag_coefficient=columns["k"], launch_efficiency=columns["efficiency"],
+        wind=columns["wind"], method=method, dt=dt)
+    return [{"range": _number(r), "apex": _number(h), "flight_time": _number(t),
+             "landed": bool(landed)}
+            for r, h, t, landed in zip(result.range, result.apex, result.flight_time,
+                                       result.landed)]
+
+
+def compute_aims(group, shots):
+    method, dt, efficiency, wind = group
+    columns = {name: np.array([shot[name] for shot in shots])
+               for name in ("distance", "height", "speed", "inclination", "mass", "k")}
+    solution = aiming.solve_launch_angle(
+        columns["distance"], columns["speed"], columns["inclination"], columns["height"],
+        columns["mass"], columns["k"], method=method, dt=dt, launch_efficiency=efficiency,
+        wind=wind)
+    return [{"low": _number(low), "high": _number(high), "max_range_angle": _number(angle),
+             "max_range": _number(max_range)}
+            for low, high, angle, max_range in zip(solution.low, solution.high,
+                                                   solution.max_range_angle,
+                                                   solution.max_range)]
+
+
+class TrajectoryService:
+    """Richieste di gittata e di mira, con batch e cache condivisa."""
+
+    def __init__(self, cache_size=cache_size, window_ms=batch_window_ms, max_batch=max_batch):
+        self.cache = LRUCache(cache_size)
+        # Un thread di calcolo per tipo di richiesta: i batch dello stesso tipo si
+        # alternano, le mire lente non bloccano le gittate e il ciclo di eventi resta libero
+        self.executors = {kind: ThreadPoolExecutor(max_workers=1) for kind in ("range", "aim")}
+        self.queues = {"range": BatchQueue(compute_ranges, self.executors["range"],
+                                           window_ms / 1e3, max_batch),
+                       "aim": BatchQueue(compute_aims, self.executors["aim"], window_ms / 1e3,
+                                         min(max_batch, max_aim_batch))}
+        self.requests = collections.Counter()
+        self.errors = 0
+        self.started = time.time()
+
+    async def query(self, kind, raw):
+        """Risultato di un tiro (dizionario JSON) per il tipo di richiesta kind."""
+        fields = RANGE_PARAMETERS if kind == "range" else AIM_PARAMETERS
+        shot = parse_shot(raw, fields)
+        key = (kind, *(shot[name] for name in (*fields, *CONSTANTS, "method")))
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        if kind == "range":
+            group = (shot["method"], shot["dt"])
+        else:
+            group = (shot["method"], shot["dt"], shot["efficiency"], shot["wind"])
+        result = await self.queues[kind].submit(group, key, shot)
+        self.cache.put(key, result)
+        return result
+
+    def metrics(self):
+        return {"uptime_s": time.time() - self.started, "requests": dict(self.requests),
+                "errors": self.errors, "cache": self.cache.stats(),
+                "batches": {kind: queue.stats() for kind, queue in self.queues.items()}}
+
+    async def dispatch(self, method, target, body):
+        """Risponde a una richiesta HTTP: (stato, oggetto JSON)."""
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        self.requests[path] += 1
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.metrics()
+        kind = path.lstrip("/")
+        if kind not in self.queues:
+            return 404, {"error": f"Percorso sconosciuto: {path}"}
+        try:
+            if method == "GET":
+                return 200, await self.query(kind, dict(parse_qsl(url.query)))
+            if method != "POST":
+                return 405, {"error": "Usare GET o POST"}
+            payload = json.loads(body or b"{}")
+            if isinstance(payload, dict) and "shots" in payload:
+                payload = payload["shots"]
+            if isinstance(payload, dict):
+                return 200, await self.query(kind, payload)
+            if not isinstance(payload, list) or not all(isinstance(p, dict) for p in payload):
+                raise ValueError("Il corpo deve essere un oggetto, una lista di oggetti "
+                                 "o {\"shots\": [...]}")
+            results = await asyncio.gather(*(self.query(kind, p) for p in payload))
+            return 200, {"results": list(results)}
+        except ValueError as e:     # anche json.JSONDecodeError
+            self.errors += 1
+            return 400, {"error": str(e)}
+        except Exception as e:
+            # Errore inatteso del servizio: risposta JSON e traccia sullo stderr del server,
+            # invece di chiudere la connessione senza risposta
+            self.errors += 1
+            traceback.print_exc()
+            return 500, {"error": f"Errore interno: {type(e).__name__}"}
+
+    async def handle(self, reader, writer):
+        """Una connessione: richieste HTTP/1.1 una dopo l'altra (keep-alive)."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                keep_alive = (version == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+                if length > max_body:
+                    status, payload, keep_alive = 413, {"error": "Richiesta troppo grande"}, False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, target, body)
+                data = json.dumps(payload).encode()
+                head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                        f"Content-Type: application/json\r\n"
+                        f"Content-Length: {len(data)}\r\n")
+                if not keep_alive:
+                    head += "Connection: close\r\n"
+                writer.write(head.encode("latin-1") + b"\r\n" + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass    # client disconnesso o richiesta malformata: si chiude la connessione
+        finally:
+            writer.close()
+
+    async def start(self, host=host, port=port):
+        """Avvia il server; restituisce l'oggetto asyncio.Server."""
+        return await asyncio.start_server(self.handle, host, port)
+
+
+class ServiceClient:
+    """
+    Client sincrono del servizio (http.client, connessione persistente), per
+    altri strumenti e per le prove.
+    """
+
+    def __init__(self, host=host, port=port, timeout=30.0):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload)
+        headers = {} if body is None else {"Content-Type": "application/json"}
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise ValueError(f"{response.status}: {data.get('error')}")
+        return data
+
+    def range(self, angle, speed, **params):
+        return self.request("GET", "/range?" + urlencode(dict(angle=angle, speed=speed, **params)))
+
+    def ranges(self, shots):
+        """Gittate di molti tiri (lista di dizionari di parametri) in una richiesta."""
+        return self.request("POST", "/range", {"shots": shots})["results"]
+
+    def aim(self, distance, speed, **params):
+        return self.request("GET", "/aim?" + urlencode(dict(distance=distance, speed=speed,
+                                                            **params)))
+
+    def metrics(self):
+        return self.request("GET", "/metrics")
+
+
+async def bench(host=host, port=port, requests=20_000, concurrency=64, distinct=5_000,
+                seed=0):
+    """
+    Carico di prova: concurrency connessioni keep-alive che inviano in tutto
+    requests richieste GET /range, scelte tra distinct tiri diversi (meno tiri
+    distinti, più successi della cache). Restituisce richieste al secondo e
+    percentili della latenza (ms).
+    """
+    rng = random.Random(seed)
+    targets = [f"/range?angle={rng.uniform(1, 89):.2f}&speed={rng.uniform(10, 100):.2f}"
+               for _ in range(distinct)]
+    latencies = []
+
+    async def worker(n):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for _ in range(n):
+                request = f"GET {rng.choice(targets)} HTTP/1.1\r\nHost: {host}\r\n\r\n"
+                start = time.perf_counter()
+                writer.write(request.encode())
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    per_worker = [requests // concurrency + (i < requests % concurrency)
+                  for i in range(concurrency)]
+    await asyncio.gather(*(worker(n) for n in per_worker if n))
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1e3, (50, 95, 99))
+    return {"requests": len(latencies), "seconds": elapsed,
+            "requests_per_s": len(latencies) / elapsed,
+            "latency_ms": {"p50": p50, "p95": p95, "p99": p99}}
+
+
+async def _serve(args):
+    service = TrajectoryService(args.cache_size, args.window_ms, args.max_batch)
+    server = await service.start(args.host, args.port)
+    print(f"Servizio in ascolto su http://{args.host}:{args.port}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+async def _bench(args):
+    server = None
+    if args.local:
+        # Server nello stesso processo, su una porta libera
+        service = TrajectoryService(args.cache_size, args.window_ms, args.max_batch)
+        server = await service.start(args.host, 0)
+        args.port = server.sockets[0].getsockname()[1]
+    report = await bench(args.host, args.port, args.requests, args.concurrency, args.distinct)
+    if server is not None:
+        report["service"] = service.metrics()
+        server.close()
+        await server.wait_closed()
+    print(json.dumps(report, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Servizio HTTP/JSON locale per gittate e angoli di tiro.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="avvia il servizio")
+    bench_parser = commands.add_parser("bench", help="misura la portata del servizio")
+    for p in (serve_parser, bench_parser):
+        p.add_argument("--host", default=host)
+        p.add_argument("--port", type=int, default=port)
+        p.add_argument("--window-ms", type=float, default=batch_window_ms,
+                       help="attesa massima per raccogliere un batch")
+        p.add_argument("--max-batch", type=int, default=max_batch)
+        p.add_argument("--cache-size", type=int, default=cache_size)
+    bench_parser.add_argument("--requests", type=int, default=20_000)
+    bench_parser.add_argument("--concurrency", type=int, default=64)
+    bench_parser.add_argument("--distinct", type=int, default=5_000,
+                              help="tiri distinti tra cui scegliere le richieste")
+    bench_parser.add_argument("--local", action="store_true",
+                              help="avvia il servizio nello stesso processo")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args) if args.command == "serve" else _bench(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
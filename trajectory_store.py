@@ -0,0 +1,270 @@
+"""
+Archivio binario compatto dei tiri, letto tramite memory mapping.
+
+Un archivio è una cartella con tre file:
+- points.f32: i campioni dei tiri in float32, un blocco per tiro scritto per
+  colonne (tutti i t, poi tutte le x, le y, le vx e le vy): 20 byte per
+  campione invece degli oltre 100 di una lista di tuple Python;
+- index.bin: un record a lunghezza fissa per tiro (INDEX_DTYPE) con posizione
+  e lunghezza del blocco, parametri del tiro ed esito;
+- store.json: versione e descrizione del formato; un archivio di un'altra
+  versione viene rifiutato all'apertura invece di essere letto male.
+
+I tiri si aggiungono in coda, uno alla volta dal simulatore (append) o a
+blocchi da simulate_batch (append_batch). In lettura entrambi i file sono
+aperti con np.memmap: scorrere l'indice o rivedere un tiro legge dal disco
+solo le pagine necessarie, qualunque sia il numero di tiri archiviati.
+
+Il blocco di un tiro viene scritto prima del suo record d'indice: se la
+scrittura si interrompe, all'apertura in aggiunta l'archivio viene riportato
+all'ultimo tiro completo.
+"""
+import json
+import os
+
+import numpy as np
+
+import playback
+import trajectory_engine
+
+COLUMNS = ("t", "x", "y", "vx", "vy")
+
+# Parametri del tiro salvati nell'indice
+PARAMETERS = ("launch_angle", "initial_speed", "bow_inclination", "mass", "drag_coefficient",
+              "launch_efficiency", "inclination_exponent", "wind", "dt")
+
+INDEX_DTYPE = np.dtype(
+    [("offset", "<i8"),            # primo valore del blocco in points.f32
+     ("points", "<i4")]            # campioni del tiro, impatto compreso
+    + [(name, "<f8") for name in PARAMETERS]
+    + [("method", "u1"),           # indice in trajectory_engine.METHODS
+       ("model", "u1"),            # indice in trajectory_engine.MODELS
+       ("range", "<f8"),
+       ("apex", "<f8"),
+       ("flight_time", "<f8"),
+       ("landed", "?")])
+
+STORE_VERSION = 2   # 2: inclination_exponent e model nell'indice
+MANIFEST = "store.json"
+POINTS = "points.f32"
+INDEX = "index.bin"
+
+
+def _manifest():
+    return {"version": STORE_VERSION, "columns": list(COLUMNS), "dtype": "<f4",
+            "index": [[name, INDEX_DTYPE[name].str] for name in INDEX_DTYPE.names]}
+
+
+class StoredShot:
+    """
+    Un tiro dell'archivio: record dell'indice e colonne t, x, y, vx, vy
+    (viste float32 sul file, non copiate in memoria).
+    """
+
+    def __init__(self, record, block):
+        self.record = record
+        self.t, self.x, self.y, self.vx, self.vy = block
+
+    @property
+    def method(self):
+        return trajectory_engine.METHODS[self.record["method"]]
+
+    @property
+    def model(self):
+        return trajectory_engine.MODELS[self.record["model"]]
+
+    def buffer(self):
+        """StateBuffer completo, per rivedere il tiro con playback.Playback."""
+        buffer = playback.StateBuffer()
+        buffer.publish(self.t.tolist(), self.x.tolist(), self.y.tolist(),
+                       self.vx.tolist(), self.vy.tolist(), finished=True,
+                       landed=bool(self.record["landed"]))
+        return buffer
+
+
+class TrajectoryStore:
+    """
+    Archivio dei tiri nella cartella path. mode "r" apre in sola lettura,
+    "a" in aggiunta (la cartella viene creata se non esiste).
+    """
+
+    def __init__(self, path, mode="r"):
+        if mode not in ("r", "a"):
+            raise ValueError(f"Modalità sconosciuta: {mode!r} (disponibili: r, a)")
+        self.path = path
+        self.mode = mode
+        self.points_path = os.path.join(path, POINTS)
+        self.index_path = os.path.join(path, INDEX)
+        self._points = None
+        self._index = None
+
+        manifest = os.path.join(path, MANIFEST)
+        if mode == "a" and not os.path.exists(manifest):
+            os.makedirs(path, exist_ok=True)
+            open(self.points_path, "wb").close()
+            open(self.index_path, "wb").close()
+            with open(manifest, "w") as f:
+                json.dump(_manifest(), f, indent=2)
+        with open(manifest) as f:
+            found = json.load(f)
+        version = found.get("version") if isinstance(found, dict) else None
+        if version != STORE_VERSION:
+            raise ValueError(f"{path}: archivio di tiri in formato versione {version}, "
+                             f"questa versione legge solo la {STORE_VERSION}")
+        if found != _manifest():
+            raise ValueError(f"{path} non è un archivio di tiri in formato compatibile")
+        if mode == "a":
+            self._repair()
+
+    def _repair(self):
+        """Toglie i dati di un'aggiunta interrotta: record incompleti e blocchi senza record."""
+        n = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+        os.truncate(self.index_path, n * INDEX_DTYPE.itemsize)
+        end = 0
+        if n:
+            last = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=1,
+                               offset=(n - 1) * INDEX_DTYPE.itemsize)[0]
+            end = (int(last["offset"]) + len(COLUMNS) * int(last["points"])) * 4
+        os.truncate(self.points_path, end)
+
+    def __len__(self):
+        return os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._points = None
+        self._index = None
+
+    @property
+    def index(self):
+        """Indice come array strutturato in memory mapping (un record per tiro)."""
+        n = len(self)
+        if self._index is None or len(self._index) != n:
+            self._index = (np.memmap(self.index_path, dtype=INDEX_DTYPE, mode="r", shape=(n,))
+                           if n else np.zeros(0, dtype=INDEX_DTYPE))
+        return self._index
+
+    def _data(self):
+        size = os.path.getsize(self.points_path) // 4
+        if self._points is None or len(self._points) != size:
+            self._points = np.memmap(self.points_path, dtype="<f4", mode="r", shape=(size,))
+        return self._points
+
+    def shot(self, i):
+        record = self.index[i]
+        start, n = int(record["offset"]), int(record["points"])
+        block = self._data()[start:start + len(COLUMNS) * n].reshape(len(COLUMNS), n)
+        return StoredShot(record, block)
+
+    __getitem__ = shot
+
+    def append(self, t, x, y, vx, vy, landed=True, method="euler", model="point", **params):
+        """
+        Aggiunge un tiro dalle sue colonne, impatto compreso (come gli stati di
+        playback.StateBuffer); params sono i valori di PARAMETERS. Restituisce
+        l'indice del tiro.
+        """
+        columns = [np.asarray(c, dtype=float) for c in (t, x, y, vx, vy)]
+        fields = {name: params.get(name, np.nan) for name in PARAMETERS}
+        fields.update(method=trajectory_engine.METHODS.index(method),
+                      model=trajectory_engine.MODELS.index(model), range=columns[1][-1],
+                      apex=max(columns[2].max(), 0.0), flight_time=columns[0][-1],
+                      landed=landed)
+        return self._append([len(columns[0])], columns, fields)
+
+    def append_buffer(self, buffer, launch_angle, initial_speed, bow_inclination=0.0,
+                      method="euler", model="point", wind=0.0, environment=None,
+                      **engine_kwargs):
+        """
+        Aggiunge un tiro integrato da playback.integrate, con gli argomenti passati
+        al motore: esito (landed) e punto d'impatto vengono dal buffer, cioè dal
+        risultato del motore. Con un campo di vento in environment si archivia il
+        vento uniforme più quello medio nel tempo lungo il percorso.
+        """
+        if environment is not None and environment.wind is not None:
+            t = np.asarray(buffer.times)
+            field = environment.wind(np.asarray(buffer.xs), np.asarray(buffer.ys))
+            if t[-1] > 0:
+                wind = wind + np.sum(0.5 * (field[1:] + field[:-1]) * np.diff(t)) / t[-1]
+        params = {name: value for name, value in engine_kwargs.items() if name in PARAMETERS}
+        return self.append(buffer.times, buffer.xs, buffer.ys, buffer.vxs, buffer.vys,
+                           landed=bool(buffer.landed), method=method, model=model,
+                           launch_angle=launch_angle, initial_speed=initial_speed,
+                           bow_inclination=bow_inclination, wind=wind, **params)
+
+    def append_batch(self, result, launch_angle, initial_speed, bow_inclination=0.0,
+                     mass=trajectory_engine.m, drag_coefficient=trajectory_engine.k,
+                     launch_efficiency=1.0, inclination_exponent=1.0, wind=0.0,
+                     dt=trajectory_engine.dt, method="euler", model="point", ground_height=0.0):
+        """
+        Aggiunge i tiri di un BatchResult di simulate_batch (con record_paths=True),
+        insieme ai parametri con cui è stato simulato. Ogni tiro è chiuso dal punto
+        d'impatto, con la velocità dell'ultimo campione. Restituisce l'indice del
+        primo tiro aggiunto.
+        """
+        n = result.range.size
+        t = result.times.reshape(len(result.times), n)
+        xs, ys = (p.reshape(len(p), n) for p in result.paths)
+        vxs, vys = (v.reshape(len(v), n) for v in result.velocities)
+        airborne = ~np.isnan(xs)
+        last = np.maximum(airborne.sum(axis=0) - 1, 0)
+        shots = np.arange(n)
+
+        def broadcast(value):
+            return np.broadcast_to(np.asarray(value, dtype=float).ravel(), (n,))
+
+        if result.impact_height is None:
+            impact_y = np.where(result.landed.ravel(), broadcast(ground_height), ys[last, shots])
+        else:
+            impact_y = result.impact_height.ravel()
+        impact = (result.flight_time.ravel(), result.range.ravel(), impact_y,
+                  vxs[last, shots], vys[last, shots])
+
+        # Campioni in volo di ogni tiro seguiti dal suo punto d'impatto, tiro per tiro
+        keep = np.vstack([airborne, np.ones(n, dtype=bool)]).T
+        columns = [np.vstack([c, row]).T[keep] for c, row in zip((t, xs, ys, vxs, vys), impact)]
+
+        params = dict(launch_angle=launch_angle, initial_speed=initial_speed,
+                      bow_inclination=bow_inclination, mass=mass,
+                      drag_coefficient=drag_coefficient, launch_efficiency=launch_efficiency,
+                      inclination_exponent=inclination_exponent, wind=wind, dt=dt)
+        fields = {name: broadcast(value) for name, value in params.items()}
+        fields.update(method=trajectory_engine.METHODS.index(method),
+                      model=trajectory_engine.MODELS.index(model), range=result.range.ravel(),
+                      apex=result.apex.ravel(), flight_time=result.flight_time.ravel(),
+                      landed=result.landed.ravel())
+        return self._append(keep.sum(axis=1), columns, fields)
+
+    def _append(self, lengths, columns, fields):
+        if self.mode != "a":
+            raise ValueError("Archivio aperto in sola lettura")
+        lengths = np.asarray(lengths, dtype=np.int64)
+        first = len(self)
+        start = os.path.getsize(self.points_path) // 4
+
+        # Posizione di ogni campione nei blocchi per colonne dei rispettivi tiri
+        firsts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        shot_of = np.repeat(np.arange(len(lengths)), lengths)
+        sample = np.arange(lengths.sum()) - firsts[shot_of]
+        base = len(COLUMNS) * firsts[shot_of] + sample
+        block = np.empty(len(COLUMNS) * int(lengths.sum()), dtype="<f4")
+        for c, values in enumerate(columns):
+            block[base + c * lengths[shot_of]] = values
+
+        records = np.zeros(len(lengths), dtype=INDEX_DTYPE)
+        records["offset"] = start + len(COLUMNS) * firsts
+        records["points"] = lengths
+        for name, values in fields.items():
+            records[name] = values
+
+        # Prima i blocchi, poi l'indice: un record presente ha sempre i suoi dati
+        with open(self.points_path, "ab") as f:
+            block.tofile(f)
+        with open(self.index_path, "ab") as f:
+            records.tofile(f)
+        return first